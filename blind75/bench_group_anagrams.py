@@ -0,0 +1,83 @@
+"""
+Throughput of group_anagrams.py in words per second
+
+Words come from a generator drawing from a vocabulary of anagram families
+(a few shuffles of each base word), the way they'd stream in from a file.
+
+    generator     just drawing the words, the floor for everything else
+    old key       the key the first version built, a format() per letter,
+                  skipped past 1M words
+    anagramKey    the sorted bytes key
+    in memory     Solution().groupAnagrams on a list of the words, skipped
+                  past 10M words
+    stream        groupAnagramsStream with every word in memory
+    stream spill  groupAnagramsStream holding a tenth of the words (at most
+                  1M) at a time, the rest partitioned on disk
+
+    python bench_group_anagrams.py              # 1M words
+    python bench_group_anagrams.py 100000000
+"""
+import random
+import sys
+import time
+
+from group_anagrams import Solution, anagramKey, groupAnagramsStream
+
+IN_MEMORY_LIMIT = 10_000_000
+
+
+def vocabulary(families, rng):
+    words = []
+    for _ in range(families):
+        base = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+        words.extend("".join(rng.sample(base, len(base))) for _ in range(rng.randint(1, 8)))
+    return words
+
+
+def stream(words, count, seed=0):
+    rng = random.Random(seed)
+    size = len(words)
+    for _ in range(count // 1000):
+        yield from (words[i] for i in rng.choices(range(size), k=1000))
+    yield from rng.choices(words, k=count % 1000)
+
+
+def oldKey(word):
+    charArr = [0] * 26
+    for char in word:
+        charArr[ord(char) - ord('a')] += 1
+    combinedString = ''
+    for idx in range(len(charArr)):
+        combinedString = "{c}{a}{n}".format(c=combinedString, a=chr(ord('a') + idx), n=charArr[idx])
+    return combinedString
+
+
+def timed(function, words, count):
+    start = time.perf_counter()
+    groups = function(stream(words, count))
+    return count / (time.perf_counter() - start), groups
+
+
+def main(count=1_000_000):
+    words = vocabulary(min(max(count // 20, 1000), 500_000), random.Random(0))
+    spill = min(max(count // 10, 1), 1_000_000)
+    print(f"{count:,} words from {len(words):,} in the vocabulary, spilling every {spill:,}")
+    print(f"{'':<14} {'words/s':>12} {'groups':>10}")
+    rows = [
+        ("generator", lambda words: sum(1 for _ in words) and "", count),
+        ("old key", lambda words: sum(1 for _ in map(oldKey, words)) and "", IN_MEMORY_LIMIT // 10),
+        ("anagramKey", lambda words: sum(1 for _ in map(anagramKey, words)) and "", count),
+        ("in memory", lambda words: len(Solution().groupAnagrams(list(words))), IN_MEMORY_LIMIT),
+        ("stream", lambda words: sum(1 for _ in groupAnagramsStream(words, maxWords=count + 1)), IN_MEMORY_LIMIT),
+        ("stream spill", lambda words: sum(1 for _ in groupAnagramsStream(words, maxWords=spill)), count),
+    ]
+    for label, function, limit in rows:
+        if count > limit:
+            print(f"{label:<14} {'-':>12}")
+            continue
+        rate, groups = timed(function, words, count)
+        print(f"{label:<14} {rate:>12,.0f} {groups:>10}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
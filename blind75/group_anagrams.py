@@ -1,6 +1,6 @@
 """
 Group Anagrams
-Solved 
+Solved
 Given an array of strings strs, group all anagrams together into sublists. You may return the output in any order.
 
 An anagram is a string that contains the exact same characters as another string, but the order of the characters can be different.
@@ -26,40 +26,188 @@ Constraints:
 0 <= strs[i].length <= 100
 strs[i] is made up of lowercase English letters.
 """
+import marshal
+import os
+import tempfile
+from typing import Dict, Iterable, Iterator, List
+
+
+def anagramKey(word: str) -> bytes:
+    # the word's characters in sorted order, so every anagram gets the same
+    # key. sorting the bytes of an ascii word is one C call, no string
+    # building per letter. other words sort their characters, and their
+    # keys have non-ascii bytes in them so they can't match an ascii one
+    if word.isascii():
+        return bytes(sorted(word.encode()))
+    return "".join(sorted(word)).encode()
+
 
 class Solution:
     def groupAnagrams(self, strs: List[str]) -> List[List[str]]:
 
         # i go through each word
-        # then i 
+        # then i put it in the list for its key, anagrams share a key
 
         mapToWordsArr = {}
         for word in strs:
-            charArr = [0] * 26 
-            for char in word:
-                index = ord(char) - ord('a')
-                #print(index)
-                charArr[index] = charArr[index] + 1
-                print(charArr[index])
-            combinedString = ''
-            for idx in range(len(charArr)):
-                num = charArr[idx]
-                charValue = ord('a') + idx
-                actualChar = chr(charValue)
-                combinedString = "{c}{a}{n}".format(c=combinedString, a=actualChar,n=num)
-            print(combinedString)
-            if combinedString not in mapToWordsArr:
-                mapToWordsArr[combinedString] = [word]
+            key = anagramKey(word)
+            if key not in mapToWordsArr:
+                mapToWordsArr[key] = [word]
             else:
-                currMappedArr = mapToWordsArr[combinedString]
-                currMappedArr.append(word)
-        
-        finalArr = []
-        for values in mapToWordsArr.values():
-            finalArr.append(values)
-        
-        return finalArr
-            
-
-
-        
\ No newline at end of file
+                mapToWordsArr[key].append(word)
+
+        return list(mapToWordsArr.values())
+
+
+# streaming version, for more words than fit in memory. words are grouped in
+# a dict until it holds maxWords of them, then every group goes to one of
+# `partitions` files on disk picked by its key's hash and the dict starts
+# over. all the words of a key end up in the same file, so once the input
+# runs out each file is grouped on its own, one at a time. a file that's
+# still too big is split again with a different hash
+#
+# groups come out in no particular order, the words in a group in the order
+# they came in. with fewer than maxWords words nothing touches the disk
+
+
+def _spill(groups: Dict[bytes, List[str]], files: list, level: int) -> None:
+    # one marshal'd list of (key, words) per file per spill
+    parts = [[] for _ in files]
+    for key, words in groups.items():
+        parts[hash((level, key)) % len(files)].append((key, words))
+    for f, part in zip(files, parts):
+        if part:
+            marshal.dump(part, f)
+    groups.clear()
+
+
+def _load(path: str) -> Iterator[list]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield marshal.load(f)
+            except EOFError:
+                return
+
+
+def _partition(pairs: Iterable[list], directory: str, partitions: int, maxBytes: int,
+               maxWords: int, level: int) -> Iterator[List[str]]:
+    # groups the (key, words) lists of `pairs` through `partitions` files
+    paths = [os.path.join(directory, f"{level}-{i}") for i in range(partitions)]
+    files = [open(path, "wb") for path in paths]
+    try:
+        groups = {}
+        count = 0
+        for part in pairs:
+            for key, words in part:
+                if key in groups:
+                    groups[key].extend(words)
+                else:
+                    groups[key] = words
+                count += len(words)
+            if count >= maxWords:
+                _spill(groups, files, level)
+                count = 0
+        _spill(groups, files, level)
+    finally:
+        for f in files:
+            f.close()
+    for path in paths:
+        yield from _merge(path, directory, partitions, maxBytes, maxWords, level + 1)
+
+
+def _merge(path: str, directory: str, partitions: int, maxBytes: int, maxWords: int,
+           level: int) -> Iterator[List[str]]:
+    # every group in one partition file, the file deleted afterwards
+    try:
+        # past a few levels the file is one enormous group or hash() keeps
+        # putting the same keys together, splitting it won't help
+        if os.path.getsize(path) > maxBytes and level < 4:
+            yield from _partition(_load(path), directory, partitions, maxBytes, maxWords, level)
+            return
+        groups = {}
+        for part in _load(path):
+            for key, words in part:
+                if key in groups:
+                    groups[key].extend(words)
+                else:
+                    groups[key] = words
+        yield from groups.values()
+    finally:
+        os.remove(path)
+
+
+def _chunks(words: Iterator[str], maxWords: int) -> Iterator[tuple]:
+    # (groups of up to maxWords words, whether there may be more words)
+    groups = {}
+    count = 0
+    for word in words:
+        key = anagramKey(word)
+        if key in groups:
+            groups[key].append(word)
+        else:
+            groups[key] = [word]
+        count += 1
+        if count >= maxWords:
+            yield groups, True
+            groups = {}
+            count = 0
+    yield groups, False
+
+
+def _pairs(first: Dict[bytes, List[str]], chunks: Iterator[tuple]) -> Iterator[Iterable[tuple]]:
+    # each chunk's (key, words) pairs, emptying the chunk once they've been
+    # taken so no chunk outlives its spill
+    yield first.items()
+    first.clear()
+    for groups, _ in chunks:
+        yield groups.items()
+        groups.clear()
+
+
+def groupAnagramsStream(words: Iterable[str], maxWords: int = 1_000_000, partitions: int = 64,
+                        maxBytes: int = 256 << 20, tmpdir: str = None) -> Iterator[List[str]]:
+    # groups of anagrams from any iterable of words (a generator, a file's
+    # words...), holding about maxWords words at a time. a partition file
+    # over maxBytes on disk is split again before it's read back
+    chunks = _chunks(iter(words), maxWords)
+    groups, more = next(chunks)
+    if not more:
+        yield from groups.values()
+        return
+    with tempfile.TemporaryDirectory(dir=tmpdir) as directory:
+        yield from _partition(_pairs(groups, chunks), directory, partitions, maxBytes, maxWords, 0)
+
+
+def readWords(path: str) -> Iterator[str]:
+    # the whitespace separated words of a text file, a line at a time
+    with open(path) as f:
+        for line in f:
+            yield from line.split()
+
+
+if __name__ == "__main__":
+    import random
+
+    def canonical(groups):
+        return sorted(sorted(group) for group in groups)
+
+    expected = [["act", "cat"], ["hat"], ["pots", "stop", "tops"]]
+    assert canonical(Solution().groupAnagrams(["act", "pots", "tops", "cat", "stop", "hat"])) == expected
+    assert Solution().groupAnagrams(["x"]) == [["x"]]
+    assert Solution().groupAnagrams([""]) == [[""]]
+    assert canonical(groupAnagramsStream(iter(["act", "pots", "tops", "cat", "stop", "hat"]), maxWords=2,
+                                         partitions=3)) == expected
+    assert anagramKey("été") == anagramKey("éét") != anagramKey("tée")
+
+    # against the in-memory grouping on random words, spilling every few
+    # words, into a few partitions and splitting them again, words in the
+    # order they came
+    rng = random.Random(0)
+    for _ in range(200):
+        bases = ["".join(rng.choice("abcdé") for _ in range(rng.randint(0, 6))) for _ in range(rng.randint(1, 30))]
+        words = ["".join(rng.sample(base, len(base))) for base in rng.choices(bases, k=rng.randint(1, 500))]
+        streamed = list(groupAnagramsStream((word for word in words), maxWords=rng.randint(1, 50),
+                                            partitions=rng.randint(1, 5), maxBytes=rng.choice([50, 1 << 20])))
+        assert sorted(streamed) == sorted(Solution().groupAnagrams(words))
+    print("streamed groups match the in-memory ones")
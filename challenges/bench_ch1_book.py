@@ -0,0 +1,79 @@
+"""
+Nightly interest over a portfolio, one SavingsAccount object per account vs
+the columns of an AccountBook (ch1_book.py)
+
+    objects  sum(acc.calculate_interest()) and acc.balance += ... per account
+    book     calculate_interest_bulk() and apply_interest()
+
+Also reports the memory each way takes per account, measured with
+tracemalloc while the portfolio is built.
+
+    python bench_ch1_book.py              # 1M accounts
+    python bench_ch1_book.py 10000000
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from ch1 import SavingsAccount
+from ch1_book import AccountBook
+
+
+def build(count, make):
+    tracemalloc.start()
+    result = make(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size / count
+
+
+def objects(count):
+    rng = random.Random(0)
+    return [SavingsAccount(f"holder{i}", i, rng.randrange(100_000)) for i in range(count)]
+
+
+def book(count):
+    rng = random.Random(0)
+    accounts = AccountBook()
+    for i in range(count):
+        accounts.add(SavingsAccount, f"holder{i}", i, rng.randrange(100_000))
+    return accounts
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main(count=1_000_000):
+    accounts, objectBytes = build(count, objects)
+    accounts_book, bookBytes = build(count, book)
+
+    def calculate_objects():
+        return sum(account.calculate_interest() for account in accounts)
+
+    def apply_objects():
+        total = 0.0
+        for account in accounts:
+            interest = account.calculate_interest()
+            account.balance += interest
+            total += interest
+        return total
+
+    calculate, expected = timed(calculate_objects)
+    bulk, interest = timed(accounts_book.calculate_interest_bulk)
+    assert abs(sum(interest) - expected) <= 1e-6 * expected
+    apply, _ = timed(apply_objects)
+    applyBulk, _ = timed(accounts_book.apply_interest)
+
+    print(f"{count:,} savings accounts")
+    print(f"{'':<22} {'objects':>10} {'book':>10} {'speedup':>8}")
+    print(f"{'calculate interest ms':<22} {calculate * 1e3:>10.1f} {bulk * 1e3:>10.1f} {calculate / bulk:>7.1f}x")
+    print(f"{'apply interest ms':<22} {apply * 1e3:>10.1f} {applyBulk * 1e3:>10.1f} {apply / applyBulk:>7.1f}x")
+    print(f"{'bytes per account':<22} {objectBytes:>10.0f} {bookBytes:>10.0f} {objectBytes / bookBytes:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,140 @@
+"""
+Open time benchmark for the Ledger in ch1_ledger.py
+
+A ledger of N accounts is written as a snapshot, then deposits and
+withdrawals go to its log. At a few log lengths, opening it is timed two
+ways:
+
+    snapshot + tail   the snapshot and only the records logged since
+    full log          no snapshot, an OPEN record for every account and then
+                      the same records, what opening costs without
+                      compaction
+
+The snapshot load is also shown on its own, and how long a compaction of
+the log into the snapshot takes. Log writes are timed separately for a few
+group commit sizes (records per fsync).
+
+    python bench_ch1_ledger.py                  # 100k and 1M accounts
+    python bench_ch1_ledger.py 10000000
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+
+from ch1_ledger import LOG, OPEN, SNAPSHOT, Ledger, LedgerLog, compact_files, load_snapshot, save_snapshot
+
+LOG_LENGTHS = (0, 10_000, 100_000, 1_000_000)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def write_accounts(snapshotted, full, count):
+    # the same accounts as a snapshot in one directory and as OPEN records in
+    # the other, whose snapshot is empty
+    rng = random.Random(0)
+    acct_nums = array('q', range(1_000_000, 1_000_000 + 3 * count, 3))
+    balances = array('d', (rng.randrange(1_000_000) / 100 for _ in range(count)))
+    names = [f"holder {acct_num}".encode() for acct_num in acct_nums]
+    ends = array('q')
+    end = 0
+    for name in names:
+        end += len(name)
+        ends.append(end)
+    save_snapshot(os.path.join(snapshotted, SNAPSHOT), acct_nums, balances, ends, b"".join(names), count)
+    save_snapshot(os.path.join(full, SNAPSHOT), array('q'), array('d'), array('q'), b"")
+    log = LedgerLog(os.path.join(full, LOG), batch=1 << 16)
+    for sequence, (acct_num, balance, name) in enumerate(zip(acct_nums, balances, names), 1):
+        log.append(sequence, OPEN, acct_num, balance, balance, name)
+    log.close()
+    return list(acct_nums)
+
+
+def open_session(count):
+    rng = random.Random(1)
+    rows = []
+    with tempfile.TemporaryDirectory() as snapshotted, tempfile.TemporaryDirectory() as full:
+        acct_nums = write_accounts(snapshotted, full, count)
+        snapshot_bytes = os.path.getsize(os.path.join(snapshotted, SNAPSHOT))
+        ledger = Ledger(snapshotted, batch=4096, compact_every=1 << 62)
+        written = 0
+        copied = 0
+        for length in LOG_LENGTHS:
+            while written < length:
+                acct_num = rng.choice(acct_nums)
+                if rng.random() < 0.7:
+                    ledger.deposit(acct_num, rng.randint(1, 100))
+                elif ledger.balance(acct_num) >= 100:
+                    ledger.withdraw(acct_num, 100)
+                else:
+                    continue
+                written += 1
+            ledger.sync()
+            # the full directory gets the same records after its OPENs
+            with open(os.path.join(snapshotted, LOG), "rb") as f:
+                tail = f.read()
+            with open(os.path.join(full, LOG), "ab") as f:
+                f.write(tail[copied:])
+            copied = len(tail)
+            load, _ = timed(load_snapshot, os.path.join(snapshotted, SNAPSHOT))
+            tail, opened = timed(Ledger, snapshotted)
+            replay, replayed = timed(Ledger, full)
+            opened.close()
+            replayed.close()
+            for acct_num in rng.sample(acct_nums, 100):
+                assert opened.balance(acct_num) == replayed.balance(acct_num) == ledger.balance(acct_num)
+            rows.append((length, snapshot_bytes, load, tail, replay))
+        ledger.close()
+        # compaction of the last tail, on a copy so the open above stays
+        # what was measured
+        shutil.copy(os.path.join(snapshotted, LOG), os.path.join(snapshotted, "ledger.old"))
+        compaction, _ = timed(compact_files, snapshotted)
+    return rows, compaction
+
+
+def log_session(batch, records):
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = Ledger(directory, batch=batch, compact_every=1 << 62)
+        ledger.open("holder", 1, 0)
+        start = time.perf_counter()
+        for _ in range(records):
+            ledger.deposit(1, 1)
+        ledger.close()
+        return records / (time.perf_counter() - start)
+
+
+def main(*sizes):
+    sizes = sizes or (100_000, 1_000_000)
+    print("opening a ledger, times in ms")
+    print(f"{'accounts':>10} {'tail records':>13} {'snapshot MB':>12} {'load':>8} "
+          f"{'snapshot+tail':>14} {'full log':>9}")
+    compactions = []
+    for count in sizes:
+        rows, compaction = open_session(count)
+        compactions.append((count, compaction))
+        for length, snapshot_bytes, load, tail, replay in rows:
+            print(f"{count:>10,} {length:>13,} {snapshot_bytes / 1e6:>12.2f} {load * 1e3:>8.1f} "
+                  f"{tail * 1e3:>14.1f} {replay * 1e3:>9.1f}")
+
+    print()
+    print(f"compaction of a {LOG_LENGTHS[-1]:,} record log")
+    print(f"{'accounts':>10} {'ms':>9}")
+    for count, compaction in compactions:
+        print(f"{count:>10,} {compaction * 1e3:>9.1f}")
+
+    print()
+    print("log writes")
+    print(f"{'records/fsync':>14} {'records/s':>12}")
+    for batch in (1, 16, 256, 4096):
+        print(f"{batch:>14,} {log_session(batch, min(200_000, 2_000 * batch)):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""
+Throughput of SavingsAccount.load_many (ch1.py) on a
+"name-account_number-balance" export, in records per second
+
+    from_string   the file's lines one SavingsAccount.from_string at a time
+    objects       load_many(path), SavingsAccount objects
+    objects mmap  the same through mmap
+    book          load_many(path, book=AccountBook()), straight into columns
+    book mmap     the same through mmap
+    lines         load_many(open(path)), from an iterable of lines
+
+A tenth of the names have a dash in them, which takes the line by line
+path for their chunk.
+
+    python bench_ch1_load.py              # 1M records
+    python bench_ch1_load.py 20000000
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from ch1 import SavingsAccount
+from ch1_book import AccountBook
+
+
+def write_export(path, count):
+    rng = random.Random(0)
+    with open(path, "w") as f:
+        for start in range(0, count, 100_000):
+            f.write("".join(
+                f"{'Mary-Ann' if rng.random() < 0.1 else 'holder'}{i}-{i}-{rng.randrange(10_000_000) / 100}\n"
+                for i in range(start, min(start + 100_000, count))))
+
+
+def from_string(path):
+    with open(path) as f:
+        return sum(1 for line in f if SavingsAccount.from_string(line.rstrip("\n")))
+
+
+def objects(path, use_mmap=False):
+    return sum(1 for _ in SavingsAccount.load_many(path, use_mmap=use_mmap))
+
+
+def book(path, use_mmap=False):
+    return len(SavingsAccount.load_many(path, book=AccountBook(), use_mmap=use_mmap))
+
+
+def lines(path):
+    with open(path) as f:
+        return sum(1 for _ in SavingsAccount.load_many(f))
+
+
+def main(count=1_000_000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "export.txt")
+        write_export(path, count)
+        print(f"{count:,} records, {os.path.getsize(path) / 1e6:.1f} MB")
+        print(f"{'':<13} {'records/s':>12}")
+        for name, run in (("from_string", lambda: from_string(path)),
+                          ("objects", lambda: objects(path)),
+                          ("objects mmap", lambda: objects(path, True)),
+                          ("book", lambda: book(path)),
+                          ("book mmap", lambda: book(path, True)),
+                          ("lines", lambda: lines(path))):
+            start = time.perf_counter()
+            loaded = run()
+            elapsed = time.perf_counter() - start
+            assert loaded == count
+            print(f"{name:<13} {count / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
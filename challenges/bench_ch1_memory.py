@@ -0,0 +1,50 @@
+"""
+Memory per account, SavingsAccount against CompactSavingsAccount (ch1.py)
+and a row of an AccountBook (ch1_book.py)
+
+Measured with tracemalloc while a list of accounts is built, less the list
+itself. Every account shares the same name string and balance, so what's
+left is the account: the object, its __dict__ or slots, and the acct_num.
+
+    python bench_ch1_memory.py             # 1M accounts
+    python bench_ch1_memory.py 5000000
+"""
+import sys
+import tracemalloc
+
+from ch1 import CompactSavingsAccount, SavingsAccount
+from ch1_book import AccountBook
+
+
+def per_instance(build, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = build(count)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    if isinstance(records, list):
+        used -= sys.getsizeof(records)
+    return used / count
+
+
+def main(count=1_000_000):
+    name = "holder"
+
+    def book(count):
+        book = AccountBook()
+        book.add_many(SavingsAccount, [name] * count, range(10**9, 10**9 + count), [100.0] * count)
+        return book
+
+    rows = [
+        ("SavingsAccount", lambda count: [SavingsAccount(name, num, 100.0) for num in range(10**9, 10**9 + count)]),
+        ("compact", lambda count: [CompactSavingsAccount(name, num, 100.0) for num in range(10**9, 10**9 + count)]),
+        ("AccountBook row", book),
+    ]
+    print(f"{count:,} accounts")
+    print(f"{'':<16} {'bytes/account':>14}")
+    for label, build in rows:
+        print(f"{label:<16} {per_instance(build, count):>14.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
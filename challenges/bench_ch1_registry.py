@@ -0,0 +1,80 @@
+"""
+AccountRegistry (ch1_registry.py) against scanning a list of accounts
+
+    build      AccountRegistry(accounts)
+    lookup     registry[acct_num] vs a scan for the matching account
+    range      registry.between(x, x + 1000) vs a scan for acct_nums in range
+    top 10     registry.top(10) vs heapq.nlargest over every account
+    deposit    deposit + withdraw through the registry, which moves the
+               account in the balance index each time
+    dedupe     set() over the accounts plus 10% duplicates, with __hash__
+
+A scan is timed a few times only and reported per operation like the rest.
+
+    python bench_ch1_registry.py              # 10M accounts
+    python bench_ch1_registry.py 1000000
+"""
+import heapq
+import random
+import sys
+import time
+
+from ch1 import SavingsAccount
+from ch1_registry import AccountRegistry
+
+
+def per_op(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count
+
+
+def main(count=10_000_000):
+    rng = random.Random(0)
+    # acct_nums spread over 10x the count so ranges are not all full
+    nums = rng.sample(range(10 * count), count)
+    accounts = [SavingsAccount(f"holder{num}", num, rng.randrange(1_000_000)) for num in nums]
+    print(f"{count:,} accounts")
+
+    start = time.perf_counter()
+    registry = AccountRegistry(accounts)
+    print(f"{'build':<9} {time.perf_counter() - start:>10.2f} s")
+    print(f"{'':<9} {'registry us':>12} {'scan us':>12}")
+
+    def report(name, indexed, scanned):
+        print(f"{name:<9} {indexed * 1e6:>12.2f} {scanned * 1e6:>12,.0f}")
+
+    def scan_lookup():
+        num = rng.choice(nums)
+        return next(a for a in accounts if a.acct_num == num)
+
+    report("lookup", per_op(lambda: registry[rng.choice(nums)], 100_000), per_op(scan_lookup, 3))
+
+    def scan_range():
+        low = rng.randrange(10 * count)
+        return [a for a in accounts if low <= a.acct_num <= low + 1000]
+
+    def indexed_range():
+        low = rng.randrange(10 * count)
+        return list(registry.between(low, low + 1000))
+
+    report("range", per_op(indexed_range, 10_000), per_op(scan_range, 3))
+    report("top 10", per_op(lambda: registry.top(10), 10_000),
+           per_op(lambda: heapq.nlargest(10, accounts, key=lambda a: a.balance), 3))
+
+    def move():
+        num = rng.choice(nums)
+        registry.deposit(num, 100)
+        registry.withdraw(num, 100)
+
+    print(f"{'deposit':<9} {per_op(move, 100_000) / 2 * 1e6:>12.2f}")
+
+    duplicates = accounts + [SavingsAccount("again", num, 0) for num in rng.sample(nums, count // 10)]
+    start = time.perf_counter()
+    assert len(set(duplicates)) == count
+    print(f"{'dedupe':<9} {time.perf_counter() - start:>10.2f} s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
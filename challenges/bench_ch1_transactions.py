@@ -0,0 +1,133 @@
+"""
+Throughput and latency benchmark for the TransactionEngine in ch1_transactions.py
+
+A registry of accounts takes random transfers (with a deposit or withdrawal
+mixed in every so often) from a thread pool of 1 to 16 workers, one
+transaction per commit and then batches of 64 per commit, and from asyncio
+tasks on one event loop. Latency is per commit call, so for batches it
+covers the whole batch.
+
+Python threads take turns under the GIL, so more workers don't add
+throughput for work that is all Python: the table shows what the locking
+costs and that it doesn't fall over as workers are added, not a speedup.
+
+    python bench_ch1_transactions.py              # 100k accounts, 200k transactions per run
+    python bench_ch1_transactions.py 1000000 500000
+"""
+import asyncio
+import random
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from ch1 import SavingsAccount
+from ch1_registry import AccountRegistry
+from ch1_transactions import TransactionEngine
+
+WORKERS = (1, 2, 4, 8, 16)
+BATCH = 64
+
+
+def transactions(rng, accounts, count):
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.05:
+            yield ("deposit", rng.randrange(accounts), rng.randint(1, 100))
+        elif roll < 0.1:
+            yield ("withdraw", rng.randrange(accounts), rng.randint(1, 100))
+        else:
+            yield ("transfer", rng.randrange(accounts), rng.randrange(accounts), rng.randint(1, 100))
+
+
+def batches(seed, accounts, count, size):
+    # distinct accounts in a transfer, and batches of `size`
+    rng = random.Random(seed)
+    batch = []
+    for transaction in transactions(rng, accounts, count):
+        if transaction[0] == "transfer" and transaction[1] == transaction[2]:
+            transaction = ("deposit", transaction[1], transaction[3])
+        batch.append(transaction)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run(engine, batch):
+    start = time.perf_counter_ns()
+    try:
+        engine.commit(batch)
+    except ValueError:
+        pass
+    return time.perf_counter_ns() - start
+
+
+def thread_session(engine, accounts, count, workers, size):
+    latencies = array('q')
+
+    def worker(seed):
+        local = array('q')
+        for batch in batches(seed, accounts, count // workers, size):
+            local.append(run(engine, batch))
+        return local
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        for local in pool.map(worker, range(workers)):
+            latencies.extend(local)
+    return time.perf_counter() - start, latencies
+
+
+def async_session(engine, accounts, count, tasks, size):
+    latencies = array('q')
+
+    async def client(seed):
+        for batch in batches(seed, accounts, count // tasks, size):
+            start = time.perf_counter_ns()
+            try:
+                await engine.commit_async(batch)
+            except ValueError:
+                pass
+            latencies.append(time.perf_counter_ns() - start)
+            # let the other tasks in, the engine never has to wait on a
+            # lock here since nothing else holds one
+            await asyncio.sleep(0)
+
+    async def clients():
+        await asyncio.gather(*(client(seed) for seed in range(tasks)))
+
+    start = time.perf_counter()
+    asyncio.run(clients())
+    return time.perf_counter() - start, latencies
+
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] / 1e3
+
+
+def report(label, workers, size, count, elapsed, latencies):
+    latencies = sorted(latencies)
+    print(f"{label:>8} {workers:>8} {size:>6} {count / elapsed:>12,.0f} "
+          f"{percentile(latencies, 0.5):>9.1f} {percentile(latencies, 0.99):>9.1f} {latencies[-1] / 1e3:>10.1f}")
+
+
+def main(accounts=100_000, count=200_000):
+    registry = AccountRegistry(SavingsAccount(str(num), num, 1000) for num in range(accounts))
+    engine = TransactionEngine(registry.by_num)
+    print(f"{accounts:,} accounts, {count:,} transactions per run, latency in us per commit")
+    print(f"{'':>8} {'workers':>8} {'batch':>6} {'txn/s':>12} {'p50':>9} {'p99':>9} {'max':>10}")
+    for size in (1, BATCH):
+        for workers in WORKERS:
+            elapsed, latencies = thread_session(engine, accounts, count, workers, size)
+            report("threads", workers, size, count, elapsed, latencies)
+        for tasks in WORKERS:
+            elapsed, latencies = async_session(engine, accounts, count, tasks, size)
+            report("asyncio", tasks, size, count, elapsed, latencies)
+    total_accounts, total = engine.check_invariants()
+    print(f"invariants hold: {total_accounts:,} accounts, total {total:,}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,166 @@
+"""
+Benchmark for ParkingLot in parkinglot.py
+
+Fills lots of 1k, 100k and 10M spots with a mix of cars, vans and
+motorcycles, then asks every question ParkingLot answers. For comparison it
+also times one pass of the linear scan those questions used to do over the
+spot lists, and parking vans in a nearly full regular row where most of the
+free spots are single gaps between cars. Every lot is built both as Spot
+objects and in compact mode (bitmaps), where the count is a popcount, with
+bytes per spot measured by tracemalloc. Last, turnover: a lot kept around
+90% full while vehicles come and go through park() / unpark(ticket).
+
+    python bench_parkinglot.py                  # 1k, 100k, 10M spots
+    python bench_parkinglot.py 1000 1000000
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from parkinglot import FreeRuns, ParkingLot, Vehicle, VehicleType
+
+MIX = [VehicleType.CAR] * 6 + [VehicleType.MOTORCYCLE] * 3 + [VehicleType.VAN]
+
+
+def scan_remaining(lot):
+    # what spotsRemaining() used to cost on every call
+    return (sum(1 for spot in lot.mSpotList if not spot.isOccupied),
+            sum(1 for spot in lot.rSpotList if not spot.isOccupied))
+
+
+def lot_session(spots, compact=False, parks=200_000, queries=10_000):
+    timings = {}
+    start = time.perf_counter()
+    lot = ParkingLot(spots // 10, spots - spots // 10, compact=compact)
+    timings["build"] = time.perf_counter() - start
+
+    vehicles = [Vehicle(MIX[i % len(MIX)]) for i in range(min(parks, spots))]
+    start = time.perf_counter()
+    for vehicle in vehicles:
+        lot.park(vehicle)
+    timings["park"] = (time.perf_counter() - start) / len(vehicles)
+
+    start = time.perf_counter()
+    for _ in range(queries):
+        lot.spotsRemaining()
+        lot.isParkingLotFull()
+        lot.isParkingLotEmpty()
+        lot.vanSpotsTakenUp()
+    timings["queries"] = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    if compact:
+        lot.mSpotList.occupiedCount()
+        lot.rSpotList.occupiedCount()
+    else:
+        scan_remaining(lot)
+    timings["count"] = time.perf_counter() - start
+    return timings
+
+
+def lot_bytes(spots, compact):
+    tracemalloc.start()
+    lot = ParkingLot(spots // 10, spots - spots // 10, compact=compact)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / spots
+
+
+def scan_for_run(free, length):
+    # first run of `length` free spots by walking the row
+    run = 0
+    for index, isFree in enumerate(free):
+        run = run + 1 if isFree else 0
+        if run == length:
+            return index - length + 1
+    return -1
+
+
+def van_session(spots, vans=1_000):
+    # a full row with 5% of the spots freed at random: mostly lone gaps,
+    # now and then three in a row
+    rng = random.Random(0)
+    row = FreeRuns(spots)
+    for _ in range(spots):
+        row.take()
+    free = [False] * spots
+    for index in rng.sample(range(spots), spots // 20):
+        row.release(index)
+        free[index] = True
+    timings = {}
+
+    start = time.perf_counter()
+    parked = 0
+    for _ in range(vans):
+        index = scan_for_run(free, 3)
+        if index == -1:
+            break
+        free[index:index + 3] = [False] * 3
+        parked += 1
+    timings["scan"] = (time.perf_counter() - start) / max(parked, 1)
+
+    start = time.perf_counter()
+    for _ in range(parked):
+        row.take(3)
+    timings["segment tree"] = (time.perf_counter() - start) / max(parked, 1)
+    timings["vans"] = parked
+    return timings
+
+
+def turnover_session(spots, events=200_000, compact=False):
+    rng = random.Random(0)
+    lot = ParkingLot(spots // 10, spots - spots // 10, compact=compact)
+    tickets = []
+    while len(lot.rFree) > spots // 10:
+        ticket = lot.park(Vehicle(rng.choice(MIX)))
+        if ticket is not None:
+            tickets.append(ticket)
+    vehicles = [Vehicle(rng.choice(MIX)) for _ in range(events)]
+    start = time.perf_counter()
+    for vehicle in vehicles:
+        # someone random leaves, someone new arrives
+        lot.unpark(tickets.pop(rng.randrange(len(tickets))))
+        ticket = lot.park(vehicle)
+        if ticket is not None:
+            tickets.append(ticket)
+    return 2 * events / (time.perf_counter() - start)
+
+
+def main(*sizes):
+    sizes = sizes or (1_000, 100_000, 10_000_000)
+    print(f"{'spots':>11} {'mode':<8} {'build':>9} {'per park':>10} {'per query':>10} {'count':>10}")
+    for spots in sizes:
+        for mode in ("objects", "compact"):
+            timings = lot_session(spots, compact=mode == "compact")
+            print(f"{spots:>11,} {mode:<8} {timings['build']:>8.3f}s {timings['park'] * 1e6:>8.2f}us "
+                  f"{timings['queries'] * 1e6:>8.2f}us {timings['count'] * 1e3:>8.2f}ms")
+
+    print()
+    print("bytes per spot of an empty lot")
+    print(f"{'spots':>11} {'objects':>9} {'compact':>9}")
+    for spots in sizes:
+        # tracemalloc makes building millions of Spots crawl, stop at 1M
+        spots = min(spots, 1_000_000)
+        print(f"{spots:>11,} {lot_bytes(spots, False):>9.1f} {lot_bytes(spots, True):>9.2f}")
+
+    print()
+    print("vans into a full row with 5% of spots freed at random")
+    print(f"{'spots':>11} {'vans':>6} {'scan/van':>10} {'tree/van':>10}")
+    for spots in sizes:
+        # filling the row spot by spot is the slow part, stop at 1M
+        spots = min(spots, 1_000_000)
+        timings = van_session(spots)
+        print(f"{spots:>11,} {timings['vans']:>6,} {timings['scan'] * 1e3:>8.3f}ms {timings['segment tree'] * 1e6:>8.2f}us")
+
+    print()
+    print("turnover at ~90% full, park + unpark events per second")
+    print(f"{'spots':>11} {'objects':>10} {'compact':>10}")
+    for spots in sizes:
+        # filling 10M spots first takes minutes, stop at 1M
+        spots = min(spots, 1_000_000)
+        print(f"{spots:>11,} {turnover_session(spots):>10,.0f} {turnover_session(spots, compact=True):>10,.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,67 @@
+"""
+Throughput benchmark for ConcurrentParkingLot in parkinglot_concurrent.py
+
+Gate threads park and unpark on a lot kept around 90% full, once with a
+single shard (one lock for the whole lot) and once with 8 shards, and the
+total park + unpark events per second is reported for 1 to 16 gates. Every
+run ends with the double-booking check. Under the GIL the gates take turns
+on the interpreter anyway, what sharding saves is the time gates spend
+queued behind one lock.
+
+    python bench_parkinglot_concurrent.py            # 100k spots, 20k events per gate
+    python bench_parkinglot_concurrent.py 1000000 50000
+"""
+import random
+import sys
+import threading
+import time
+
+from parkinglot import Vehicle, VehicleType
+from parkinglot_concurrent import ConcurrentParkingLot, checkNoDoubleBooking
+
+MIX = [VehicleType.CAR] * 6 + [VehicleType.MOTORCYCLE] * 3 + [VehicleType.VAN]
+
+
+def gate_session(spots, shards, gates, events):
+    lot = ConcurrentParkingLot(spots // 10, spots - spots // 10, shards=shards)
+    rng = random.Random(0)
+    parked = [[] for _ in range(gates)]
+    while lot.spotsRemaining()["regular"] > spots // 10:
+        gate = rng.randrange(gates)
+        ticket = lot.park(Vehicle(rng.choice(MIX)), gate=gate)
+        if ticket is not None:
+            parked[gate].append(ticket)
+
+    def run(gate):
+        rng = random.Random(gate)
+        mine = parked[gate]
+        vehicles = [Vehicle(rng.choice(MIX)) for _ in range(events)]
+        for vehicle in vehicles:
+            if mine:
+                lot.unpark(mine.pop(rng.randrange(len(mine))))
+            ticket = lot.park(vehicle, gate=gate)
+            if ticket is not None:
+                mine.append(ticket)
+
+    threads = [threading.Thread(target=run, args=(gate,)) for gate in range(gates)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    checkNoDoubleBooking(lot)
+    return 2 * gates * events / elapsed
+
+
+def main(spots=100_000, events=20_000):
+    print(f"{spots:,} spots at ~90% full, {events:,} park + unpark per gate")
+    print(f"{'gates':>6} {'one lock':>10} {'8 shards':>10}")
+    for gates in (1, 2, 4, 8, 16):
+        single = gate_session(spots, 1, gates, events)
+        sharded = gate_session(spots, 8, gates, events)
+        print(f"{gates:>6} {single:>10,.0f} {sharded:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,91 @@
+"""
+Benchmark for ParkingFederation in parkinglot_federation.py
+
+Spreads garages of 3 levels along a 100km road and asks for the nearest one
+with room for a van from random positions, through the federation's trees
+and by polling every level of every garage, while vehicles park and leave.
+
+    python bench_parkinglot_federation.py            # 100, 1k, 10k garages
+    python bench_parkinglot_federation.py 100 1000
+"""
+import random
+import sys
+import time
+
+from parkinglot import ParkingLot, Vehicle, VehicleType
+from parkinglot_federation import TYPES, Garage, ParkingFederation
+
+MIX = [VehicleType.CAR] * 6 + [VehicleType.MOTORCYCLE] * 3 + [VehicleType.VAN]
+
+
+def poll_nearest(federation, type, position):
+    # what routing costs without the index: ask every level of every garage
+    best = None
+    for g, garage in enumerate(federation.garages):
+        for level, lot in enumerate(garage.levels):
+            if type == VehicleType.VAN:
+                fits = lot.rFree.longest() >= 3
+            elif type == VehicleType.CAR:
+                fits = len(lot.rFree) > 0
+            else:
+                fits = len(lot.mFree) + len(lot.rFree) > 0
+            if fits:
+                distance = abs(garage.position - position)
+                if best is None or distance < best[0]:
+                    best = (distance, g, level)
+                break
+    return best
+
+
+def federation_session(garages, queries=2_000, events=20_000):
+    rng = random.Random(0)
+    federation = ParkingFederation([
+        Garage(str(g), rng.uniform(0, 100), [ParkingLot(10, 60, compact=True) for _ in range(3)])
+        for g in range(garages)
+    ])
+    # fill most of the road up so the nearest van spot is not just next door
+    tickets = []
+    while federation.room(VehicleType.CAR) > garages * 3 * 60 * 0.1:
+        ticket = federation.park(Vehicle(rng.choice(MIX)), rng.uniform(0, 100))
+        if ticket is not None:
+            tickets.append(ticket)
+    timings = {}
+
+    positions = [rng.uniform(0, 100) for _ in range(queries)]
+    start = time.perf_counter()
+    for position in positions:
+        federation.nearest(VehicleType.VAN, position)
+    timings["index"] = (time.perf_counter() - start) / queries
+
+    polls = max(queries // garages, 5)
+    start = time.perf_counter()
+    for position in positions[:polls]:
+        poll_nearest(federation, VehicleType.VAN, position)
+    timings["poll"] = (time.perf_counter() - start) / polls
+
+    start = time.perf_counter()
+    for _ in range(events):
+        # swap the leaver to the end, popping from the middle of a million
+        # tickets costs more than the unpark itself
+        i = rng.randrange(len(tickets))
+        tickets[i], tickets[-1] = tickets[-1], tickets[i]
+        federation.unpark(tickets.pop())
+        ticket = federation.park(Vehicle(rng.choice(MIX)), rng.uniform(0, 100))
+        if ticket is not None:
+            tickets.append(ticket)
+    timings["park+unpark"] = (time.perf_counter() - start) / events
+    return timings
+
+
+def main(*sizes):
+    sizes = sizes or (100, 1_000, 10_000)
+    print("garages of 3 levels x 70 spots, ~90% full, nearest room for a van")
+    print(f"{'garages':>8} {'index':>10} {'polling':>10} {'park+unpark':>12}")
+    for garages in sizes:
+        timings = federation_session(garages)
+        print(f"{garages:>8,} {timings['index'] * 1e6:>8.1f}us {timings['poll'] * 1e3:>8.2f}ms "
+              f"{timings['park+unpark'] * 1e6:>10.1f}us")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
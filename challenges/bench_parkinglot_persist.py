@@ -0,0 +1,131 @@
+"""
+Recovery benchmark for the snapshot + write-ahead log in parkinglot_persist.py
+
+A lot is filled to ~90% and then churned (one unpark, one park) while every
+event goes to the log. At a few log lengths, recovery is timed three ways:
+
+    snapshot + tail   the snapshot taken right after the fill, then only the
+                      records written since
+    full log          the empty lot's snapshot and every record from the
+                      first park on
+    park() replay     the same records run through park() / unpark() on a
+                      new lot, what rebuilding without the log format costs
+
+The snapshot load is also shown on its own. Log writes are timed separately
+for a few group commit sizes (records per fsync).
+
+    python bench_parkinglot_persist.py                  # 10k, 100k and 1M spots
+    python bench_parkinglot_persist.py 10000000
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from parkinglot import ParkingLot, Vehicle, VehicleType
+from parkinglot_persist import (LOG, PARK, SNAPSHOT, PersistentParkingLot, WriteAheadLog, loadSnapshot,
+                                readLog, recover)
+
+MIX = [VehicleType.CAR] * 6 + [VehicleType.MOTORCYCLE] * 3 + [VehicleType.VAN]
+LOG_LENGTHS = (0, 10_000, 100_000, 1_000_000)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def recovery_session(spots):
+    rng = random.Random(0)
+    vehicles = [Vehicle(type) for type in MIX]
+    rows = []
+    with tempfile.TemporaryDirectory() as full, tempfile.TemporaryDirectory() as snapshotted:
+        lot = PersistentParkingLot(full, spots // 10, spots - spots // 10, batch=4096)
+        while lot.spotsRemaining()["regular"] > spots // 10:
+            lot.park(rng.choice(vehicles))
+        lot.sync()
+        # the full directory keeps every record from the empty lot on, the
+        # other one is checkpointed here and only logs what comes after
+        shutil.copytree(full, snapshotted, dirs_exist_ok=True)
+        lot.close()
+        lot = PersistentParkingLot(snapshotted, batch=4096)
+        lot.checkpoint()
+        snapshotBytes = os.path.getsize(os.path.join(snapshotted, SNAPSHOT))
+        tickets = list(lot.lot.tickets)
+
+        written = 0
+        copied = 0
+        for length in LOG_LENGTHS:
+            while written < length:
+                i = rng.randrange(len(tickets))
+                lot.unpark(tickets[i])
+                ticket = lot.park(rng.choice(vehicles))
+                if ticket is None:
+                    tickets[i] = tickets[-1]
+                    tickets.pop()
+                else:
+                    tickets[i] = ticket
+                written += 2
+            lot.sync()
+            with open(os.path.join(snapshotted, LOG), "rb") as f:
+                tail = f.read()
+            with open(os.path.join(full, LOG), "ab") as f:
+                f.write(tail[copied:])
+            copied = len(tail)
+            load, _ = timed(loadSnapshot, os.path.join(snapshotted, SNAPSHOT))
+            tail, (recovered, sequence, _) = timed(recover, snapshotted)
+            replay, (replayed, _, _) = timed(recover, full)
+            parks, parked = timed(park_replay, full, spots)
+            assert sequence == lot.sequence
+            assert recovered.spotsRemaining() == replayed.spotsRemaining() == parked.spotsRemaining() == lot.spotsRemaining()
+            rows.append((length, snapshotBytes, load, tail, lot.sequence, replay, parks))
+        lot.close()
+    return rows
+
+
+def park_replay(directory, spots):
+    # the log run through park() and unpark() on a new lot
+    lot = ParkingLot(spots // 10, spots - spots // 10, compact=True)
+    motorcycle, car, van = (Vehicle(type) for type in (VehicleType.MOTORCYCLE, VehicleType.CAR, VehicleType.VAN))
+    for _, op, row, numRuns, ticket, _ in readLog(os.path.join(directory, LOG)):
+        if op == PARK:
+            # a motorcycle only ends up in the regular row when its own is
+            # full, so parking it as a car picks the same spot
+            lot.park(van if numRuns == 3 else car if row else motorcycle)
+        else:
+            lot.unpark(ticket)
+    return lot
+
+
+def log_session(batch, records):
+    with tempfile.TemporaryDirectory() as directory:
+        log = WriteAheadLog(os.path.join(directory, LOG), batch)
+        start = time.perf_counter()
+        for sequence in range(1, records + 1):
+            log.append(sequence, PARK, 1, 1, sequence, sequence)
+        log.close()
+        return records / (time.perf_counter() - start)
+
+
+def main(*sizes):
+    sizes = sizes or (10_000, 100_000, 1_000_000)
+    print("recovery of a lot ~90% full, times in ms")
+    print(f"{'spots':>10} {'tail records':>13} {'snapshot MB':>12} {'load':>8} "
+          f"{'snapshot+tail':>14} {'all records':>12} {'full log':>9} {'park() replay':>14}")
+    for spots in sizes:
+        for length, snapshotBytes, load, tail, records, replay, parks in recovery_session(spots):
+            print(f"{spots:>10,} {length:>13,} {snapshotBytes / 1e6:>12.2f} {load * 1e3:>8.1f} "
+                  f"{tail * 1e3:>14.1f} {records:>12,} {replay * 1e3:>9.1f} {parks * 1e3:>14.1f}")
+
+    print()
+    print("log writes")
+    print(f"{'records/fsync':>14} {'records/s':>12}")
+    for batch in (1, 16, 256, 4096):
+        print(f"{batch:>14,} {log_session(batch, min(200_000, 2_000 * batch)):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""
+Capacity planning runs of the ParkingLot simulator in parkinglot_sim.py
+
+Replays a stream of Poisson arrivals and departures against a few garages
+and reports throughput, how many arrivals were turned away, park / unpark
+latency percentiles and how full the lot was over the run.
+
+    python bench_parkinglot_sim.py                 # 1M events per scenario
+    python bench_parkinglot_sim.py 5000000
+"""
+import sys
+
+from parkinglot import ParkingLot, VehicleType
+from parkinglot_sim import generateEvents, rateForLoad, replay
+
+STAY = 120.0
+
+SCENARIOS = [
+    # name, motorcycle spots, regular spots, load, mix
+    ("quiet", 1_000, 9_000, 0.6, None),
+    ("busy", 1_000, 9_000, 0.95, None),
+    ("overbooked", 1_000, 9_000, 1.2, None),
+    ("van heavy", 1_000, 9_000, 0.9,
+     {VehicleType.MOTORCYCLE: 0.1, VehicleType.CAR: 0.5, VehicleType.VAN: 0.4}),
+    ("big garage", 10_000, 90_000, 0.95, None),
+]
+
+
+def main(count=1_000_000):
+    print(f"{count:,} events per scenario, mean stay {STAY:.0f} minutes")
+    print(f"{'scenario':<11} {'events/s':>9} {'turned away':>12} "
+          f"{'park p50/p99/p99.9 us':>22} {'unpark p50/p99/p99.9 us':>24} {'full min/avg/max':>17}")
+    for name, motorcycleSpots, regularSpots, load, mix in SCENARIOS:
+        lot = ParkingLot(motorcycleSpots, regularSpots, compact=True)
+        events = generateEvents(count, rateForLoad(lot, STAY, load, mix), STAY, mix)
+        report = replay(lot, events)
+        park = report["park us"]
+        unpark = report["unpark us"]
+        # skip the first tenth of the run while the lot is still filling up
+        samples = [full for _, full in report["occupancy"]]
+        samples = samples[len(samples) // 10:] or samples
+        print(f"{name:<11} {report['events/sec']:>9,.0f} {report['rejected'] / report['parks']:>11.1%} "
+              f"{park[50]:>6.1f}/{park[99]:>5.1f}/{park[99.9]:>6.1f}     "
+              f"{unpark[50]:>6.1f}/{unpark[99]:>5.1f}/{unpark[99.9]:>6.1f}      "
+              f"{min(samples):>4.0%}/{sum(samples) / len(samples):>4.0%}/{max(samples):>4.0%}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
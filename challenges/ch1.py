@@ -73,9 +73,121 @@ Notes
 
 
 from abc import ABC, abstractmethod # this is really important to import for abstract base classes because
+import mmap
+import os
+import re
+from array import array
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple, Union
+
+
+def _number(text: str):
+    # balances keep the type they were written in, 2000 stays an int
+    return float(text) if "." in text or "e" in text or "E" in text else int(text)
+
+
+# everything but the two separators, deleting it leaves b"--\n" per record
+_NOT_SEPARATORS = bytes(b for b in range(256) if b not in b"-\n")
+# a dash with two more after it on the same line, so part of the name
+_NAME_DASH = re.compile(rb"-(?=[^\n-]*-[^\n-]*-)")
+
+
+def _two_dashes(chunk: bytes, lines: int) -> bool:
+    return chunk.translate(None, _NOT_SEPARATORS) == b"--\n" * (lines - 1) + b"--"
+
+
+def _parse(chunk: bytes, number=float) -> Tuple[List[str], array, list]:
+    # (names, account numbers, balances) of a chunk of whole lines, the
+    # balances through `number`. when every line has exactly two dashes the
+    # chunk is split in one go. dashes in names are swapped for NULs first
+    # and back after, and anything else is done a line at a time
+    chunk = chunk.replace(b"\r", b"")
+    while b"\n\n" in chunk:
+        chunk = chunk.replace(b"\n\n", b"\n")
+    chunk = chunk.strip(b"\n")
+    if not chunk:
+        return [], array('q'), []
+    lines = chunk.count(b"\n") + 1
+    original = chunk
+    dashed = not _two_dashes(chunk, lines) and b"\0" not in chunk
+    if dashed:
+        chunk = _NAME_DASH.sub(b"\0", chunk)
+    if _two_dashes(chunk, lines):
+        fields = chunk.decode().replace("\n", "-").split("-")
+        names, balances = fields[0::3], fields[2::3]
+        if dashed:
+            names = "\n".join(names).replace("\0", "-").split("\n")
+        try:
+            return names, array('q', map(int, fields[1::3])), list(map(number, balances))
+        except ValueError:
+            # one of them is bad, the loop below says which
+            pass
+    names, numbers, balances = [], array('q'), []
+    # only decoded here, the fast path above decodes its own chunk
+    for line in original.decode().split("\n"):
+        parts = line.rsplit("-", 2)
+        try:
+            if len(parts) != 3:
+                raise ValueError
+            numbers.append(int(parts[1]))
+            balances.append(number(parts[2]))
+        except ValueError:
+            raise ValueError(f"not a name-account_number-balance record: {line!r}") from None
+        names.append(parts[0])
+    return names, numbers, balances
+
+
+def _chunks(source: Union[str, os.PathLike, Iterable], chunk_size: int, use_mmap: bool) -> Iterator[bytes]:
+    # whole lines, about chunk_size bytes at a time
+    if not isinstance(source, (str, os.PathLike)):
+        lines = iter(source)
+        while True:
+            batch = list(islice(lines, max(chunk_size // 32, 1)))
+            if not batch:
+                return
+            joined = ("\n" if isinstance(batch[0], str) else b"\n").join(batch)
+            yield joined.encode() if isinstance(joined, str) else joined
+    with open(source, "rb") as f:
+        if use_mmap:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                start = 0
+                while start < len(data):
+                    end = data.find(b"\n", start + chunk_size)
+                    end = len(data) if end == -1 else end + 1
+                    yield data[start:end]
+                    start = end
+            return
+        tail = b""
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                if tail:
+                    yield tail
+                return
+            block = tail + block
+            cut = block.rfind(b"\n") + 1
+            tail = block[cut:]
+            if cut:
+                yield block[:cut]
 
 
 class BankAccount(ABC):
+    # no fields of its own here, so a subclass can do without a __dict__
+    # (CompactSavingsAccount below). subclasses that don't set __slots__
+    # get one as usual
+    __slots__ = ()
+
+    # flat yearly rate SavingsAccount.calculate_interest charges, AccountBook
+    # does a whole portfolio of those in one pass. classes with a
+    # calculate_interest of their own get called one by one whatever this is
+    interest_rate = None
+    # the AccountRegistry (ch1_registry.py) holding this account, told about
+    # every deposit and withdraw so its balance index stays in order
+    registry = None
+    # the Ledger (ch1_ledger.py) journaling this account's balance changes
+    ledger = None
 
     def __init__(self, name: str, acct_num: int, balance: int) -> None:
         self.name = name
@@ -87,8 +199,35 @@ class BankAccount(ABC):
         pass
 
     def __eq__(self, other: 'BankAccount') -> bool: # this 'BankAccount' syntax is new and important to keep in mind
+        if not isinstance(other, BankAccount):
+            return NotImplemented
         return self.acct_num == other.acct_num
 
+    # defining __eq__ drops the inherited __hash__, hash the same thing ==
+    # looks at so accounts go in sets and dicts (and set(accounts) dedupes)
+    def __hash__(self) -> int:
+        return hash(self.acct_num)
+
+    def deposit(self, amount) -> None:
+        if amount <= 0:
+            raise ValueError(f"deposit must be positive, got {amount}")
+        self._set_balance(self.balance + amount)
+
+    def withdraw(self, amount) -> None:
+        if amount <= 0:
+            raise ValueError(f"withdrawal must be positive, got {amount}")
+        if not self.is_valid_balance(self.balance - amount):
+            raise ValueError(f"account {self.acct_num} has {self.balance}, can't withdraw {amount}")
+        self._set_balance(self.balance - amount)
+
+    def _set_balance(self, balance) -> None:
+        old = self.balance
+        self.balance = balance
+        if self.registry is not None:
+            self.registry._moved(self, old)
+        if self.ledger is not None:
+            self.ledger._moved(self, old)
+
     @staticmethod
     def is_valid_balance(balance) -> bool:
         return balance >= 0
@@ -99,29 +238,99 @@ class BankAccount(ABC):
 
 
 class SavingsAccount(BankAccount):
+    interest_rate = 0.05
 
     def __init__(self, name: str, acct_num: int, balance: int) -> None:
         super().__init__(name, acct_num, balance)
 
     def calculate_interest(self) -> float:
-        return self.balance * 0.05
+        return self.balance * self.interest_rate
 
     @classmethod
     def from_string(cls, data):
-        splitData = data.split('-')
-        return cls(splitData[0], splitData[1], splitData[2])
-
-
-acc1 = SavingsAccount("Alice", 101, 1000)
-acc2 = SavingsAccount.from_string("Bob-102-2000")
+        # split from the right so a name can have a dash in it
+        splitData = data.rsplit('-', 2)
+        return cls(splitData[0], int(splitData[1]), _number(splitData[2]))
 
-print(acc1 == acc2)                   # False
-print(SavingsAccount.is_valid_balance(500))  # True
-print(acc1.calculate_interest())      # should return interest amount
-
-
-print(acc1)           # triggers __str__
-print([acc1, acc2])   # collections show __repr__ for their items
+    @classmethod
+    def load_many(cls, source, book=None, chunk_size: int = 1 << 20, use_mmap: bool = False):
+        # "name-account_number-balance" records from a file path or an
+        # iterable of lines (a file object, a generator...), a chunk at a
+        # time so a file of any size streams through. use_mmap reads a path
+        # through mmap instead of read(). blank lines are skipped.
+        # without a book it returns an iterator of accounts, with an
+        # AccountBook (ch1_book.py) it appends the records to its columns
+        # and returns the book
+        chunks = _chunks(source, chunk_size, use_mmap)
+        if book is None:
+            return (account for chunk in chunks for account in map(cls, *_parse(chunk, _number)))
+        for chunk in chunks:
+            book.add_many(cls, *_parse(chunk))
+        return book
+
+
+class CompactSavingsAccount(BankAccount):
+    # a SavingsAccount with its fields in __slots__ instead of a __dict__,
+    # for holding millions of accounts as objects. same methods, and
+    # registered as a SavingsAccount so isinstance() checks take it
+    __slots__ = ("name", "acct_num", "balance", "_registry", "_ledger")
+
+    interest_rate = SavingsAccount.interest_rate
+    calculate_interest = SavingsAccount.calculate_interest
+    from_string = vars(SavingsAccount)["from_string"]
+    load_many = vars(SavingsAccount)["load_many"]
+
+    # registry and ledger read None until set, like the class attributes
+    # do for an account with a __dict__
+
+    @property
+    def registry(self):
+        return getattr(self, "_registry", None)
+
+    @registry.setter
+    def registry(self, registry) -> None:
+        self._registry = registry
+
+    @property
+    def ledger(self):
+        return getattr(self, "_ledger", None)
+
+    @ledger.setter
+    def ledger(self, ledger) -> None:
+        self._ledger = ledger
+
+
+SavingsAccount.register(CompactSavingsAccount)
+
+
+if __name__ == "__main__":
+    acc1 = SavingsAccount("Alice", 101, 1000)
+    acc2 = SavingsAccount.from_string("Bob-102-2000")
+
+    print(acc1 == acc2)                   # False
+    print(SavingsAccount.is_valid_balance(500))  # True
+    print(acc1.calculate_interest())      # should return interest amount
+
+
+    print(acc1)           # triggers __str__
+    print([acc1, acc2])   # collections show __repr__ for their items
+
+    # many at once, from any iterable of lines or a file
+    lines = ["Carol-103-150.5", "", "Mary-Ann-104-20", "Dan-105-0\r"]
+    assert [(a.name, a.acct_num, a.balance) for a in SavingsAccount.load_many(lines)] == \
+        [("Carol", 103, 150.5), ("Mary-Ann", 104, 20), ("Dan", 105, 0)]
+    assert SavingsAccount.from_string("Mary-Ann-104-20").calculate_interest() == 1.0
+
+    acc1.deposit(500)
+    acc1.withdraw(1500)
+    assert acc1.balance == 0 and len({acc1, acc2, SavingsAccount("Alice again", 101, 5)}) == 2
+
+    # compact records, the same accounts without a __dict__ each
+    acc3 = CompactSavingsAccount.from_string("Carol-103-150")
+    acc3.deposit(50)
+    assert isinstance(acc3, SavingsAccount) and acc3.calculate_interest() == 10.0
+    assert acc3 == SavingsAccount("Carol", 103, 0) and acc3.registry is None and not hasattr(acc3, "__dict__")
+    print(acc3)
 
 
 
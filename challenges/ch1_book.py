@@ -0,0 +1,211 @@
+"""
+Whole portfolios of BankAccounts as columns
+
+AccountBook keeps every account as one row of parallel columns instead of
+an object each:
+
+    names      list of str
+    acct_nums  array('q')
+    balances   array('d')
+    kinds      bytearray, index into `classes` (SavingsAccount, ...)
+    rates      array('d'), the class's interest_rate for every row
+
+calculate_interest_bulk() is then one pass over the balances (times the one
+rate when every row has the same, times the rates column otherwise) and
+apply_interest() the same pass adding the result back, no method call per
+account. That is only for classes whose calculate_interest is
+SavingsAccount's balance * interest_rate. Rows of any other class, a
+subclass overriding calculate_interest included (it still inherits the
+0.05 rate), go through their own calculate_interest one at a time.
+
+book[row] hands out a thin view of the row: an instance of the account's
+class whose name / acct_num / balance read and write the columns, so
+==, repr, calculate_interest and everything else on the class work as
+they do on a normal account.
+"""
+from array import array
+from math import fsum
+from operator import add, mul
+from typing import Dict, Iterable, Optional, Type
+
+from ch1 import BankAccount, SavingsAccount
+
+
+def _column(field: str, doc: str) -> property:
+    def get(self):
+        return getattr(self.book, field)[self.row]
+
+    def set(self, value):
+        getattr(self.book, field)[self.row] = value
+
+    return property(get, set, doc=doc)
+
+
+_views: Dict[type, type] = {}
+
+
+def _view_class(cls: Type[BankAccount]) -> type:
+    # a subclass of cls whose fields live in the book, named like cls so it
+    # looks the same from outside
+    view = _views.get(cls)
+    if view is None:
+        def __init__(self, book: "AccountBook", row: int) -> None:
+            self.book = book
+            self.row = row
+
+        view = type(cls.__name__, (cls,), {
+            "__slots__": ("book", "row"),
+            "__init__": __init__,
+            "__module__": cls.__module__,
+            "__qualname__": cls.__qualname__,
+            "name": _column("names", "account holder"),
+            "acct_num": _column("acct_nums", "account number"),
+            "balance": _column("balances", "balance, a float in the book"),
+        })
+        _views[cls] = view
+    return view
+
+
+def _flat_rate(cls: Type[BankAccount]) -> Optional[float]:
+    # the rate the bulk pass may multiply by, None when the class works its
+    # interest out some other way
+    if cls.calculate_interest is SavingsAccount.calculate_interest:
+        return cls.interest_rate
+    return None
+
+
+class AccountBook:
+    def __init__(self):
+        self.names = []
+        self.acct_nums = array('q')
+        self.balances = array('d')
+        self.kinds = bytearray()
+        self.rates = array('d')
+        self.classes = []
+        # rows whose class has no flat rate, see _flat_rate
+        self.custom = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, row: int) -> BankAccount:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return _view_class(self.classes[self.kinds[row]])(self, row)
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def add(self, cls: Type[BankAccount], name: str, acct_num: int, balance: float) -> BankAccount:
+        # a new account of class cls, returns its view
+        if cls not in self.classes:
+            self.classes.append(cls)
+        row = len(self)
+        self.names.append(name)
+        self.acct_nums.append(int(acct_num))
+        self.balances.append(float(balance))
+        self.kinds.append(self.classes.index(cls))
+        rate = _flat_rate(cls)
+        if rate is None:
+            self.rates.append(0.0)
+            self.custom.append(row)
+        else:
+            self.rates.append(rate)
+        return _view_class(cls)(self, row)
+
+    def add_many(self, cls: Type[BankAccount], names: Iterable[str], acct_nums: Iterable[int],
+                 balances: Iterable[float]) -> None:
+        # a column at a time, for loaders, no views made
+        names = list(names)
+        acct_nums = acct_nums if isinstance(acct_nums, array) else array('q', acct_nums)
+        balances = balances if isinstance(balances, array) else array('d', balances)
+        if not len(names) == len(acct_nums) == len(balances):
+            raise ValueError("names, acct_nums and balances differ in length")
+        if cls not in self.classes:
+            self.classes.append(cls)
+        start = len(self)
+        count = len(names)
+        self.names.extend(names)
+        self.acct_nums.extend(acct_nums)
+        self.balances.extend(balances)
+        self.kinds.extend(bytes([self.classes.index(cls)]) * count)
+        rate = _flat_rate(cls)
+        if rate is None:
+            self.rates.extend(array('d', [0.0]) * count)
+            self.custom.extend(range(start, len(self)))
+        else:
+            self.rates.extend(array('d', [rate]) * count)
+
+    def add_account(self, account: BankAccount) -> BankAccount:
+        # copies an existing account into the book
+        return self.add(type(account), account.name, account.acct_num, account.balance)
+
+    @classmethod
+    def from_accounts(cls, accounts: Iterable[BankAccount]) -> "AccountBook":
+        book = cls()
+        for account in accounts:
+            book.add_account(account)
+        return book
+
+    def _rate(self) -> Optional[float]:
+        # the rate every row pays when there is just one, the usual case,
+        # multiplying by a constant skips reading the rates column
+        rates = {_flat_rate(cls) for cls in self.classes}
+        return rates.pop() if len(rates) == 1 and None not in rates else None
+
+    def calculate_interest_bulk(self) -> array:
+        # every account's calculate_interest(), in row order
+        rate = self._rate()
+        if rate is not None:
+            return array('d', [balance * rate for balance in self.balances])
+        interest = array('d', map(mul, self.balances, self.rates))
+        for row in self.custom:
+            interest[row] = self[row].calculate_interest()
+        return interest
+
+    def apply_interest(self) -> float:
+        # pays everyone their interest, returns the total paid (to within
+        # rounding, it is the change in the sum of the balances)
+        before = fsum(self.balances)
+        rate = self._rate()
+        if rate is not None:
+            self.balances[:] = array('d', [balance + balance * rate for balance in self.balances])
+        else:
+            self.balances[:] = array('d', map(add, self.balances, self.calculate_interest_bulk()))
+        return fsum(self.balances) - before
+
+
+if __name__ == "__main__":
+    class CheckingAccount(BankAccount):
+        # no flat rate, pays 1% only on the part over 1000
+        def calculate_interest(self) -> float:
+            return max(self.balance - 1000, 0) * 0.01
+
+    accounts = [SavingsAccount("Alice", 101, 1000), SavingsAccount.from_string("Bob-102-2000"),
+                CheckingAccount("Carol", 103, 5000)]
+    book = AccountBook.from_accounts(accounts)
+    assert list(book.calculate_interest_bulk()) == [50.0, 100.0, 40.0]
+
+    # the views are the account classes, backed by the columns
+    alice = book[0]
+    assert isinstance(alice, SavingsAccount) and alice == accounts[0]
+    assert alice.calculate_interest() == 50.0
+    alice.balance += 1000
+    assert book.balances[0] == 2000.0
+    assert book.apply_interest() == 100.0 + 100.0 + 40.0
+    assert [account.balance for account in book] == [2100.0, 2100.0, 5040.0]
+    print(list(book))
+
+    # a SavingsAccount that works its interest out itself still inherits the
+    # 0.05 rate, the book calls its method instead of using the rate
+    class BonusSavingsAccount(SavingsAccount):
+        def calculate_interest(self) -> float:
+            return super().calculate_interest() + 10
+
+    book = AccountBook()
+    book.add_many(BonusSavingsAccount, ["Dan", "Eve"], [104, 105], [1000, 0])
+    assert list(book.calculate_interest_bulk()) == [60.0, 10.0]
+    book.add(SavingsAccount, "Fay", 106, 1000)
+    assert book.apply_interest() == 60.0 + 10.0 + 50.0
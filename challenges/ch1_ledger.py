@@ -0,0 +1,507 @@
+"""
+BankAccount balances journaled to disk
+
+A Ledger keeps every account's name and balance in a directory:
+
+    balances.bin  every account as of some log sequence, rewritten by
+                  compaction
+    ledger.log    every change since, appended as it happens
+    ledger.old    the log before that while a compaction folds it into
+                  balances.bin, gone once it has
+    archive/      folded logs, kept in order when archive=True so the whole
+                  history of an account can still be read back
+
+The snapshot is a header and then columns sorted by acct_num, no pickling:
+
+    header        magic, version, accounts, bytes of names, last sequence
+    acct_nums     int64
+    balances      float64
+    name ends     int64, where each account's name stops in the names
+    names         utf-8, one after the other
+
+A log record is a fixed head (sequence, OPEN or CHANGE, acct_num, change,
+balance after it, name length), the name for an OPEN, and a crc32 of all of
+it. Records are buffered and written with one fsync per `batch` (group
+commit), sync() forces the rest out. A record cut short or with a bad crc
+ends the log, it was being written when the process died, and is cut off
+before anything new goes after it.
+
+Opening a ledger maps the snapshot and copies its columns straight into
+arrays, then applies the log records past the snapshot's sequence. Accounts
+in the snapshot are found by bisecting the sorted acct_nums, so there's no
+dict of millions of entries to build. Accounts opened since the snapshot
+sit in a dict.
+
+Compaction never touches the ledger in memory. Once `compact_every`
+records are in the log (or on compact()), the log is renamed to ledger.old
+and a new one started, and a background thread merges the old snapshot and
+ledger.old, both from disk, into a new snapshot. A crash partway leaves
+either the old snapshot with ledger.old still there, and opening replays it
+and starts the compaction again, or the new snapshot, whose sequence makes
+the replay skip every record of ledger.old.
+
+Accounts handed out by account() (or given to add()) journal their own
+deposit() and withdraw() through BankAccount.ledger.
+"""
+import mmap
+import os
+import random
+import struct
+import tempfile
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, Optional, Tuple, Type
+
+from ch1 import BankAccount, SavingsAccount
+
+SNAPSHOT = "balances.bin"
+LOG = "ledger.log"
+OLD = "ledger.old"
+ARCHIVE = "archive"
+MAGIC = b"LDGR"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQQ")
+HEAD = struct.Struct("<QBqddH")
+CRC = struct.Struct("<I")
+OPEN = 1
+CHANGE = 2
+
+
+def _sync_directory(path: str) -> None:
+    # makes a rename in the directory durable
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def save_snapshot(path: str, acct_nums: array, balances: array, ends: array, names: bytes,
+                  sequence: int = 0) -> None:
+    # columns already sorted by acct_num. written next to `path` and renamed
+    # over it, a crash leaves the old one
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(acct_nums), len(names), sequence))
+        acct_nums.tofile(f)
+        balances.tofile(f)
+        ends.tofile(f)
+        f.write(names)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    _sync_directory(path)
+
+
+def load_snapshot(path: str) -> Tuple[array, array, array, bytes, int]:
+    # (acct_nums, balances, name ends, names, last sequence in it)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, count, size, sequence = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} ledger snapshot")
+        if len(data) != HEADER.size + 24 * count + size:
+            raise ValueError(f"{path} is {len(data)} bytes, expected {HEADER.size + 24 * count + size}")
+        offset = HEADER.size
+        columns = []
+        for typecode in "qdq":
+            column = array(typecode)
+            column.frombytes(data[offset:offset + 8 * count])
+            columns.append(column)
+            offset += 8 * count
+        names = data[offset:offset + size]
+    return columns[0], columns[1], columns[2], names, sequence
+
+
+def read_log(path: str) -> Iterator[Tuple[int, int, int, float, float, bytes]]:
+    # (sequence, OPEN or CHANGE, acct_num, change, balance, name) up to the
+    # first torn or damaged record. the name is utf-8, empty for a CHANGE
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        offset = 0
+        while offset + HEAD.size + CRC.size <= len(data):
+            *head, length = HEAD.unpack_from(data, offset)
+            end = offset + HEAD.size + length
+            if end + CRC.size > len(data) or zlib.crc32(data[offset:end]) != CRC.unpack_from(data, end)[0]:
+                return
+            yield (*head, data[offset + HEAD.size:end])
+            offset = end + CRC.size
+
+
+def _record_size(name: bytes) -> int:
+    return HEAD.size + len(name) + CRC.size
+
+
+class LedgerLog:
+    def __init__(self, path: str, batch: int = 256, end: Optional[int] = None):
+        # end: length of the good part of an existing log, anything after it
+        # is dropped
+        self.path = path
+        self.batch = batch
+        self.file = open(path, "ab")
+        if end is not None:
+            self.file.truncate(end)
+        self.pending = bytearray()
+        self.count = 0
+
+    def append(self, sequence: int, op: int, acct_num: int, change: float, balance: float,
+               name: bytes = b"") -> None:
+        start = len(self.pending)
+        self.pending += HEAD.pack(sequence, op, acct_num, change, balance, len(name))
+        self.pending += name
+        self.pending += CRC.pack(zlib.crc32(memoryview(self.pending)[start:]))
+        self.count += 1
+        if self.count >= self.batch:
+            self.sync()
+
+    def sync(self) -> None:
+        # everything appended so far is on disk once this returns
+        if self.pending:
+            self.file.write(self.pending)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending.clear()
+            self.count = 0
+
+    def close(self) -> None:
+        self.sync()
+        self.file.close()
+
+
+def _fold(acct_nums: array, balances: array, records, sequence: int,
+          opened: Dict[int, list]) -> Tuple[int, int, int]:
+    # applies the records past `sequence` to the balances column (accounts
+    # in the snapshot) and `opened` (acct_num -> [name, balance], the ones
+    # that aren't). returns (last sequence, records read, their bytes)
+    count = size = 0
+    for record_sequence, op, acct_num, _, balance, name in records:
+        count += 1
+        size += _record_size(name)
+        if record_sequence <= sequence:
+            continue
+        row = bisect_left(acct_nums, acct_num)
+        known = row < len(acct_nums) and acct_nums[row] == acct_num
+        if op == OPEN:
+            if known or acct_num in opened:
+                raise ValueError(f"log record {record_sequence} opens account {acct_num} twice")
+            opened[acct_num] = [name.decode(), balance]
+        elif known:
+            balances[row] = balance
+        elif acct_num in opened:
+            opened[acct_num][1] = balance
+        else:
+            raise ValueError(f"log record {record_sequence} changes unknown account {acct_num}")
+        sequence = record_sequence
+    return sequence, count, size
+
+
+def _merge(acct_nums: array, balances: array, ends: array, names: bytes,
+           opened: Dict[int, list]) -> Tuple[array, array, array, bytes]:
+    # the snapshot columns with the `opened` accounts put in acct_num order
+    if not opened:
+        return acct_nums, balances, ends, names
+    new_nums, new_balances, new_ends, new_names = array('q'), array('d'), array('q'), bytearray()
+    start = 0
+    for acct_num in sorted(opened) + [None]:
+        row = len(acct_nums) if acct_num is None else bisect_left(acct_nums, acct_num, start)
+        # rows start..row of the snapshot, their name ends moved by however
+        # much the names before them have grown
+        begin = ends[start - 1] if start else 0
+        shift = len(new_names) - begin
+        new_nums += acct_nums[start:row]
+        new_balances += balances[start:row]
+        new_ends += ends[start:row] if not shift else array('q', [end + shift for end in ends[start:row]])
+        new_names += names[begin:ends[row - 1] if row else 0]
+        if acct_num is not None:
+            name, balance = opened[acct_num]
+            new_nums.append(acct_num)
+            new_balances.append(balance)
+            new_names += name.encode()
+            new_ends.append(len(new_names))
+        start = row
+    return new_nums, new_balances, new_ends, bytes(new_names)
+
+
+def compact_files(directory: str, archive: bool = False) -> int:
+    # folds ledger.old into balances.bin from the files alone, then drops it
+    # or moves it to archive/. returns the new snapshot's sequence
+    path = os.path.join(directory, SNAPSHOT)
+    old = os.path.join(directory, OLD)
+    acct_nums, balances, ends, names, sequence = load_snapshot(path)
+    opened = {}
+    first = sequence + 1
+    sequence, _, _ = _fold(acct_nums, balances, read_log(old), sequence, opened)
+    save_snapshot(path, *_merge(acct_nums, balances, ends, names, opened), sequence)
+    if archive:
+        os.makedirs(os.path.join(directory, ARCHIVE), exist_ok=True)
+        os.replace(old, os.path.join(directory, ARCHIVE, f"{first:020}-{sequence:020}.log"))
+    else:
+        os.remove(old)
+    _sync_directory(old)
+    return sequence
+
+
+class Ledger:
+    def __init__(self, directory: str, batch: int = 256, compact_every: int = 1_000_000,
+                 archive: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compact_every = compact_every
+        self.archive = archive
+        self.lock = threading.Lock()
+        self.compactor = None
+        self.error = None
+        # accounts handed out by account(), so there is one object per acct_num
+        self.live = {}
+        path = os.path.join(directory, SNAPSHOT)
+        if not os.path.exists(path):
+            save_snapshot(path, array('q'), array('d'), array('q'), b"")
+        self.acct_nums, self.balances, self.ends, self.names, self.sequence = load_snapshot(path)
+        self.opened = {}
+        old = os.path.join(directory, OLD)
+        self.sequence, _, _ = _fold(self.acct_nums, self.balances, read_log(old), self.sequence, self.opened)
+        self.sequence, self.records, size = _fold(self.acct_nums, self.balances,
+                                                  read_log(os.path.join(directory, LOG)),
+                                                  self.sequence, self.opened)
+        self.log = LedgerLog(os.path.join(directory, LOG), batch, size)
+        if os.path.exists(old):
+            # a compaction that didn't finish
+            self._start_compaction()
+
+    def __len__(self) -> int:
+        return len(self.acct_nums) + len(self.opened)
+
+    def _row(self, acct_num: int) -> int:
+        # row in the snapshot columns, -1 if the account isn't there
+        row = bisect_left(self.acct_nums, acct_num)
+        return row if row < len(self.acct_nums) and self.acct_nums[row] == acct_num else -1
+
+    def __contains__(self, acct_num: int) -> bool:
+        return acct_num in self.opened or self._row(acct_num) >= 0
+
+    def __iter__(self) -> Iterator[int]:
+        # acct_nums, the ones in the snapshot in order and then the rest
+        yield from self.acct_nums
+        yield from list(self.opened)
+
+    def balance(self, acct_num: int) -> float:
+        row = self._row(acct_num)
+        if row >= 0:
+            return self.balances[row]
+        return self.opened[acct_num][1]
+
+    def name(self, acct_num: int) -> str:
+        row = self._row(acct_num)
+        if row >= 0:
+            return self.names[self.ends[row - 1] if row else 0:self.ends[row]].decode()
+        return self.opened[acct_num][0]
+
+    def open(self, name: str, acct_num: int, balance: float = 0) -> None:
+        if not BankAccount.is_valid_balance(balance):
+            raise ValueError(f"account {acct_num} can't open at {balance}")
+        with self.lock:
+            if acct_num in self:
+                raise ValueError(f"account {acct_num} is already in the ledger")
+            encoded = name.encode()
+            if len(encoded) > 0xFFFF:
+                raise ValueError(f"name of account {acct_num} is over 65535 bytes")
+            self.sequence += 1
+            self.log.append(self.sequence, OPEN, acct_num, balance, balance, encoded)
+            self.opened[acct_num] = [name, balance]
+            self.records += 1
+        self._maybe_compact()
+
+    def add(self, account: BankAccount) -> BankAccount:
+        # opens an account for an existing object, which then journals its
+        # own deposits and withdrawals
+        if account.ledger is not None:
+            raise ValueError(f"account {account.acct_num} belongs to another ledger")
+        self.open(account.name, account.acct_num, account.balance)
+        account.ledger = self
+        self.live[account.acct_num] = account
+        return account
+
+    def account(self, acct_num: int, cls: Type[BankAccount] = SavingsAccount) -> BankAccount:
+        account = self.live.get(acct_num)
+        if account is None:
+            account = cls(self.name(acct_num), acct_num, self.balance(acct_num))
+            account.ledger = self
+            account = self.live.setdefault(acct_num, account)
+        return account
+
+    def _record(self, acct_num: int, change: float, balance: Optional[float] = None) -> None:
+        # one CHANGE, to `balance` or by `change` from what the ledger has
+        with self.lock:
+            row = self._row(acct_num)
+            if row < 0 and acct_num not in self.opened:
+                raise KeyError(acct_num)
+            if balance is None:
+                balance = (self.balances[row] if row >= 0 else self.opened[acct_num][1]) + change
+                if not BankAccount.is_valid_balance(balance):
+                    raise ValueError(f"account {acct_num} can't go to {balance}")
+            self.sequence += 1
+            self.log.append(self.sequence, CHANGE, acct_num, change, balance)
+            if row >= 0:
+                self.balances[row] = balance
+            else:
+                self.opened[acct_num][1] = balance
+            self.records += 1
+        self._maybe_compact()
+
+    def _moved(self, account: BankAccount, old) -> None:
+        # an attached account's balance went from old to what it is now
+        self._record(account.acct_num, account.balance - old, account.balance)
+
+    def deposit(self, acct_num: int, amount) -> None:
+        if amount <= 0:
+            raise ValueError(f"deposit must be positive, got {amount}")
+        if acct_num in self.live:
+            self.live[acct_num].deposit(amount)
+        else:
+            self._record(acct_num, amount)
+
+    def withdraw(self, acct_num: int, amount) -> None:
+        if amount <= 0:
+            raise ValueError(f"withdrawal must be positive, got {amount}")
+        if acct_num in self.live:
+            self.live[acct_num].withdraw(amount)
+        else:
+            self._record(acct_num, -amount)
+
+    def history(self, acct_num: int) -> Iterator[Tuple[int, float, float]]:
+        # (sequence, change, balance after) for the account from every log
+        # still on disk, complete only with archive=True
+        self.sync()
+        archive = os.path.join(self.directory, ARCHIVE)
+        paths = [os.path.join(archive, name) for name in sorted(os.listdir(archive))] if os.path.isdir(archive) else []
+        paths += [os.path.join(self.directory, OLD), os.path.join(self.directory, LOG)]
+        last = 0
+        for path in paths:
+            for sequence, _, record_num, change, balance, _ in read_log(path):
+                # an archived or folded log can still be around after its
+                # records are elsewhere too
+                if record_num == acct_num and sequence > last:
+                    last = sequence
+                    yield sequence, change, balance
+
+    def sync(self) -> None:
+        with self.lock:
+            self.log.sync()
+
+    def _maybe_compact(self) -> None:
+        if self.records >= self.compact_every and (self.compactor is None or not self.compactor.is_alive()):
+            self.compact(wait=False)
+
+    def _start_compaction(self) -> None:
+        def run():
+            try:
+                compact_files(self.directory, self.archive)
+            except Exception as error:
+                self.error = error
+
+        self.compactor = threading.Thread(target=run, name="ledger compaction", daemon=True)
+        self.compactor.start()
+
+    def _check(self) -> None:
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("ledger compaction failed") from error
+
+    def compact(self, wait: bool = True) -> None:
+        # starts a new log and folds the old one into the snapshot in the
+        # background, waiting for it with wait=True. does nothing while a
+        # compaction is still running unless waiting
+        if wait and self.compactor is not None:
+            self.compactor.join()
+        with self.lock:
+            if self.compactor is not None and self.compactor.is_alive():
+                return
+            self._check()
+            old = os.path.join(self.directory, OLD)
+            if os.path.exists(old):
+                # left by a compaction that failed, it goes in first
+                compact_files(self.directory, self.archive)
+            if self.records:
+                self.log.close()
+                os.replace(os.path.join(self.directory, LOG), os.path.join(self.directory, OLD))
+                _sync_directory(self.log.path)
+                self.log = LedgerLog(os.path.join(self.directory, LOG), self.log.batch)
+                self.records = 0
+                self._start_compaction()
+        if wait and self.compactor is not None:
+            self.compactor.join()
+            self._check()
+
+    def close(self) -> None:
+        if self.compactor is not None:
+            self.compactor.join()
+        with self.lock:
+            self.log.close()
+        self._check()
+
+
+def _state(ledger: Ledger) -> Dict[int, Tuple[str, float]]:
+    return {acct_num: (ledger.name(acct_num), ledger.balance(acct_num)) for acct_num in ledger}
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = Ledger(directory)
+        alice = ledger.add(SavingsAccount("Alice", 101, 100))
+        ledger.open("Bob", 102, 50)
+        alice.withdraw(30)
+        ledger.compact()
+        ledger.deposit(102, 25)
+        ledger.account(101).deposit(5)
+        ledger.sync()
+        ledger.deposit(101, 1000)
+        # the process dies here: the last deposit was never synced, and half
+        # a record is left at the end of the log
+        with open(os.path.join(directory, LOG), "ab") as f:
+            f.write(b"\x07" * 10)
+
+        again = Ledger(directory)
+        assert _state(again) == {101: ("Alice", 75), 102: ("Bob", 75)}
+        bob = again.account(102)
+        bob.withdraw(75)
+        try:
+            again.withdraw(102, 1)
+            raise AssertionError("overdrew Bob")
+        except ValueError:
+            pass
+        again.close()
+        assert Ledger(directory).balance(102) == 0
+    print('recovered the ledger from snapshot + log tail')
+
+    # random opens, deposits, withdrawals, compactions and crashes against
+    # plain dicts, compacting every few records so it runs alongside
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = Ledger(directory, batch=rng.randint(1, 16), compact_every=50, archive=True)
+        expected = {}
+        history = []
+        for _ in range(3000):
+            acct_num = rng.randrange(300)
+            if acct_num not in expected:
+                name = rng.choice(["Zoë", "Bob-Smith", ""]) + str(acct_num)
+                ledger.open(name, acct_num, rng.randrange(100))
+                expected[acct_num] = (name, ledger.balance(acct_num))
+            elif rng.random() < 0.5:
+                ledger.deposit(acct_num, rng.randint(1, 50))
+            elif expected[acct_num][1] >= 10:
+                ledger.account(acct_num).withdraw(10)
+            expected[acct_num] = (expected[acct_num][0], ledger.balance(acct_num))
+            if acct_num == 7:
+                history.append(ledger.balance(acct_num))
+            if rng.random() < 0.01:
+                ledger.close()
+                ledger = Ledger(directory, batch=rng.randint(1, 16), compact_every=50, archive=True)
+                assert _state(ledger) == expected
+        ledger.close()
+        assert _state(Ledger(directory)) == expected
+        assert [balance for _, _, balance in Ledger(directory).history(7)] == history
+        acct_nums, _, _, _, _ = load_snapshot(os.path.join(directory, SNAPSHOT))
+        assert list(acct_nums) == sorted(acct_nums)
+    print('recovered balances match the live ones')
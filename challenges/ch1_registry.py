@@ -0,0 +1,260 @@
+"""
+Finding BankAccounts without scanning a list
+
+AccountRegistry keeps three indexes over the accounts it holds:
+
+    by_num    dict acct_num -> account, "find account 12345" in O(1)
+    nums      every acct_num in order, for "acct_num between X and Y"
+    balances  every (balance, acct_num) in order, for "top N by balance"
+
+The two ordered ones are _SortedPairs: (key, acct_num) pairs in sorted
+order, cut into buckets of up to 2 * LOAD with the last pair of every bucket
+kept apart so the right bucket is found with a bisect. Adding or removing a
+pair moves at most a bucket's worth of list entries, however many accounts
+there are. Keys and acct_nums sit in two parallel lists per bucket rather
+than a tuple each, the pairs cost two pointers and nothing else since the
+numbers themselves are the account's own.
+
+Accounts tell the registry they are in about deposit() and withdraw(), which
+moves their pair in the balance index. Assigning to .balance or .acct_num
+directly while an account is registered leaves the indexes stale. Balance
+moves and top() hold the registry's lock, so deposits can come from many
+threads, adding and removing accounts is for one thread at a time.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+from ch1 import BankAccount, SavingsAccount
+
+LOAD = 1000
+
+
+class _SortedPairs:
+    def __init__(self):
+        self.keys = []
+        self.nums = []
+        # last key and acct_num of every bucket
+        self.maxKeys = []
+        self.maxNums = []
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def build(self, keys: list, nums: list) -> None:
+        # starts over from pairs already in order, as two parallel lists
+        self.keys = [keys[i:i + LOAD] for i in range(0, len(keys), LOAD)]
+        self.nums = [nums[i:i + LOAD] for i in range(0, len(nums), LOAD)]
+        self.maxKeys = [keys[-1] for keys in self.keys]
+        self.maxNums = [nums[-1] for nums in self.nums]
+        self.size = len(keys)
+
+    def _bucket(self, key, num) -> int:
+        # first bucket whose last pair is >= (key, num), the last bucket if
+        # none is. within equal keys the acct_nums are in order too
+        low = bisect_left(self.maxKeys, key)
+        high = bisect_right(self.maxKeys, key, low)
+        return min(bisect_left(self.maxNums, num, low, high), len(self.keys) - 1)
+
+    def add(self, key, num) -> None:
+        if not self.keys:
+            self.keys.append([key])
+            self.nums.append([num])
+            self.maxKeys.append(key)
+            self.maxNums.append(num)
+            self.size = 1
+            return
+        b = self._bucket(key, num)
+        keys, nums = self.keys[b], self.nums[b]
+        low = bisect_left(keys, key)
+        i = bisect_left(nums, num, low, bisect_right(keys, key, low))
+        keys.insert(i, key)
+        nums.insert(i, num)
+        self.size += 1
+        if i == len(keys) - 1:
+            self.maxKeys[b], self.maxNums[b] = key, num
+        if len(keys) > 2 * LOAD:
+            # split in two halves
+            self.keys[b + 1:b + 1] = [keys[LOAD:]]
+            self.nums[b + 1:b + 1] = [nums[LOAD:]]
+            del keys[LOAD:], nums[LOAD:]
+            self.maxKeys.insert(b, keys[-1])
+            self.maxNums.insert(b, nums[-1])
+
+    def remove(self, key, num) -> None:
+        if self.keys:
+            b = self._bucket(key, num)
+            keys, nums = self.keys[b], self.nums[b]
+            low = bisect_left(keys, key)
+            i = bisect_left(nums, num, low, bisect_right(keys, key, low))
+            if i < len(keys) and keys[i] == key and nums[i] == num:
+                del keys[i], nums[i]
+                self.size -= 1
+                if not keys:
+                    del self.keys[b], self.nums[b], self.maxKeys[b], self.maxNums[b]
+                elif i == len(keys):
+                    self.maxKeys[b], self.maxNums[b] = keys[-1], nums[-1]
+                return
+        raise KeyError((key, num))
+
+    def between(self, low, high) -> Iterator[int]:
+        # acct_nums of the pairs with low <= key <= high, in order
+        b = bisect_left(self.maxKeys, low)
+        if b == len(self.keys):
+            return
+        i = bisect_left(self.keys[b], low)
+        for b in range(b, len(self.keys)):
+            keys = self.keys[b]
+            end = bisect_right(keys, high, i)
+            yield from self.nums[b][i:end]
+            if end < len(keys):
+                return
+            i = 0
+
+    def largest(self) -> Iterator[int]:
+        # acct_nums from the highest key down
+        for nums in reversed(self.nums):
+            yield from reversed(nums)
+
+
+class AccountRegistry:
+    def __init__(self, accounts: Iterable[BankAccount] = ()):
+        self.by_num = {}
+        self.nums = _SortedPairs()
+        self.balances = _SortedPairs()
+        # balances can move from several threads at once (see
+        # ch1_transactions.py), the balance index changes under this
+        self.lock = threading.Lock()
+        self.add_many(accounts)
+
+    def __len__(self) -> int:
+        return len(self.by_num)
+
+    def __contains__(self, account) -> bool:
+        # an account or an acct_num
+        return (account.acct_num if isinstance(account, BankAccount) else account) in self.by_num
+
+    def __getitem__(self, acct_num: int) -> BankAccount:
+        return self.by_num[acct_num]
+
+    def get(self, acct_num: int) -> Optional[BankAccount]:
+        return self.by_num.get(acct_num)
+
+    def __iter__(self) -> Iterator[BankAccount]:
+        # in acct_num order
+        return map(self.by_num.__getitem__, self.nums.between(float("-inf"), float("inf")))
+
+    def _claim(self, account: BankAccount) -> None:
+        if account.acct_num in self.by_num:
+            raise ValueError(f"account {account.acct_num} is already registered")
+        if account.registry is not None:
+            raise ValueError(f"account {account.acct_num} belongs to another registry")
+        account.registry = self
+        self.by_num[account.acct_num] = account
+
+    def add(self, account: BankAccount) -> None:
+        self._claim(account)
+        self.nums.add(account.acct_num, account.acct_num)
+        self.balances.add(account.balance, account.acct_num)
+
+    def add_many(self, accounts: Iterable[BankAccount]) -> None:
+        # into an empty registry the indexes are sorted once at the end
+        # instead of taking the accounts one at a time
+        if self.by_num:
+            for account in accounts:
+                self.add(account)
+            return
+        try:
+            for account in accounts:
+                self._claim(account)
+        except ValueError:
+            for account in self.by_num.values():
+                del account.registry
+            self.by_num.clear()
+            raise
+        # sorting numbers is a lot quicker than sorting (balance, acct_num)
+        # tuples. a stable sort by balance of the acct_nums in order leaves
+        # equal balances in acct_num order
+        nums = sorted(self.by_num)
+        self.nums.build(nums, nums)
+        balances = [self.by_num[num].balance for num in nums]
+        order = sorted(range(len(nums)), key=balances.__getitem__)
+        self.balances.build([balances[i] for i in order], [nums[i] for i in order])
+
+    def remove(self, acct_num: int) -> BankAccount:
+        account = self.by_num.pop(acct_num)
+        del account.registry
+        self.nums.remove(acct_num, acct_num)
+        self.balances.remove(account.balance, acct_num)
+        return account
+
+    def _moved(self, account: BankAccount, old) -> None:
+        # account's balance went from old to what it is now
+        with self.lock:
+            self.balances.remove(old, account.acct_num)
+            self.balances.add(account.balance, account.acct_num)
+
+    def between(self, low: int, high: int) -> Iterator[BankAccount]:
+        # accounts with low <= acct_num <= high, in acct_num order
+        return map(self.by_num.__getitem__, self.nums.between(low, high))
+
+    def top(self, n: int) -> List[BankAccount]:
+        # the n highest balances, highest first
+        with self.lock:
+            return [self.by_num[num] for num in islice(self.balances.largest(), n)]
+
+    def balance_between(self, low, high) -> Iterator[BankAccount]:
+        # accounts with low <= balance <= high, lowest first
+        return map(self.by_num.__getitem__, self.balances.between(low, high))
+
+    def deposit(self, acct_num: int, amount) -> None:
+        self.by_num[acct_num].deposit(amount)
+
+    def withdraw(self, acct_num: int, amount) -> None:
+        self.by_num[acct_num].withdraw(amount)
+
+
+if __name__ == "__main__":
+    import random
+
+    registry = AccountRegistry([SavingsAccount("Alice", 101, 1000), SavingsAccount("Bob", 102, 2000)])
+    registry.add(SavingsAccount("Carol", 250, 500))
+    assert registry[102].name == "Bob" and 999 not in registry
+    assert [account.acct_num for account in registry.between(100, 200)] == [101, 102]
+    registry.deposit(250, 5000)
+    assert [account.name for account in registry.top(2)] == ["Carol", "Bob"]
+    registry.withdraw(250, 5500)
+    assert [account.name for account in registry.top(3)] == ["Bob", "Alice", "Carol"]
+    try:
+        registry.add(SavingsAccount("Alice again", 101, 0))
+        raise AssertionError("registered a duplicate acct_num")
+    except ValueError:
+        pass
+
+    # against plain lists on random adds, removes, deposits and withdrawals,
+    # with a small LOAD so buckets split and empty out all the time
+    LOAD = 4
+    rng = random.Random(0)
+    registry = AccountRegistry(SavingsAccount(str(num), num, rng.randrange(50)) for num in range(0, 400, 2))
+    for _ in range(5000):
+        num = rng.randrange(400)
+        roll = rng.random()
+        if num not in registry:
+            registry.add(SavingsAccount(str(num), num, rng.choice([0, 10, rng.randrange(50)])))
+        elif roll < 0.2:
+            registry.remove(num)
+        elif roll < 0.6:
+            registry.deposit(num, rng.choice([1, 0.5, 10]))
+        elif registry[num].balance >= 1:
+            registry.withdraw(num, 1)
+        accounts = sorted(registry.by_num.values(), key=lambda account: account.acct_num)
+        low = rng.randrange(400)
+        high = low + rng.randrange(100)
+        assert list(registry.between(low, high)) == [a for a in accounts if low <= a.acct_num <= high]
+        byBalance = sorted(accounts, key=lambda account: (account.balance, account.acct_num))
+        assert registry.top(5) == byBalance[::-1][:5]
+        assert list(registry.balance_between(10, 20)) == [a for a in byBalance if 10 <= a.balance <= 20]
+        assert list(registry) == accounts
+    print('registry indexes match sorting the accounts')
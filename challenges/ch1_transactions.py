@@ -0,0 +1,224 @@
+"""
+Deposits, withdrawals and transfers on BankAccounts from many threads or
+coroutines at once
+
+TransactionEngine sits on top of a lookup from acct_num to account (a dict,
+an AccountRegistry...). Accounts are spread over `stripes` locks by
+acct_num, a lock per account would be millions of locks and one for all of
+them would make every worker queue behind every other. A transaction takes
+the locks of the stripes it touches in stripe order, so two transfers going
+opposite ways between the same accounts can't each hold the lock the other
+one wants.
+
+Every balance change checks the result with is_valid_balance before
+touching anything, a transfer or a batch that would overdraw an account
+raises ValueError and leaves every balance as it was. commit() runs a whole
+batch under one round of locking: cheaper per transaction than one at a
+time, and all or nothing.
+
+The *_async versions are for asyncio code. Locks are only ever held for a
+few lines of plain Python, so instead of blocking the event loop a
+coroutine tries for all its locks without waiting and, if one is taken,
+lets go of the rest and yields to the loop before trying again.
+
+Each stripe also keeps the net amount deposited into its accounts, which is
+what check_invariants() holds the total of the balances against.
+"""
+import asyncio
+import random
+import threading
+from typing import Iterable, List, Sequence, Tuple
+
+from ch1 import SavingsAccount
+
+
+class TransactionEngine:
+    def __init__(self, accounts, stripes: int = 64):
+        self.accounts = accounts
+        self.locks = [threading.Lock() for _ in range(stripes)]
+        # deposits minus withdrawals per stripe, changed under its lock
+        self.net = [0] * stripes
+        self.opening = sum(account.balance for account in self._all())
+
+    def _all(self):
+        return self.accounts.values() if hasattr(self.accounts, "values") else iter(self.accounts)
+
+    def _stripe(self, acct_num: int) -> int:
+        return hash(acct_num) % len(self.locks)
+
+    def _stripes(self, acct_nums: Iterable[int]) -> List[int]:
+        return sorted({self._stripe(acct_num) for acct_num in acct_nums})
+
+    def _lock(self, stripes: List[int]) -> None:
+        for stripe in stripes:
+            self.locks[stripe].acquire()
+
+    def _unlock(self, stripes: List[int]) -> None:
+        for stripe in reversed(stripes):
+            self.locks[stripe].release()
+
+    async def _lock_async(self, stripes: List[int]) -> None:
+        while True:
+            for k, stripe in enumerate(stripes):
+                if not self.locks[stripe].acquire(blocking=False):
+                    self._unlock(stripes[:k])
+                    break
+            else:
+                return
+            await asyncio.sleep(0)
+
+    def _apply(self, batch: Sequence[tuple]) -> None:
+        # runs a batch with its locks held: works out every account's new
+        # balance first, checking each step, then writes them all
+        balances = {}
+        for transaction in batch:
+            kind, *args = transaction
+            if kind == "deposit":
+                (acct_num, amount), changes = args, [(args[0], args[1])]
+            elif kind == "withdraw":
+                (acct_num, amount), changes = args, [(args[0], -args[1])]
+            elif kind == "transfer":
+                (source, target, amount), changes = args, [(args[0], -args[2]), (args[1], args[2])]
+            else:
+                raise ValueError(f"unknown transaction {transaction!r}")
+            if amount <= 0:
+                raise ValueError(f"amount must be positive in {transaction!r}")
+            for acct_num, change in changes:
+                account = self.accounts[acct_num]
+                balance = balances.get(acct_num, account.balance) + change
+                if not account.is_valid_balance(balance):
+                    raise ValueError(f"{transaction!r} would leave account {acct_num} at {balance}")
+                balances[acct_num] = balance
+        for acct_num, balance in balances.items():
+            account = self.accounts[acct_num]
+            change = balance - account.balance
+            # through deposit / withdraw so a registry hears about it
+            if change > 0:
+                account.deposit(change)
+            elif change < 0:
+                account.withdraw(-change)
+            self.net[self._stripe(acct_num)] += change
+
+    @staticmethod
+    def _touched(batch: Sequence[tuple]) -> List[int]:
+        return [acct_num for transaction in batch
+                for acct_num in (transaction[1:3] if transaction[0] == "transfer" else transaction[1:2])]
+
+    def commit(self, batch: Sequence[tuple]) -> None:
+        # ("deposit", acct_num, amount), ("withdraw", acct_num, amount) and
+        # ("transfer", source, target, amount), all of them or none
+        batch = list(batch)
+        stripes = self._stripes(self._touched(batch))
+        self._lock(stripes)
+        try:
+            self._apply(batch)
+        finally:
+            self._unlock(stripes)
+
+    async def commit_async(self, batch: Sequence[tuple]) -> None:
+        batch = list(batch)
+        stripes = self._stripes(self._touched(batch))
+        await self._lock_async(stripes)
+        try:
+            self._apply(batch)
+        finally:
+            self._unlock(stripes)
+
+    def deposit(self, acct_num: int, amount) -> None:
+        self.commit([("deposit", acct_num, amount)])
+
+    def withdraw(self, acct_num: int, amount) -> None:
+        self.commit([("withdraw", acct_num, amount)])
+
+    def transfer(self, source: int, target: int, amount) -> None:
+        self.commit([("transfer", source, target, amount)])
+
+    async def deposit_async(self, acct_num: int, amount) -> None:
+        await self.commit_async([("deposit", acct_num, amount)])
+
+    async def withdraw_async(self, acct_num: int, amount) -> None:
+        await self.commit_async([("withdraw", acct_num, amount)])
+
+    async def transfer_async(self, source: int, target: int, amount) -> None:
+        await self.commit_async([("transfer", source, target, amount)])
+
+    def check_invariants(self) -> Tuple[int, float]:
+        # every balance valid and the total what was there plus what came
+        # in, with every stripe locked so nothing moves meanwhile. returns
+        # (accounts, total)
+        stripes = list(range(len(self.locks)))
+        self._lock(stripes)
+        try:
+            accounts = list(self._all())
+            bad = [account for account in accounts if not account.is_valid_balance(account.balance)]
+            assert not bad, f"invalid balances: {bad[:5]}"
+            total = sum(account.balance for account in accounts)
+            expected = self.opening + sum(self.net)
+            assert abs(total - expected) <= 1e-6 * max(abs(expected), 1), f"total {total}, expected {expected}"
+            return len(accounts), total
+        finally:
+            self._unlock(stripes)
+
+
+if __name__ == "__main__":
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    from ch1_registry import AccountRegistry
+
+    registry = AccountRegistry([SavingsAccount("Alice", 101, 100), SavingsAccount("Bob", 102, 50)])
+    engine = TransactionEngine(registry.by_num, stripes=4)
+    engine.transfer(101, 102, 70)
+    try:
+        engine.commit([("deposit", 101, 10), ("transfer", 101, 102, 50)])
+        raise AssertionError("overdrew Alice")
+    except ValueError:
+        pass
+    assert registry[101].balance == 30 and registry[102].balance == 120
+    assert registry.top(1)[0].name == "Bob"
+
+    # stress: transfers in both directions between a few accounts from a
+    # thread pool and from coroutines, switching threads every microsecond
+    # so they really do interleave. money is neither made nor lost and no
+    # balance goes below zero
+    sys.setswitchinterval(1e-6)
+    registry = AccountRegistry(SavingsAccount(str(num), num, 100) for num in range(20))
+    engine = TransactionEngine(registry.by_num, stripes=8)
+    refused = []
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        for _ in range(3000):
+            source, target = rng.sample(range(20), 2)
+            try:
+                if rng.random() < 0.1:
+                    engine.commit([("withdraw", source, 5), ("deposit", target, 5),
+                                   ("transfer", target, source, rng.randint(1, 50))])
+                else:
+                    engine.transfer(source, target, rng.randint(1, 50))
+            except ValueError:
+                refused.append(seed)
+
+    async def coroutines() -> None:
+        async def client(seed: int) -> None:
+            rng = random.Random(seed)
+            for _ in range(1000):
+                source, target = rng.sample(range(20), 2)
+                try:
+                    await engine.transfer_async(source, target, rng.randint(1, 50))
+                except ValueError:
+                    refused.append(seed)
+        await asyncio.gather(*(client(seed) for seed in range(100, 108)))
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(worker, seed) for seed in range(8)]
+        loop = threading.Thread(target=asyncio.run, args=(coroutines(),))
+        loop.start()
+        for future in futures:
+            future.result()
+        loop.join()
+    count, total = engine.check_invariants()
+    assert total == 20 * 100
+    assert list(registry.balance_between(0, float("inf"))) == sorted(registry.by_num.values(),
+                                                                      key=lambda a: (a.balance, a.acct_num))
+    print(f'{count} accounts still hold {total}, {len(refused)} transactions refused for lack of funds')
@@ -1,5 +1,8 @@
 import enum
-from typing import List
+import heapq
+import sys
+from array import array
+from typing import List, Optional, Tuple, Union
 
 """
 Welcome to your interview. Boilerplate is provided. Please edit the code as you see fit. To run the code at any time, hit the run button in the top left corner.
@@ -55,135 +58,463 @@ class Spot:
         self.isOccupied = False
         self.isVan = False
 
+
+# compact mode keeps a row of spots as two bitmaps, one bit per spot for
+# occupied and one for van, instead of a Spot object per spot. indexing the
+# row hands out a SpotView that reads and writes those bits (a slice hands
+# out a list of them, like slicing the list of Spots), so code written
+# against Spot keeps working
+class SpotView:
+    __slots__ = ("row", "index")
+
+    def __init__(self, row: "SpotRow", index: int):
+        self.row = row
+        self.index = index
+
+    @property
+    def isOccupied(self) -> bool:
+        return self.row.get(self.row.occupied, self.index)
+
+    @isOccupied.setter
+    def isOccupied(self, value: bool) -> None:
+        self.row.set(self.row.occupied, self.index, value)
+
+    @property
+    def isVan(self) -> bool:
+        return self.row.get(self.row.vans, self.index)
+
+    @isVan.setter
+    def isVan(self, value: bool) -> None:
+        self.row.set(self.row.vans, self.index, value)
+
+
+class SpotRow:
+    def __init__(self, size: int):
+        self.size = size
+        self.occupied = bytearray((size + 7) // 8)
+        self.vans = bytearray((size + 7) // 8)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[SpotView, List[SpotView]]:
+        if isinstance(index, slice):
+            return [SpotView(self, i) for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        return SpotView(self, index)
+
+    def __iter__(self):
+        return (SpotView(self, index) for index in range(self.size))
+
+    @staticmethod
+    def get(bits: bytearray, index: int) -> bool:
+        return bool(bits[index >> 3] >> (index & 7) & 1)
+
+    @staticmethod
+    def set(bits: bytearray, index: int, value: bool) -> None:
+        if value:
+            bits[index >> 3] |= 1 << (index & 7)
+        else:
+            bits[index >> 3] &= ~(1 << (index & 7))
+
+    # popcounts over the whole row instead of a loop over spots
+
+    def occupiedCount(self) -> int:
+        return int.from_bytes(self.occupied, "little").bit_count()
+
+    def vanCount(self) -> int:
+        return int.from_bytes(self.vans, "little").bit_count()
+
+
+# free spots of one row, handed out lowest index first like the old scan.
+# spots that were never used are a bump pointer (`untouched` onwards) so an
+# empty row costs nothing however big it is, spots handed back go on a
+# min-heap and are reused before the pointer moves on. `occupied` starts the
+# row from a bitmap laid out like SpotRow's instead of empty
+class FreeSpots:
+    def __init__(self, size: int, occupied: Optional[bytes] = None):
+        self.size = size
+        self.untouched = 0
+        self.released = []
+        if occupied is not None:
+            # the pointer goes one past the last taken spot and the free
+            # spots below it are the heap, in order so already a heap
+            used = bytes(occupied).rstrip(b"\0")
+            if used:
+                self.untouched = (len(used) - 1) * 8 + used[-1].bit_length()
+            for i, word in enumerate(_freeWords(occupied, size)[:(self.untouched + WORD - 1) // WORD]):
+                if i == self.untouched // WORD:
+                    word &= (1 << self.untouched % WORD) - 1
+                while word:
+                    low = word & -word
+                    self.released.append(i * WORD + low.bit_length() - 1)
+                    word ^= low
+
+    def __len__(self) -> int:
+        return self.size - self.untouched + len(self.released)
+
+    def take(self) -> int:
+        if self.released:
+            return heapq.heappop(self.released)
+        if self.untouched == self.size:
+            raise IndexError("no free spots")
+        self.untouched += 1
+        return self.untouched - 1
+
+    def release(self, index: int) -> None:
+        heapq.heappush(self.released, index)
+
+
+# free spots of the regular row, one bit per spot packed 64 to a word, with a
+# segment tree over the words. every node knows the free run at its left
+# edge, the one at its right edge and the longest one inside it, so the
+# first run long enough for a van is found walking down from the root, and
+# a spot coming back merges with the runs either side of it on the way back
+# up. nodes are numbered like a heap (children of n are 2n and 2n+1), the
+# words are the leaves and padding past the end of the row counts as taken.
+# runs are only counted up to a word's worth of spots: nothing parks in more
+# than that, and it means a take in the middle of a big free stretch stops
+# changing nodes a level or two above its word
+WORD = 64
+FULL_WORD = (1 << WORD) - 1
+
+
+def _word_runs(word: int):
+    # (free run at the low end, at the high end, longest inside) of a word
+    prefix = (word ^ (word + 1)).bit_length() - 1
+    suffix = WORD - (FULL_WORD ^ word).bit_length()
+    best = 0
+    while word:
+        # skip the taken spots below the next free run, then the run itself
+        word >>= (word & -word).bit_length() - 1
+        run = (word ^ (word + 1)).bit_length() - 1
+        if run > best:
+            best = run
+        word >>= run
+    return prefix, suffix, best
+
+
+def _freeWords(occupied: bytes, size: int) -> List[int]:
+    # free bits of an occupied bitmap (bit i of byte i // 8 is spot i), 64
+    # spots to a word, padding past the end of the row taken
+    padded = array('Q')
+    padded.frombytes(bytes(occupied) + bytes(-len(occupied) % 8))
+    if sys.byteorder == "big":
+        padded.byteswap()
+    words = [~word & FULL_WORD for word in padded]
+    if size % WORD:
+        words[-1] &= (1 << size % WORD) - 1
+    return words
+
+
+class FreeRuns:
+    def __init__(self, size: int, occupied: Optional[bytes] = None):
+        # occupied: start from a bitmap laid out like SpotRow's, all free
+        # when left out
+        self.size = size
+        count = (size + WORD - 1) // WORD
+        if occupied is None:
+            self.free = size
+            self.words = [FULL_WORD] * count
+            if size % WORD:
+                self.words[-1] = (1 << size % WORD) - 1
+        else:
+            self.words = _freeWords(occupied, size)
+            self.free = sum(word.bit_count() for word in self.words)
+        leaves = 1
+        while leaves < count:
+            leaves *= 2
+        self.leaves = leaves
+        self.prefix = [0] * (2 * leaves)
+        self.suffix = [0] * (2 * leaves)
+        self.best = [0] * (2 * leaves)
+        for i, word in enumerate(self.words):
+            self.prefix[leaves + i], self.suffix[leaves + i], self.best[leaves + i] = _word_runs(word)
+        node = leaves - 1
+        half = WORD
+        level = leaves // 2
+        while node:
+            # every node on this level has children `half` spots long
+            for _ in range(level):
+                self._combine(node, half)
+                node -= 1
+            half *= 2
+            level //= 2
+
+    def __len__(self) -> int:
+        return self.free
+
+    def _combine(self, node: int, half: int) -> None:
+        prefix, suffix, best = self.prefix, self.suffix, self.best
+        left = 2 * node
+        right = left + 1
+        prefix[node] = min(prefix[left] + prefix[right], WORD) if prefix[left] == half else prefix[left]
+        suffix[node] = min(suffix[right] + suffix[left], WORD) if suffix[right] == half else suffix[right]
+        best[node] = min(max(best[left], best[right], suffix[left] + prefix[right]), WORD)
+
+    def _update(self, index: int, word: int) -> None:
+        prefix, suffix, best = self.prefix, self.suffix, self.best
+        self.words[index] = word
+        node = self.leaves + index
+        prefix[node], suffix[node], best[node] = _word_runs(word)
+        half = WORD
+        while node > 1:
+            node //= 2
+            left = 2 * node
+            right = left + 1
+            newPrefix = min(prefix[left] + prefix[right], WORD) if prefix[left] == half else prefix[left]
+            newSuffix = min(suffix[right] + suffix[left], WORD) if suffix[right] == half else suffix[right]
+            newBest = min(max(best[left], best[right], suffix[left] + prefix[right]), WORD)
+            if prefix[node] == newPrefix and suffix[node] == newSuffix and best[node] == newBest:
+                # nothing above here can change either
+                break
+            prefix[node], suffix[node], best[node] = newPrefix, newSuffix, newBest
+            half *= 2
+
+    def longest(self) -> int:
+        # longest free run, up to WORD
+        return self.best[1]
+
+    def find(self, length: int = 1) -> int:
+        # start of the first run of `length` free spots, -1 if there is none
+        if length > WORD:
+            raise ValueError(f"runs longer than {WORD} spots are not tracked")
+        prefix, suffix, best = self.prefix, self.suffix, self.best
+        if best[1] < length:
+            return -1
+        node = 1
+        start = 0
+        half = WORD * self.leaves // 2
+        while node < self.leaves:
+            left = 2 * node
+            if best[left] >= length:
+                node = left
+            elif suffix[left] + prefix[left + 1] >= length:
+                # the run straddles the middle. the left half has no run this
+                # long, so its suffix is below WORD and exact
+                return start + half - suffix[left]
+            else:
+                node = left + 1
+                start += half
+            half //= 2
+        # the run is inside this word, find its lowest bit
+        runs = self.words[node - self.leaves]
+        for _ in range(length - 1):
+            runs &= runs >> 1
+        return start + (runs & -runs).bit_length() - 1
+
+    def _mark(self, index: int, length: int, free: bool) -> None:
+        end = index + length
+        while index < end:
+            word = index // WORD
+            stop = min(end, (word + 1) * WORD)
+            bits = ((1 << (stop - index)) - 1) << (index % WORD)
+            self._update(word, self.words[word] | bits if free else self.words[word] & ~bits)
+            index = stop
+
+    def take(self, length: int = 1) -> int:
+        start = self.find(length)
+        if start == -1:
+            raise IndexError(f"no run of {length} free spots")
+        self._mark(start, length, False)
+        self.free -= length
+        return start
+
+    def release(self, index: int, length: int = 1) -> None:
+        self._mark(index, length, True)
+        self.free += length
+
+
 class ParkingLot:
-    def __init__(self, motorcycleSpots: int, regularSpots: int):
-        self.mSpotList = [Spot() for _ in range(motorcycleSpots)]
-        self.rSpotList = [Spot() for _ in range(regularSpots)]
+    def __init__(self, motorcycleSpots: int, regularSpots: int, compact: bool = False):
+        # compact=True stores each row as bitmaps, a quarter byte per spot
+        # instead of a Spot object each, see SpotRow
+        if compact:
+            self.mSpotList = SpotRow(motorcycleSpots)
+            self.rSpotList = SpotRow(regularSpots)
+        else:
+            self.mSpotList = [Spot() for _ in range(motorcycleSpots)]
+            self.rSpotList = [Spot() for _ in range(regularSpots)]
         self.totalSpots = motorcycleSpots + regularSpots
-        
+        # kept up to date by every park so none of the queries below has to
+        # look at the spots themselves
+        self.mFree = FreeSpots(motorcycleSpots)
+        # vans need 3 regular spots next to each other
+        self.rFree = FreeRuns(regularSpots)
+        self.vanSpots = 0
+        # ticket -> (row, first spot, spots taken), so unpark() goes straight
+        # to the spots without looking for the vehicle
+        self.tickets = {}
+        self.nextTicket = 1
+
     # parking lot is full
     def isParkingLotFull(self) -> bool:
-        isMFull = True
-        isRFull = True
-
-        for spot in self.mSpotList:
-            if not spot.isOccupied:
-                isMFull = False
-                break
-        
-        for spot in self.rSpotList:
-            if not spot.isOccupied:
-                isRFull = False
-                break
-                
-        return isMFull and isRFull
-    
+        return not self.mFree and not self.rFree
 
     def isParkingLotEmpty(self) -> bool:
-        isMEmpty = True
-        isREmpty = True
-
-        for spot in self.mSpotList:
-            if spot.isOccupied:
-                isMEmpty = False
-                break
-        
-        for spot in self.rSpotList:
-            if spot.isOccupied:
-                isREmpty = False
-                break
-                
-        return isMEmpty and isREmpty
+        return len(self.mFree) == len(self.mSpotList) and len(self.rFree) == len(self.rSpotList)
 
     def spotsRemaining(self) -> dict:
-
-        # calculate how many motorcycle spots remain 
-        mSpotsRemaining = 0
-        for spot in self.mSpotList:
-            if not spot.isOccupied:
-                mSpotsRemaining += 1
-        
-        rSpotsRemaining = 0
-        for spot in self.rSpotList:
-            if not spot.isOccupied:
-                rSpotsRemaining += 1
-
-        
         return {
-            "motorcycle": mSpotsRemaining,
-            "regular": rSpotsRemaining
+            "motorcycle": len(self.mFree),
+            "regular": len(self.rFree)
         }
 
-    
     def vanSpotsTakenUp(self) -> int:
-        numSpots = 0
-        for spot in self.rSpotList:
-            if spot.isVan:
-                numSpots += 1
-        return numSpots
+        return self.vanSpots
 
     def occupyNextAvailableSpot(self, list: List[Spot], isVan: bool):
-        numRuns = 1
-        if isVan:
-            numRuns = 3
-
-        while numRuns > 0:
-            for spot in list:
-                if not spot.isOccupied:
-                    spot.isOccupied = True
-                    spot.isVan = True
-                    break
-            numRuns -= 1
-
+        # the old way in, no ticket so the spots stay taken for good (there's
+        # nothing to unpark them with). does nothing when there's no room,
+        # a van needs 3 free spots in a row
+        if list is self.mSpotList:
+            room = len(self.mFree) > 0
+        elif isVan:
+            room = self.rFree.longest() >= 3
+        else:
+            room = len(self.rFree) > 0
+        if room:
+            self._take(list, isVan)
         return list
 
-    def park(self, vehicle: Vehicle) -> None:
-        
-        spotsRemaining = self.spotsRemaining()
-        print('spots left', spotsRemaining)
-        motorcycleSpots = spotsRemaining['motorcycle']
-        regularSpots = spotsRemaining['regular']
+    def _occupy(self, list: List[Spot], isVan: bool) -> int:
+        # takes the spots and returns a ticket for them
+        start, numRuns = self._take(list, isVan)
+        ticket = self.nextTicket
+        self.nextTicket += 1
+        self.tickets[ticket] = (list, start, numRuns)
+        return ticket
+
+    def _take(self, list: List[Spot], isVan: bool) -> Tuple[int, int]:
+        # marks the next free spots taken, returns (start, numRuns)
+        if list is self.mSpotList:
+            start = self.mFree.take()
+            numRuns = 1
+        elif isVan:
+            start = self.rFree.take(3)
+            numRuns = 3
+            self.vanSpots += 3
+        else:
+            start = self.rFree.take()
+            numRuns = 1
+
+        for index in range(start, start + numRuns):
+            spot = list[index]
+            spot.isOccupied = True
+            spot.isVan = isVan
+        return start, numRuns
+
+    def park(self, vehicle: Vehicle) -> Optional[int]:
+        # returns the ticket to unpark with, None if there was no room
+        motorcycleSpots = len(self.mFree)
+        regularSpots = len(self.rFree)
 
         if vehicle.type == VehicleType.CAR:
             if regularSpots > 0:
-                self.occupyNextAvailableSpot(self.rSpotList, False)
-                print('Vehicle parked successfully')
-            else:
-                print('No spots available')
+                ticket = self._occupy(self.rSpotList, False)
+                return ticket
         elif vehicle.type == VehicleType.VAN:
-            if regularSpots > 2:
-                self.occupyNextAvailableSpot(self.rSpotList, True)
-                print('Vehicle parked successfully')
-            else:
-                print('No Van spots available')
+            if self.rFree.longest() >= 3:
+                ticket = self._occupy(self.rSpotList, True)
+                return ticket
         elif vehicle.type == VehicleType.MOTORCYCLE:
             if motorcycleSpots > 0:
-                self.occupyNextAvailableSpot(self.mSpotList, False)
-                print('Vehicle parked successfully')
+                ticket = self._occupy(self.mSpotList, False)
+                return ticket
             elif regularSpots > 0:
-                self.occupyNextAvailableSpot(self.rSpotList, False)
-                print('Vehicle parked successfully')
-            else:
-                print('No spots available')
-
-
+                ticket = self._occupy(self.rSpotList, False)
+                return ticket
+        return None
 
+    def unpark(self, ticket: int) -> None:
+        if ticket not in self.tickets:
+            raise KeyError(f"no vehicle parked with ticket {ticket}")
+        list, start, numRuns = self.tickets.pop(ticket)
+        for index in range(start, start + numRuns):
+            spot = list[index]
+            spot.isOccupied = False
+            spot.isVan = False
+        if list is self.mSpotList:
+            self.mFree.release(start)
+        else:
+            self.rFree.release(start, numRuns)
+        if numRuns == 3:
+            self.vanSpots -= 3
 
 
-    
-
 
 
-lot = ParkingLot(5, 9)
-myCar = Vehicle(VehicleType.CAR)
-myVan1 = Vehicle(VehicleType.VAN)
-myVan2 = Vehicle(VehicleType.VAN)
-myVan3 = Vehicle(VehicleType.VAN)
 
+    
 
-lot.park(myCar)
-lot.park(myVan1)
-lot.park(myVan2)
-lot.park(myVan3)
 
 
+if __name__ == "__main__":
+    lot = ParkingLot(5, 9)
+    myCar = Vehicle(VehicleType.CAR)
+    myVan1 = Vehicle(VehicleType.VAN)
+    myVan2 = Vehicle(VehicleType.VAN)
+    myVan3 = Vehicle(VehicleType.VAN)
+
+
+    carTicket = lot.park(myCar)
+    van1Ticket = lot.park(myVan1)
+    lot.park(myVan2)
+    # park() reports through its return value, nothing is printed or logged
+    # on the way in or out
+    if lot.park(myVan3) is None:
+        print('No Van spots available')
+    print('spots left', lot.spotsRemaining())
+
+    assert lot.spotsRemaining() == {"motorcycle": 5, "regular": 2}
+    assert lot.vanSpotsTakenUp() == 6
+    assert not lot.isParkingLotFull() and not lot.isParkingLotEmpty()
+
+    # a van only fits where 3 free spots are next to each other, and spots
+    # that come back join up with the free ones around them
+    row = FreeRuns(10)
+    for _ in range(10):
+        row.take()
+    row.release(2)
+    row.release(5, 2)
+    assert row.find(3) == -1 and row.find(2) == 5
+    row.release(4)
+    assert row.take(3) == 4
+    assert len(row) == 1 and row.find() == 2
+
+    # the compact lot parks the same way and answers the same questions
+    compactLot = ParkingLot(5, 9, compact=True)
+    for vehicle in (myCar, myVan1, myVan2, myVan3):
+        compactLot.park(vehicle)
+    assert compactLot.spotsRemaining() == lot.spotsRemaining()
+    assert compactLot.rSpotList.vanCount() == compactLot.vanSpotsTakenUp() == 6
+    assert compactLot.rSpotList.occupiedCount() == 7
+    assert [spot.isVan for spot in compactLot.rSpotList] == [spot.isVan for spot in lot.rSpotList]
+    assert [spot.isVan for spot in compactLot.rSpotList[:4]] == [spot.isVan for spot in lot.rSpotList[:4]]
+    assert [spot.index for spot in compactLot.rSpotList[-3::-2]] == [6, 4, 2, 0]
+
+    # leaving frees every spot on the ticket. spots 0, 7 and 8 are free once
+    # the car goes but they are not together, so the last van has to wait
+    # for the first one to leave
+    lot.unpark(carTicket)
+    assert lot.spotsRemaining() == {"motorcycle": 5, "regular": 3}
+    assert lot.park(myVan3) is None
+    lot.unpark(van1Ticket)
+    assert lot.vanSpotsTakenUp() == 3
+    assert lot.park(myVan3) is not None
+    assert [spot.isVan for spot in lot.rSpotList[:4]] == [True, True, True, False]
+
+
+
+    # the old occupyNextAvailableSpot takes spots without a ticket and does
+    # nothing once the row is full
+    legacy = ParkingLot(1, 3)
+    legacy.occupyNextAvailableSpot(legacy.rSpotList, False)
+    legacy.occupyNextAvailableSpot(legacy.mSpotList, False)
+    legacy.occupyNextAvailableSpot(legacy.mSpotList, False)
+    assert legacy.spotsRemaining() == {"motorcycle": 0, "regular": 2} and not legacy.tickets
+    legacy.occupyNextAvailableSpot(legacy.rSpotList, True)
+    assert legacy.vanSpotsTakenUp() == 0 and legacy.spotsRemaining()["regular"] == 2
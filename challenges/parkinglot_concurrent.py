@@ -0,0 +1,148 @@
+"""
+Thread-safe ParkingLot for many gates parking at once
+
+park() in parkinglot.py looks at the free counts and then takes a spot, two
+steps another thread can get between. One lock around the whole lot fixes
+that but makes every gate queue behind every other.
+
+ConcurrentParkingLot splits the spots into shards, think levels of the
+garage, each a plain ParkingLot behind its own lock. A gate goes to its home
+shard first and only moves on when that one is busy or has no room: the
+first pass skips shards another gate is holding, the second waits for them.
+A shard is only ever changed while its lock is held, so a spot can't be
+handed out twice. Which shards might have room is peeked at without a lock
+and checked again under it.
+
+A van has to fit inside one shard, its 3 spots never straddle two levels.
+A motorcycle gets a motorcycle spot on any shard before it takes a regular
+spot anywhere, the same as ParkingLot does.
+The counts (spotsRemaining and friends) add up the shards without locking,
+so while gates are busy they can be off by the parks still in flight.
+"""
+import random
+import sys
+import threading
+from typing import Optional, Tuple
+
+from parkinglot import ParkingLot, Vehicle, VehicleType
+
+
+def _split(total: int, parts: int):
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+class ConcurrentParkingLot:
+    def __init__(self, motorcycleSpots: int, regularSpots: int, shards: int = 8, compact: bool = False):
+        self.shards = [
+            ParkingLot(m, r, compact=compact)
+            for m, r in zip(_split(motorcycleSpots, shards), _split(regularSpots, shards))
+        ]
+        self.locks = [threading.Lock() for _ in self.shards]
+        self.totalSpots = motorcycleSpots + regularSpots
+
+    def park(self, vehicle: Vehicle, gate: int = 0) -> Optional[Tuple[int, int]]:
+        # returns (shard, ticket), None if there was no room anywhere
+        if vehicle.type == VehicleType.VAN:
+            return self._park(vehicle, gate, lambda lot: lot.rFree.longest() >= 3)
+        if vehicle.type == VehicleType.MOTORCYCLE:
+            # with a motorcycle spot free, lot.park takes that over a regular one
+            ticket = self._park(vehicle, gate, lambda lot: len(lot.mFree) > 0)
+            if ticket is not None:
+                return ticket
+        return self._park(vehicle, gate, lambda lot: len(lot.rFree) > 0)
+
+    def _park(self, vehicle: Vehicle, gate: int, fits) -> Optional[Tuple[int, int]]:
+        # parks in the first shard from `gate` on where fits(shard) holds
+        count = len(self.shards)
+        for blocking in (False, True):
+            for k in range(count):
+                i = (gate + k) % count
+                lot = self.shards[i]
+                if not fits(lot):
+                    continue
+                lock = self.locks[i]
+                if not lock.acquire(blocking):
+                    continue
+                try:
+                    # peeked without the lock, so look again
+                    ticket = lot.park(vehicle) if fits(lot) else None
+                finally:
+                    lock.release()
+                if ticket is not None:
+                    return i, ticket
+        return None
+
+    def unpark(self, ticket: Tuple[int, int]) -> None:
+        i, shardTicket = ticket
+        with self.locks[i]:
+            self.shards[i].unpark(shardTicket)
+
+    def spotsRemaining(self) -> dict:
+        return {
+            "motorcycle": sum(len(lot.mFree) for lot in self.shards),
+            "regular": sum(len(lot.rFree) for lot in self.shards),
+        }
+
+    def isParkingLotFull(self) -> bool:
+        return all(lot.isParkingLotFull() for lot in self.shards)
+
+    def isParkingLotEmpty(self) -> bool:
+        return all(lot.isParkingLotEmpty() for lot in self.shards)
+
+    def vanSpotsTakenUp(self) -> int:
+        return sum(lot.vanSpotsTakenUp() for lot in self.shards)
+
+
+def checkNoDoubleBooking(lot: ConcurrentParkingLot) -> None:
+    # every occupied spot belongs to exactly one ticket and the counters agree
+    # with the spots. only call it while no gate is parking
+    for shard in lot.shards:
+        for row, free in ((shard.mSpotList, shard.mFree), (shard.rSpotList, shard.rFree)):
+            owners = [0] * len(row)
+            for ticketRow, start, numRuns in shard.tickets.values():
+                if ticketRow is row:
+                    for index in range(start, start + numRuns):
+                        owners[index] += 1
+            assert max(owners, default=0) <= 1, "spot booked twice"
+            assert all(spot.isOccupied == bool(owner) for spot, owner in zip(row, owners))
+            assert len(free) == owners.count(0)
+
+
+if __name__ == "__main__":
+    # shard 1 has no motorcycle spots, a motorcycle from its gate still gets
+    # the one on shard 0 before a regular spot
+    lot = ConcurrentParkingLot(1, 8, shards=2)
+    assert lot.park(Vehicle(VehicleType.MOTORCYCLE), gate=1)[0] == 0
+    assert lot.spotsRemaining() == {"motorcycle": 0, "regular": 8}
+    assert lot.park(Vehicle(VehicleType.MOTORCYCLE), gate=1)[0] == 1
+    assert lot.spotsRemaining() == {"motorcycle": 0, "regular": 7}
+
+    # stress: gates parking and leaving as fast as they can on a small lot,
+    # so most parks fight over the last few spots. switching threads every
+    # microsecond instead of every 5ms gives the races a chance to happen
+    sys.setswitchinterval(1e-6)
+    lot = ConcurrentParkingLot(40, 400, shards=4)
+    mix = [VehicleType.CAR] * 6 + [VehicleType.MOTORCYCLE] * 3 + [VehicleType.VAN]
+    issued = []
+
+    def gate(number: int) -> None:
+        rng = random.Random(number)
+        mine = []
+        for _ in range(20_000):
+            if mine and rng.random() < 0.45:
+                lot.unpark(mine.pop(rng.randrange(len(mine))))
+            else:
+                ticket = lot.park(Vehicle(rng.choice(mix)), gate=number)
+                if ticket is not None:
+                    mine.append(ticket)
+        issued.extend(mine)
+
+    threads = [threading.Thread(target=gate, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    checkNoDoubleBooking(lot)
+    assert len(set(issued)) == len(issued) == sum(len(shard.tickets) for shard in lot.shards)
+    print('no spot booked twice,', lot.spotsRemaining(), 'left with', len(issued), 'vehicles parked')
@@ -0,0 +1,192 @@
+"""
+Many garages with many levels each, every level a ParkingLot
+
+ParkingFederation keeps, for each VehicleType, a segment tree over the
+garages (sorted by position along the road) holding how much room every
+garage has for that type. "nearest garage with room for a van" is then two
+walks down the tree, the first garage at or after the position and the
+last one before it, O(log garages) and without asking any lot.
+
+Park and unpark go through the federation, which looks at the one level
+that changed afterwards and pushes the difference up the trees. Inside a
+garage the lowest level with room wins. Levels per garage are few, so that
+part is a loop over the garage's cached per-level room.
+
+Room per level, per type:
+    MOTORCYCLE  free motorcycle + regular spots
+    CAR         free regular spots
+    VAN         1 if there is a run of 3 free regular spots, else 0
+"""
+import random
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+
+from parkinglot import ParkingLot, Vehicle, VehicleType
+
+TYPES = (VehicleType.MOTORCYCLE, VehicleType.CAR, VehicleType.VAN)
+
+
+def _room(lot: ParkingLot) -> Tuple[int, int, int]:
+    regular = len(lot.rFree)
+    return len(lot.mFree) + regular, regular, 1 if lot.rFree.longest() >= 3 else 0
+
+
+class Garage:
+    def __init__(self, name: str, position: float, levels: Sequence[ParkingLot]):
+        self.name = name
+        self.position = position
+        self.levels = list(levels)
+
+
+class ParkingFederation:
+    def __init__(self, garages: Sequence[Garage]):
+        self.garages = sorted(garages, key=lambda garage: garage.position)
+        self.positions = [garage.position for garage in self.garages]
+        self.levelRoom = [[_room(lot) for lot in garage.levels] for garage in self.garages]
+        size = 1
+        while size < len(self.garages):
+            size *= 2
+        self.size = size
+        # trees[t][size + g] is garage g's room for TYPES[t], inner nodes
+        # add up their children
+        self.trees = [[0] * (2 * size) for _ in TYPES]
+        for g, rooms in enumerate(self.levelRoom):
+            for t, tree in enumerate(self.trees):
+                tree[size + g] = sum(room[t] for room in rooms)
+        for tree in self.trees:
+            for node in range(size - 1, 0, -1):
+                tree[node] = tree[2 * node] + tree[2 * node + 1]
+
+    def _refresh(self, g: int, level: int) -> None:
+        # one level changed, push its new room up every tree
+        old = self.levelRoom[g][level]
+        new = _room(self.garages[g].levels[level])
+        self.levelRoom[g][level] = new
+        for t, tree in enumerate(self.trees):
+            change = new[t] - old[t]
+            if change:
+                node = self.size + g
+                while node:
+                    tree[node] += change
+                    node //= 2
+
+    def _firstFrom(self, tree: List[int], g: int) -> int:
+        # first garage >= g with room, -1 if none
+        if g >= len(self.garages):
+            return -1
+        node = self.size + g
+        while not tree[node]:
+            # climb out of right children, then step to the next subtree
+            while node & 1:
+                node >>= 1
+            if node == 0:
+                return -1
+            node += 1
+        while node < self.size:
+            node = 2 * node if tree[2 * node] else 2 * node + 1
+        return node - self.size
+
+    def _lastBefore(self, tree: List[int], g: int) -> int:
+        # last garage < g with room, -1 if none
+        if g <= 0:
+            return -1
+        node = self.size + g - 1
+        while not tree[node]:
+            while not node & 1:
+                node >>= 1
+            if node == 1:
+                return -1
+            node -= 1
+        while node < self.size:
+            node = 2 * node + 1 if tree[2 * node + 1] else 2 * node
+        return node - self.size
+
+    def nearest(self, type: VehicleType, position: float) -> Optional[Tuple[int, int]]:
+        # (garage, level) closest to position with room for type
+        tree = self.trees[TYPES.index(type)]
+        g = bisect_left(self.positions, position)
+        after = self._firstFrom(tree, g)
+        before = self._lastBefore(tree, g)
+        if after == -1 and before == -1:
+            return None
+        if after == -1 or (before != -1 and position - self.positions[before] <= self.positions[after] - position):
+            g = before
+        else:
+            g = after
+        t = TYPES.index(type)
+        for level, room in enumerate(self.levelRoom[g]):
+            if room[t]:
+                return g, level
+        raise AssertionError("garage counted room that none of its levels has")
+
+    def park(self, vehicle: Vehicle, position: float = 0.0) -> Optional[Tuple[int, int, int]]:
+        # returns (garage, level, ticket), None if every garage is full
+        spot = self.nearest(vehicle.type, position)
+        if spot is None:
+            return None
+        g, level = spot
+        ticket = self.garages[g].levels[level].park(vehicle)
+        self._refresh(g, level)
+        return g, level, ticket
+
+    def unpark(self, ticket: Tuple[int, int, int]) -> None:
+        g, level, levelTicket = ticket
+        self.garages[g].levels[level].unpark(levelTicket)
+        self._refresh(g, level)
+
+    def room(self, type: VehicleType) -> int:
+        # room for type over every garage, the root of its tree
+        return self.trees[TYPES.index(type)][1]
+
+    def spotsRemaining(self) -> dict:
+        return {
+            "motorcycle": self.trees[0][1] - self.trees[1][1],
+            "regular": self.trees[1][1],
+        }
+
+
+if __name__ == "__main__":
+    # three garages along a road, the nearest one with room wins
+    def level(regular: int) -> ParkingLot:
+        return ParkingLot(2, regular, compact=True)
+
+    federation = ParkingFederation([
+        Garage("north", 10.0, [level(3), level(3)]),
+        Garage("centre", 5.0, [level(4)]),
+        Garage("south", 0.0, [level(6)]),
+    ])
+    van = Vehicle(VehicleType.VAN)
+    car = Vehicle(VehicleType.CAR)
+    assert federation.nearest(VehicleType.VAN, 6.0) == (1, 0)
+    first = federation.park(van, 6.0)
+    # centre has one regular spot left, not enough for another van
+    assert federation.nearest(VehicleType.VAN, 6.0) == (2, 0)
+    assert federation.nearest(VehicleType.CAR, 6.0) == (1, 0)
+    federation.park(car, 6.0)
+    assert federation.nearest(VehicleType.CAR, 6.0) == (2, 0)
+    federation.unpark(first)
+    assert federation.nearest(VehicleType.VAN, 6.0) == (1, 0)
+
+    # against polling every level, on random parks and unparks
+    rng = random.Random(0)
+    garages = [Garage(str(g), rng.uniform(0, 100), [level(rng.randint(0, 8)) for _ in range(rng.randint(1, 3))])
+               for g in range(50)]
+    federation = ParkingFederation(garages)
+    tickets = []
+    for _ in range(3000):
+        vehicle = Vehicle(rng.choice(TYPES))
+        position = rng.uniform(-10, 110)
+        spot = federation.nearest(vehicle.type, position)
+        t = TYPES.index(vehicle.type)
+        polled = [abs(garage.position - position) for garage in federation.garages
+                  if any(_room(lot)[t] for lot in garage.levels)]
+        assert (spot is None) == (not polled)
+        if spot is not None:
+            assert abs(federation.positions[spot[0]] - position) == min(polled)
+        if tickets and rng.random() < 0.4:
+            federation.unpark(tickets.pop(rng.randrange(len(tickets))))
+        else:
+            ticket = federation.park(vehicle, position)
+            if ticket is not None:
+                tickets.append(ticket)
+    print('nearest garage matches polling every level')
@@ -0,0 +1,375 @@
+"""
+ParkingLot state that survives a restart
+
+Two files in a directory:
+
+    snapshot.bin  the whole lot at some point, written by checkpoint()
+    wal.log       every park / unpark since, appended as it happens
+
+The snapshot is a fixed header and then the lot as raw columns, no pickling:
+
+    header        magic, version, motorcycle spots, regular spots,
+                  next ticket, ticket count, last log sequence in it
+    bitmaps       motorcycle occupied, regular occupied, regular vans,
+                  one bit per spot laid out like SpotRow's
+    ticket index  tickets (int64), first spots (int64), rows (byte,
+                  0 motorcycle 1 regular), spots taken (byte)
+
+A log record is 31 bytes: sequence, PARK or UNPARK, row, spots taken,
+ticket, first spot and a crc32 of the rest. Records are buffered and
+written with one fsync per `batch` of them (group commit), so a crash loses
+at most the last batch - 1 events unless sync() is called, e.g. before
+handing a ticket out. A record cut short or with a bad crc ends the log, it
+is what was being written when the process died, and is cut off before
+anything new is appended.
+
+Recovery maps the snapshot and copies its columns straight into bytearrays
+and arrays, then applies only the log records with a higher sequence than
+the snapshot's to the bitmaps and the ticket index. Nothing goes through
+park(): the free spot structures are built once at the end from the
+bitmaps, a word at a time.
+
+Bitmaps and columns are little endian, the ticket columns are in the
+machine's byte order.
+"""
+import gc
+import mmap
+import os
+import random
+import struct
+import tempfile
+import zlib
+from array import array
+from typing import Iterator, Optional, Tuple
+
+from parkinglot import FreeRuns, FreeSpots, ParkingLot, Spot, SpotRow, Vehicle, VehicleType
+
+SNAPSHOT = "snapshot.bin"
+LOG = "wal.log"
+MAGIC = b"PLOT"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQQQQ")
+RECORD = struct.Struct("<QBBBQQ")
+CRC = struct.Struct("<I")
+RECORD_SIZE = RECORD.size + CRC.size
+PARK = 1
+UNPARK = 2
+TYPES = (VehicleType.MOTORCYCLE, VehicleType.CAR, VehicleType.VAN)
+
+
+def _bits(row) -> Tuple[bytes, bytes]:
+    # (occupied, vans) bitmaps of a row, SpotRow or a list of Spots
+    if isinstance(row, SpotRow):
+        return bytes(row.occupied), bytes(row.vans)
+    occupied = bytearray((len(row) + 7) // 8)
+    vans = bytearray((len(row) + 7) // 8)
+    for index, spot in enumerate(row):
+        if spot.isOccupied:
+            SpotRow.set(occupied, index, True)
+        if spot.isVan:
+            SpotRow.set(vans, index, True)
+    return bytes(occupied), bytes(vans)
+
+
+def _syncDirectory(path: str) -> None:
+    # makes a rename in the directory durable
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def saveSnapshot(lot: ParkingLot, path: str, sequence: int = 0) -> None:
+    # written next to `path` and renamed over it, a crash leaves the old one
+    mOccupied, _ = _bits(lot.mSpotList)
+    rOccupied, rVans = _bits(lot.rSpotList)
+    tickets = array('q', lot.tickets)
+    entries = lot.tickets.values()
+    starts = array('q', (start for _, start, _ in entries))
+    rows = bytes(0 if row is lot.mSpotList else 1 for row, _, _ in entries)
+    counts = bytes(numRuns for _, _, numRuns in entries)
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(lot.mSpotList), len(lot.rSpotList),
+                            lot.nextTicket, len(tickets), sequence))
+        f.write(mOccupied)
+        f.write(rOccupied)
+        f.write(rVans)
+        tickets.tofile(f)
+        starts.tofile(f)
+        f.write(rows)
+        f.write(counts)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    _syncDirectory(path)
+
+
+def _load(path: str, compact: bool, log: Optional[str] = None) -> Tuple[ParkingLot, int, int]:
+    # (lot, last sequence in it, good records in the log). the log tail is
+    # applied to the bitmaps and the ticket index as they come out of the
+    # snapshot, the free spot structures are only built once at the end
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, motorcycleSpots, regularSpots, nextTicket, count, sequence = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} parking lot snapshot")
+        offset = HEADER.size
+
+        def take(size: int) -> bytes:
+            nonlocal offset
+            offset += size
+            if offset > len(data):
+                raise ValueError(f"{path} is cut short")
+            return data[offset - size:offset]
+
+        mOccupied = bytearray(take((motorcycleSpots + 7) // 8))
+        rOccupied = bytearray(take((regularSpots + 7) // 8))
+        rVans = bytearray(take((regularSpots + 7) // 8))
+        tickets = array('q')
+        tickets.frombytes(take(count * tickets.itemsize))
+        starts = array('q')
+        starts.frombytes(take(count * starts.itemsize))
+        rows = take(count)
+        counts = take(count)
+
+    # an empty lot to put the rows, tickets and free spots into
+    lot = ParkingLot(0, 0, compact=compact)
+    if compact:
+        lot.mSpotList = SpotRow(motorcycleSpots)
+        lot.mSpotList.occupied = mOccupied
+        lot.rSpotList = SpotRow(regularSpots)
+        lot.rSpotList.occupied = rOccupied
+        lot.rSpotList.vans = rVans
+    else:
+        lot.mSpotList = [Spot() for _ in range(motorcycleSpots)]
+        lot.rSpotList = [Spot() for _ in range(regularSpots)]
+    lists = (lot.mSpotList, lot.rSpotList)
+    occupied = (mOccupied, rOccupied)
+    # every entry points at a row, so the cyclic gc would keep walking the
+    # dict while it grows, twice the time for a big lot. none of it can be
+    # garbage
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        lot.tickets = dict(zip(tickets, zip(map(lists.__getitem__, rows), starts, counts)))
+    finally:
+        if enabled:
+            gc.enable()
+
+    records = 0
+    for recordSequence, op, row, numRuns, ticket, start in readLog(log) if log else ():
+        records += 1
+        if recordSequence <= sequence:
+            continue
+        bits = occupied[row]
+        if op == PARK:
+            if ticket in lot.tickets or any(SpotRow.get(bits, index) for index in range(start, start + numRuns)):
+                raise ValueError(f"log record {recordSequence} parks on taken spots")
+            lot.tickets[ticket] = (lists[row], start, numRuns)
+            nextTicket = max(nextTicket, ticket + 1)
+        elif lot.tickets.pop(ticket, None) is None:
+            raise ValueError(f"log record {recordSequence} unparks unknown ticket {ticket}")
+        for index in range(start, start + numRuns):
+            SpotRow.set(bits, index, op == PARK)
+            if numRuns == 3:
+                SpotRow.set(rVans, index, op == PARK)
+        sequence = recordSequence
+
+    if not compact:
+        for row, bits, vans in ((lot.mSpotList, mOccupied, None), (lot.rSpotList, rOccupied, rVans)):
+            for index, spot in enumerate(row):
+                spot.isOccupied = SpotRow.get(bits, index)
+                spot.isVan = vans is not None and SpotRow.get(vans, index)
+    lot.totalSpots = motorcycleSpots + regularSpots
+    lot.mFree = FreeSpots(motorcycleSpots, mOccupied)
+    lot.rFree = FreeRuns(regularSpots, rOccupied)
+    lot.vanSpots = int.from_bytes(rVans, "little").bit_count()
+    lot.nextTicket = nextTicket
+    return lot, sequence, records
+
+
+def loadSnapshot(path: str, compact: bool = True) -> Tuple[ParkingLot, int]:
+    # returns the lot and the last log sequence the snapshot includes
+    lot, sequence, _ = _load(path, compact)
+    return lot, sequence
+
+
+def readLog(path: str) -> Iterator[Tuple[int, int, int, int, int, int]]:
+    # (sequence, PARK or UNPARK, row, spots taken, ticket, first spot) up to
+    # the first torn or damaged record
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        end = len(data) - len(data) % RECORD_SIZE
+        for offset in range(0, end, RECORD_SIZE):
+            record = data[offset:offset + RECORD_SIZE]
+            if zlib.crc32(record[:RECORD.size]) != CRC.unpack_from(record, RECORD.size)[0]:
+                return
+            yield RECORD.unpack_from(record)
+
+
+class WriteAheadLog:
+    def __init__(self, path: str, batch: int = 256, end: Optional[int] = None):
+        # end: length of the good part of an existing log, anything after it
+        # is dropped
+        self.path = path
+        self.batch = batch
+        self.file = open(path, "ab")
+        if end is not None:
+            self.file.truncate(end)
+        self.pending = bytearray()
+        self.count = 0
+
+    def append(self, sequence: int, op: int, row: int, numRuns: int, ticket: int, start: int) -> None:
+        record = RECORD.pack(sequence, op, row, numRuns, ticket, start)
+        self.pending += record
+        self.pending += CRC.pack(zlib.crc32(record))
+        self.count += 1
+        if self.count >= self.batch:
+            self.sync()
+
+    def sync(self) -> None:
+        # everything appended so far is on disk once this returns
+        if self.pending:
+            self.file.write(self.pending)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending.clear()
+            self.count = 0
+
+    def reset(self) -> None:
+        # empties the log, only once a snapshot holds all of it
+        self.pending.clear()
+        self.count = 0
+        self.file.truncate(0)
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.sync()
+        self.file.close()
+
+
+def recover(directory: str, compact: bool = True) -> Tuple[Optional[ParkingLot], int, int]:
+    # (lot, last sequence applied, records in the good part of the log),
+    # None for the lot if nothing was saved. only reads, the files are left
+    # as they are
+    path = os.path.join(directory, SNAPSHOT)
+    if not os.path.exists(path):
+        return None, 0, 0
+    return _load(path, compact, os.path.join(directory, LOG))
+
+
+class PersistentParkingLot:
+    def __init__(self, directory: str, motorcycleSpots: int = 0, regularSpots: int = 0,
+                 batch: int = 256, compact: bool = True):
+        # picks up the lot saved in `directory`, a new lot of the given size
+        # if there is none yet
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.lot, self.sequence, records = recover(directory, compact)
+        if self.lot is None:
+            self.lot = ParkingLot(motorcycleSpots, regularSpots, compact=compact)
+            saveSnapshot(self.lot, os.path.join(directory, SNAPSHOT))
+        self.log = WriteAheadLog(os.path.join(directory, LOG), batch, records * RECORD_SIZE)
+
+    def _append(self, op: int, ticket: int) -> None:
+        row, start, numRuns = self.lot.tickets[ticket]
+        self.sequence += 1
+        self.log.append(self.sequence, op, 0 if row is self.lot.mSpotList else 1, numRuns, ticket, start)
+
+    def park(self, vehicle: Vehicle) -> Optional[int]:
+        ticket = self.lot.park(vehicle)
+        if ticket is not None:
+            self._append(PARK, ticket)
+        return ticket
+
+    def unpark(self, ticket: int) -> None:
+        if ticket not in self.lot.tickets:
+            raise KeyError(f"no vehicle parked with ticket {ticket}")
+        self._append(UNPARK, ticket)
+        self.lot.unpark(ticket)
+
+    def sync(self) -> None:
+        self.log.sync()
+
+    def checkpoint(self) -> None:
+        # snapshot everything and start the log over. a crash after the
+        # snapshot but before the log is emptied is fine, its records are
+        # all at or below the snapshot's sequence and get skipped
+        self.log.sync()
+        saveSnapshot(self.lot, os.path.join(self.directory, SNAPSHOT), self.sequence)
+        self.log.reset()
+
+    def close(self) -> None:
+        self.log.close()
+
+    def spotsRemaining(self) -> dict:
+        return self.lot.spotsRemaining()
+
+    def isParkingLotFull(self) -> bool:
+        return self.lot.isParkingLotFull()
+
+    def isParkingLotEmpty(self) -> bool:
+        return self.lot.isParkingLotEmpty()
+
+    def vanSpotsTakenUp(self) -> int:
+        return self.lot.vanSpotsTakenUp()
+
+
+def _state(lot: ParkingLot):
+    # everything recovery has to get back, rows as bitmaps so compact and
+    # Spot lots compare
+    lists = (lot.mSpotList, lot.rSpotList)
+    tickets = {ticket: (lists.index(row), start, numRuns) for ticket, (row, start, numRuns) in lot.tickets.items()}
+    return (_bits(lot.mSpotList), _bits(lot.rSpotList), tickets, lot.nextTicket, lot.vanSpots,
+            len(lot.mFree), len(lot.rFree), lot.rFree.longest())
+
+
+if __name__ == "__main__":
+    van = Vehicle(VehicleType.VAN)
+    car = Vehicle(VehicleType.CAR)
+    with tempfile.TemporaryDirectory() as directory:
+        lot = PersistentParkingLot(directory, 2, 9)
+        first = lot.park(van)
+        lot.park(car)
+        lot.checkpoint()
+        lot.park(van)
+        lot.unpark(first)
+        lot.sync()
+        lot.park(car)
+        # the process dies here: the last park was never synced, and half a
+        # record is left at the end of the log
+        with open(os.path.join(directory, LOG), "ab") as f:
+            f.write(b"\x07" * 10)
+
+        again = PersistentParkingLot(directory)
+        assert again.spotsRemaining() == {"motorcycle": 2, "regular": 5}
+        assert again.vanSpotsTakenUp() == 3 and first not in again.lot.tickets
+        again.park(car)
+        again.close()
+        assert PersistentParkingLot(directory).spotsRemaining() == {"motorcycle": 2, "regular": 4}
+    print('recovered the lot from snapshot + log tail')
+
+    # random parks, unparks, checkpoints and crashes against a lot that never
+    # went down, in both row layouts
+    rng = random.Random(0)
+    for compact in (True, False):
+        with tempfile.TemporaryDirectory() as directory:
+            lot = PersistentParkingLot(directory, 20, 200, batch=rng.randint(1, 32), compact=compact)
+            for _ in range(3000):
+                if lot.lot.tickets and rng.random() < 0.45:
+                    lot.unpark(rng.choice(list(lot.lot.tickets)))
+                else:
+                    lot.park(Vehicle(rng.choice(TYPES)))
+                roll = rng.random()
+                if roll < 0.005:
+                    lot.checkpoint()
+                elif roll < 0.02:
+                    lot.close()
+                    expected = _state(lot.lot)
+                    lot = PersistentParkingLot(directory, batch=rng.randint(1, 32), compact=compact)
+                    assert _state(lot.lot) == expected
+            lot.close()
+    print('recovered state matches the live lot')
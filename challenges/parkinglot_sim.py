@@ -0,0 +1,140 @@
+"""
+Arrival / departure simulator for ParkingLot in parkinglot.py
+
+generateEvents() makes a day at the garage: vehicles arrive as a Poisson
+process (exponential gaps, `rate` per minute) with a configurable
+MOTORCYCLE/CAR/VAN mix, each stays an exponential time with mean `stay`
+minutes and then leaves. The events are kept as parallel array columns, not
+a tuple per event, so millions of them fit comfortably:
+
+    times[i]     minutes since the start
+    kinds[i]     ARRIVE or DEPART
+    vehicles[i]  vehicle number, a departure names the arrival it ends
+    types[i]     index into TYPES (only used for arrivals)
+
+replay() runs the events against a lot and times every park() / unpark()
+call. Nothing is printed or logged while it runs: latencies go into an
+array, occupancy is sampled every `sampleEvery` events, and the report is
+built afterwards. A departure for a vehicle that was turned away is
+skipped.
+"""
+import heapq
+import logging
+import random
+import time
+from array import array
+from typing import Dict, Optional, Sequence
+
+from parkinglot import ParkingLot, Vehicle, VehicleType
+
+log = logging.getLogger(__name__)
+
+ARRIVE = 0
+DEPART = 1
+TYPES = (VehicleType.MOTORCYCLE, VehicleType.CAR, VehicleType.VAN)
+DEFAULT_MIX = {VehicleType.MOTORCYCLE: 0.2, VehicleType.CAR: 0.7, VehicleType.VAN: 0.1}
+
+
+class Events:
+    def __init__(self):
+        self.times = array('d')
+        self.kinds = bytearray()
+        self.vehicles = array('q')
+        self.types = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def append(self, time: float, kind: int, vehicle: int, type: int) -> None:
+        self.times.append(time)
+        self.kinds.append(kind)
+        self.vehicles.append(vehicle)
+        self.types.append(type)
+
+
+def generateEvents(count: int, rate: float, stay: float,
+                   mix: Optional[Dict[VehicleType, float]] = None, seed: int = 0) -> Events:
+    # `count` events in time order, arrivals and departures together
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    weights = [mix.get(type, 0.0) for type in TYPES]
+    events = Events()
+    departures = []
+    now = 0.0
+    vehicle = 0
+    while len(events) < count:
+        nextArrival = now + rng.expovariate(rate)
+        # everyone due to leave before the next arrival goes first
+        while departures and departures[0][0] <= nextArrival and len(events) < count:
+            leaves, number, type = heapq.heappop(departures)
+            events.append(leaves, DEPART, number, type)
+        if len(events) == count:
+            break
+        now = nextArrival
+        type = rng.choices(range(len(TYPES)), weights)[0]
+        events.append(now, ARRIVE, vehicle, type)
+        heapq.heappush(departures, (now + rng.expovariate(1 / stay), vehicle, type))
+        vehicle += 1
+    return events
+
+
+def rateForLoad(lot: ParkingLot, stay: float, load: float,
+                mix: Optional[Dict[VehicleType, float]] = None) -> float:
+    # arrivals per minute that keep `load` of the spots busy on average
+    mix = mix or DEFAULT_MIX
+    spotsPerVehicle = sum(share * (3 if type == VehicleType.VAN else 1) for type, share in mix.items())
+    return load * lot.totalSpots / (stay * spotsPerVehicle)
+
+
+def _percentiles(latencies: array, points: Sequence[float]) -> Dict[float, float]:
+    ordered = sorted(latencies)
+    if not ordered:
+        return {point: 0.0 for point in points}
+    return {point: ordered[min(int(point / 100 * len(ordered)), len(ordered) - 1)] / 1000 for point in points}
+
+
+def replay(lot: ParkingLot, events: Events, sampleEvery: int = 10_000) -> dict:
+    parkNs = array('q')
+    unparkNs = array('q')
+    occupancy = []
+    tickets = {}
+    rejected = 0
+    vehicles = [Vehicle(type) for type in TYPES]
+    clock = time.perf_counter_ns
+    total = lot.totalSpots
+
+    start = time.perf_counter()
+    for i in range(len(events)):
+        number = events.vehicles[i]
+        if events.kinds[i] == ARRIVE:
+            before = clock()
+            ticket = lot.park(vehicles[events.types[i]])
+            parkNs.append(clock() - before)
+            if ticket is None:
+                rejected += 1
+            else:
+                tickets[number] = ticket
+        else:
+            ticket = tickets.pop(number, None)
+            if ticket is not None:
+                before = clock()
+                lot.unpark(ticket)
+                unparkNs.append(clock() - before)
+        if i % sampleEvery == 0:
+            remaining = lot.spotsRemaining()
+            occupancy.append((events.times[i], 1 - (remaining["motorcycle"] + remaining["regular"]) / total))
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "events": len(events),
+        "seconds": elapsed,
+        "events/sec": len(events) / elapsed if elapsed else 0.0,
+        "parks": len(parkNs),
+        "rejected": rejected,
+        "park us": _percentiles(parkNs, (50, 90, 99, 99.9)),
+        "unpark us": _percentiles(unparkNs, (50, 90, 99, 99.9)),
+        "occupancy": occupancy,
+    }
+    log.info("replayed %d events in %.2fs, %d of %d arrivals turned away",
+             len(events), elapsed, rejected, len(parkNs))
+    return report
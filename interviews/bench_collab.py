@@ -0,0 +1,104 @@
+"""
+Stress benchmark for collaborative editing, see editor_collab.py
+
+Every peer types, backspaces, breaks lines and moves around its own replica
+while merging what the others did every few ops, first with one thread per
+peer and then with one asyncio task per peer. Reports the ops/sec over all
+peers, how long the replicas take to agree once everyone stops typing, and
+checks that they all end up with the same document.
+
+    python bench_collab.py               # 4 peers, 20k ops each
+    python bench_collab.py 8 50000
+"""
+import asyncio
+import random
+import sys
+import threading
+import time
+
+from editor_collab import Peer
+
+
+def make_peers(count, storage):
+    peers = [Peer(site, storage) for site in range(1, count + 1)]
+    for peer in peers:
+        peer.connect(*peers)
+    return peers
+
+
+def random_op(peer, rng):
+    x = rng.random()
+    if x < 0.6:
+        peer.type_in(rng.choice("abcdefgh "))
+    elif x < 0.75:
+        peer.backspace()
+    elif x < 0.8:
+        peer.newline()
+    else:
+        peer.move_cursor(rng.choice(("left", "right", "up", "down")))
+
+
+def converge(peers):
+    start = time.perf_counter()
+    while any(peer.receive() for peer in peers):
+        pass
+    elapsed = time.perf_counter() - start
+    documents = {peer.document() for peer in peers}
+    assert len(documents) == 1, "replicas did not converge"
+    return elapsed, len(documents.pop())
+
+
+def thread_session(count, ops, storage="rope", receive_every=8):
+    peers = make_peers(count, storage)
+
+    def work(peer):
+        rng = random.Random(peer.site)
+        for i in range(ops):
+            random_op(peer, rng)
+            if i % receive_every == 0:
+                peer.receive()
+
+    threads = [threading.Thread(target=work, args=(peer,)) for peer in peers]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    convergence, length = converge(peers)
+    return {"ops/sec": count * ops / elapsed, "converge": convergence, "chars": length}
+
+
+def async_session(count, ops, storage="rope", receive_every=8):
+    peers = make_peers(count, storage)
+
+    async def work(peer):
+        rng = random.Random(peer.site)
+        for i in range(ops):
+            random_op(peer, rng)
+            if i % receive_every == 0:
+                peer.receive()
+                # let the other peers run, like waiting on a socket would
+                await asyncio.sleep(0)
+
+    async def run():
+        await asyncio.gather(*(work(peer) for peer in peers))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    convergence, length = converge(peers)
+    return {"ops/sec": count * ops / elapsed, "converge": convergence, "chars": length}
+
+
+def main(count=4, ops=20_000):
+    print(f"{count} peers, {ops:,} ops each, merging every 8 ops")
+    print(f"{'mode':<8} {'storage':<8} {'ops/sec':>10} {'converge':>10} {'chars':>8}")
+    for storage in ("list", "rope"):
+        for mode, session in (("threads", thread_session), ("asyncio", async_session)):
+            timings = session(count, ops, storage)
+            print(f"{mode:<8} {storage:<8} {timings['ops/sec']:>10,.0f} {timings['converge']:>9.3f}s {timings['chars']:>8,}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
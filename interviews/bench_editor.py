@@ -0,0 +1,332 @@
+"""
+Benchmark for the TextEditor storage backends
+
+Replays the editing patterns that hurt the list of lists: one very long line
+(minified JSON, logs) with typing, backspacing and line breaks in the middle,
+a file with lots of lines where line breaks shift everything after them, and
+a recorded session replayed one call at a time against apply_batch,
+rendering after every keystroke (the whole document versus a viewport),
+jumping far back and forth through the undo history, patching a few lines
+of a big file on disk, prefixing every line with one cursor versus a
+cursor on every line, and searching a big document between small edits by
+scanning every line versus the trigram index, and with a line break
+before each search.
+
+    python bench_editor.py                             # 200k char line, 20k keystrokes, 1M lines, 200k ops
+    python bench_editor.py 500000 50000 2000000 10000000
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from editor_history import History
+from editor_storage import STORAGES
+from round1datology import TextEditor
+
+
+def long_line_session(storage, line_length, keystrokes):
+    editor = TextEditor(storage)
+    editor.type_in("x" * line_length)
+    editor.cursor = [0, line_length // 2]
+
+    timings = {}
+
+    start = time.perf_counter()
+    for _ in range(keystrokes):
+        editor.type_in("a")
+    timings["type_in"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(keystrokes):
+        editor.backspace()
+    timings["backspace"] = time.perf_counter() - start
+
+    # break the line and glue it back together, the cursor walks right a bit
+    # between each pair so the split point keeps moving
+    start = time.perf_counter()
+    for _ in range(keystrokes // 100):
+        editor.newline()
+        editor.backspace()
+        editor.move_cursor("right")
+    timings["newline+join"] = time.perf_counter() - start
+
+    return timings
+
+
+def many_lines_session(storage, line_count, edits):
+    text = "\n".join("line %d of the log file" % i for i in range(line_count))
+    editor = TextEditor(STORAGES[storage](text))
+    step = max(line_count // edits, 1)
+
+    timings = {}
+
+    # break lines near the top, every one of these shifts the whole file
+    start = time.perf_counter()
+    for i in range(edits):
+        editor.cursor = [i % 100, 4]
+        editor.newline()
+        editor.backspace()
+    timings["newline+join"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(edits):
+        editor.goto_line(i * step)
+    timings["goto_line"] = time.perf_counter() - start
+
+    # the plain list backends walk every line for this one, keep it short
+    jumps = edits // 10
+    length = len(text)
+    start = time.perf_counter()
+    for i in range(jumps):
+        editor.goto_offset(i * length // jumps)
+    timings["goto_offset"] = time.perf_counter() - start
+
+    return timings
+
+
+def recorded_session(op_count, seed=0):
+    # bursts of typing and deleting with some cursor walking in between,
+    # roughly what a person produces
+    rng = random.Random(seed)
+    ops = []
+    while len(ops) < op_count:
+        roll = rng.random()
+        burst = rng.randint(1, 40)
+        if roll < 0.55:
+            ops.extend(("type_in", c) for c in rng.choices("abcdefghij ", k=burst))
+        elif roll < 0.7:
+            ops.extend([("backspace", None)] * burst)
+        elif roll < 0.75:
+            ops.append(("newline", None))
+        else:
+            direction = rng.choice(("left", "right", "up", "down"))
+            ops.extend([("move_cursor", direction)] * burst)
+    return ops[:op_count]
+
+
+def replay_session(storage, ops):
+    timings = {}
+
+    editor = TextEditor(storage)
+    start = time.perf_counter()
+    for opcode, payload in ops:
+        if payload is None:
+            getattr(editor, opcode)()
+        else:
+            getattr(editor, opcode)(payload)
+    timings["one by one"] = time.perf_counter() - start
+
+    batched = TextEditor(storage)
+    start = time.perf_counter()
+    batched.apply_batch(ops)
+    timings["apply_batch"] = time.perf_counter() - start
+
+    assert batched.cursor == editor.cursor
+    return timings
+
+
+def render_session(storage, line_count, keystrokes, viewport=50):
+    text = "\n".join("line %d of the log file" % i for i in range(line_count))
+    editor = TextEditor(STORAGES[storage](text))
+    editor.goto_line(line_count // 2)
+
+    timings = {}
+
+    start = time.perf_counter()
+    for _ in range(keystrokes):
+        editor.type_in("a")
+        str(editor)
+    timings["str"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(keystrokes):
+        editor.type_in("a")
+        top = editor.cursor[0] - viewport // 2
+        editor.render_range(top, top + viewport)
+    timings["render_range"] = time.perf_counter() - start
+
+    return timings
+
+
+def history_session(checkpoint_every, ops):
+    editor = TextEditor("gap", history=History(checkpoint_every=checkpoint_every))
+    for opcode, payload in ops:
+        if payload is None:
+            getattr(editor, opcode)()
+        else:
+            getattr(editor, opcode)(payload)
+    latest = editor.version
+
+    timings = {"steps": latest, "history bytes": editor.history.bytes}
+    # bounce between the oldest and newest versions, the worst case for
+    # walking the log step by step
+    start = time.perf_counter()
+    for _ in range(5):
+        editor.revert_to(latest // 10)
+        editor.revert_to(latest)
+    timings["revert"] = (time.perf_counter() - start) / 10
+    return timings
+
+
+def file_session(line_count, patches=10):
+    path = os.path.join(tempfile.mkdtemp(), "big.log")
+    with open(path, "w") as f:
+        for i in range(line_count):
+            f.write("%d INFO request handled in %d ms by worker %d\n" % (i, i % 997, i % 13))
+    size = os.path.getsize(path)
+
+    timings = {"MB": size / 2**20}
+
+    def patch(editor):
+        for i in range(patches):
+            editor.goto_line(i * line_count // patches)
+            editor.type_in("# ")
+
+    # read everything into gap buffers and write it all back
+    start = time.perf_counter()
+    with open(path) as f:
+        editor = TextEditor(STORAGES["gap"](f.read()))
+    patch(editor)
+    editor.save(path)
+    timings["read whole file"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    editor = TextEditor.open(path)
+    patch(editor)
+    editor.save()
+    editor.close()
+    timings["mmap"] = time.perf_counter() - start
+
+    os.remove(path)
+    return timings
+
+
+def multi_cursor_session(storage, line_count):
+    text = "\n".join("value_%d = compute(%d)" % (i, i) for i in range(line_count))
+    timings = {}
+
+    # undo is on like in a real session, one cursor makes a step per line
+    editor = TextEditor(STORAGES[storage](text), history=True)
+    start = time.perf_counter()
+    for line in range(line_count):
+        editor.goto_line(line)
+        editor.type_in("self.")
+    timings["one cursor"] = time.perf_counter() - start
+
+    editor = TextEditor(STORAGES[storage](text), history=True)
+    start = time.perf_counter()
+    for line in range(1, line_count):
+        editor.add_cursor(line, 0)
+    editor.type_in("self.")
+    timings["multi-cursor"] = time.perf_counter() - start
+    return timings
+
+
+def search_session(storage, line_count, searches):
+    rng = random.Random(0)
+    words = ["alpha", "beta", "gamma", "delta", "omega", "sigma", "kappa"]
+    text = "\n".join(
+        " ".join(rng.choice(words) + str(rng.randrange(1000)) for _ in range(8))
+        for _ in range(line_count)
+    )
+    editor = TextEditor(STORAGES[storage](text))
+    patterns = ["gamma%d" % rng.randrange(1000) for _ in range(searches)]
+    timings = {}
+
+    start = time.perf_counter()
+    for pattern in patterns:
+        editor.goto_line(rng.randrange(line_count))
+        editor.type_in("x")
+        hits = [line for line in range(editor.text.line_count()) if pattern in editor.text.line_text(line)]
+    timings["scan"] = (time.perf_counter() - start) / searches
+
+    start = time.perf_counter()
+    editor.find_all("gamma")
+    timings["build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for pattern in patterns:
+        editor.goto_line(rng.randrange(line_count))
+        editor.type_in("x")
+        hits = editor.find_all(pattern)
+    timings["index"] = (time.perf_counter() - start) / searches
+
+    start = time.perf_counter()
+    for pattern in patterns:
+        editor.goto_line(rng.randrange(line_count))
+        editor.newline()
+        hits = editor.find_all(pattern)
+    timings["newline"] = (time.perf_counter() - start) / searches
+    return timings
+
+
+def main(line_length=200_000, keystrokes=20_000, line_count=1_000_000, op_count=200_000):
+    print(f"line of {line_length:,} chars, {keystrokes:,} keystrokes in the middle")
+    print(f"{'storage':<8} {'type_in':>10} {'backspace':>10} {'newline+join':>13}")
+    for storage in STORAGES:
+        timings = long_line_session(storage, line_length, keystrokes)
+        print(f"{storage:<8} {timings['type_in']:>9.3f}s {timings['backspace']:>9.3f}s {timings['newline+join']:>12.3f}s")
+
+    edits = 1_000
+    print()
+    print(f"{line_count:,} lines, {edits:,} line breaks and line jumps, {edits // 10:,} offset jumps")
+    print(f"{'storage':<8} {'newline+join':>13} {'goto_line':>10} {'goto_offset':>12}")
+    for storage in STORAGES:
+        timings = many_lines_session(storage, line_count, edits)
+        print(f"{storage:<8} {timings['newline+join']:>12.3f}s {timings['goto_line']:>9.3f}s {timings['goto_offset']:>11.3f}s")
+
+    ops = recorded_session(op_count)
+    print()
+    print(f"replaying a recorded session of {op_count:,} ops")
+    print(f"{'storage':<8} {'one by one':>11} {'apply_batch':>12}")
+    for storage in STORAGES:
+        timings = replay_session(storage, ops)
+        print(f"{storage:<8} {timings['one by one']:>10.3f}s {timings['apply_batch']:>11.3f}s")
+
+    render_lines = line_count // 10
+    print()
+    print(f"{render_lines:,} lines, render after each of 1,000 keystrokes")
+    print(f"{'storage':<8} {'str':>9} {'render_range':>13}")
+    for storage in STORAGES:
+        timings = render_session(storage, render_lines, 1_000)
+        print(f"{storage:<8} {timings['str']:>8.3f}s {timings['render_range']:>12.3f}s")
+
+    print()
+    print(f"undo history of the {op_count:,} op session, jumping between 10% and 100%")
+    print(f"{'checkpoint every':<17} {'steps':>8} {'history MB':>11} {'per jump':>10}")
+    for checkpoint_every in (10**9, 10_000, 1_000, 100):
+        timings = history_session(checkpoint_every, ops)
+        label = "never" if checkpoint_every == 10**9 else f"{checkpoint_every:,}"
+        print(f"{label:<17} {timings['steps']:>8,} {timings['history bytes'] / 2**20:>11.2f} {timings['revert']:>9.4f}s")
+
+    cursor_lines = line_count // 20
+    print()
+    print(f"type a prefix on all {cursor_lines:,} lines")
+    print(f"{'storage':<8} {'one cursor':>11} {'multi-cursor':>13}")
+    for storage in STORAGES:
+        if storage == "piece":
+            # every piece table edit walks the piece list, 50k of them takes minutes
+            continue
+        timings = multi_cursor_session(storage, cursor_lines)
+        print(f"{storage:<8} {timings['one cursor']:>10.3f}s {timings['multi-cursor']:>12.3f}s")
+
+    search_lines = line_count // 5
+    print()
+    print(f"{search_lines:,} lines, a keystroke (or a line break) then a search, 100 times")
+    print(f"{'storage':<8} {'scan/search':>12} {'index build':>12} {'index/search':>13} {'newline/search':>15}")
+    for storage in STORAGES:
+        timings = search_session(storage, search_lines, 100)
+        print(f"{storage:<8} {timings['scan']:>11.4f}s {timings['build']:>11.3f}s {timings['index']:>12.4f}s"
+              f" {timings['newline']:>14.4f}s")
+
+    timings = file_session(line_count)
+    print()
+    print(f"open a {timings['MB']:.0f} MB file, patch 10 lines, save")
+    print(f"{'read whole file':<16} {timings['read whole file']:>8.3f}s")
+    print(f"{'mmap':<16} {timings['mmap']:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,45 @@
+"""
+Memory benchmark for the TextEditor storage backends
+
+Loads the same generated log into every backend and reports bytes per
+character, both as measured by tracemalloc and as estimated by
+TextEditor.memory_usage(). Runs separately from bench_editor.py because
+tracemalloc slows everything down.
+
+    python bench_editor_memory.py            # ~10 MB of 80 char lines
+    python bench_editor_memory.py 100        # ~100 MB
+"""
+import sys
+import tracemalloc
+
+from editor_storage import STORAGES
+from round1datology import TextEditor
+
+
+def make_log(megabytes):
+    line = "2024-01-01T00:00:00Z INFO worker=%02d request handled, status=200 ms=%04d"
+    count = megabytes * 2**20 // 80
+    return "\n".join(line % (i % 100, i % 10000) for i in range(count))
+
+
+def measure(storage, text):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    editor = TextEditor(STORAGES[storage](text))
+    measured = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    report = editor.memory_usage()
+    return measured / len(text), report["bytes_per_char"]
+
+
+def main(megabytes=10):
+    text = make_log(megabytes)
+    print(f"{len(text) / 2**20:.0f} MB of text, {text.count(chr(10)) + 1:,} lines")
+    print(f"{'storage':<8} {'measured B/char':>16} {'memory_usage B/char':>20}")
+    for storage in STORAGES:
+        measured, estimated = measure(storage, text)
+        print(f"{storage:<8} {measured:>16.2f} {estimated:>20.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
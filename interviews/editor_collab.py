@@ -0,0 +1,226 @@
+"""
+Collaborative editing on top of the TextEditor in round1datology.py
+
+Every Peer owns a full replica of the document (its own TextEditor) and an
+inbox. Local edits are applied straight away and broadcast to the other
+peers' inboxes, remote edits are merged whenever the peer calls receive().
+Nothing is shared between replicas except the inboxes, so there is no lock
+around the document and peers can run on separate threads or asyncio tasks.
+
+The merge is a sequence CRDT in the Logoot style: every character, line
+breaks included, gets a key, a tuple of (digit, site, clock) triples, and
+the document is the characters sorted by key. A new character gets a key
+strictly between its neighbours, so inserting and deleting by key gives the
+same document whatever order the ops arrive in. `keys` is that sorted list,
+so turning a key into a position is a bisect and the offset goes through
+the storage's offset_position().
+
+    ("insert", site, clock, [(key, char), ...], anchor)
+    ("delete", site, clock, [key, ...], anchor)
+    ("cursor", site, clock, None, anchor)
+
+clock is the sender's Lamport clock. anchor is the key of the character left
+of the sender's cursor, () for the start of the document, and locates that
+cursor on every replica however the text around it moved. A delete that
+overtakes the insert it undoes is remembered in `deleted` and the insert is
+dropped when it turns up. Ops from one site arrive in the order it sent them
+and a key ends in its creator's (site, clock), so once an op from that site
+with a clock at least as big has arrived, so has the key's insert: a delete
+for a key that isn't there after that (two peers deleted the same character)
+is dropped rather than kept as a tombstone forever.
+
+Remote ops are not part of the local undo history, so peers edit without
+one.
+"""
+import random
+from bisect import bisect_left, bisect_right
+from queue import Empty, SimpleQueue
+
+from round1datology import TextEditor
+
+BASE = 2**32
+# new keys land at most this far past their left neighbour, which leaves
+# room for typing after them without growing the key
+STEP = 16
+
+BEGIN = ()
+END = ((BASE, 0, 0),)
+
+
+def key_between(left, right, site, clock, rng=random):
+    # a key strictly between left and right. sites and clocks start at 1 so
+    # the (0, 0, 0) padding never equals a real triple
+    key = []
+    depth = 0
+    bounded = True
+    while True:
+        low = left[depth] if depth < len(left) else (0, 0, 0)
+        high = right[depth] if bounded and depth < len(right) else (BASE, 0, 0)
+        if high[0] - low[0] > 1:
+            key.append((low[0] + rng.randint(1, min(STEP, high[0] - low[0] - 1)), site, clock))
+            return tuple(key)
+        key.append(low)
+        # once the prefix is below right's, anything after it is too
+        bounded = low == high
+        depth += 1
+
+
+class Peer:
+    def __init__(self, site, storage="rope"):
+        if site < 1:
+            raise ValueError("sites start at 1")
+        self.site = site
+        self.clock = 0
+        self.editor = TextEditor(storage)
+        self.keys = []
+        self.deleted = set()
+        # site -> clock of the last op from it
+        self.received = {}
+        self.anchor = BEGIN
+        self.inbox = SimpleQueue()
+        self.peers = []
+        # site -> anchor of every other peer's cursor
+        self.remote_cursors = {}
+        self.rng = random.Random(site)
+
+    def connect(self, *peers):
+        for peer in peers:
+            if peer is not self and peer not in self.peers:
+                self.peers.append(peer)
+                peer.peers.append(self)
+
+    def _tick(self):
+        self.clock += 1
+        return self.clock
+
+    def _broadcast(self, kind, payload):
+        op = (kind, self.site, self.clock, payload, self.anchor)
+        for peer in self.peers:
+            peer.inbox.put(op)
+
+    def _sync_anchor(self):
+        offset = self.editor.offset()
+        self.anchor = self.keys[offset - 1] if offset else BEGIN
+
+    # local edits, the same calls as TextEditor
+
+    def type_in(self, text):
+        if not text:
+            return
+        offset = self.editor.offset()
+        left = self.keys[offset - 1] if offset else BEGIN
+        right = self.keys[offset] if offset < len(self.keys) else END
+        chars = []
+        for char in text:
+            left = key_between(left, right, self.site, self._tick(), self.rng)
+            chars.append((left, char))
+        self.keys[offset:offset] = [key for key, _ in chars]
+        self.editor.type_in(text)
+        self.anchor = left
+        self._broadcast("insert", chars)
+
+    def newline(self):
+        offset = self.editor.offset()
+        left = self.keys[offset - 1] if offset else BEGIN
+        right = self.keys[offset] if offset < len(self.keys) else END
+        key = key_between(left, right, self.site, self._tick(), self.rng)
+        self.keys.insert(offset, key)
+        self.editor.newline()
+        self.anchor = key
+        self._broadcast("insert", [(key, '\n')])
+
+    def backspace(self):
+        offset = self.editor.offset()
+        if offset == 0:
+            return
+        key = self.keys.pop(offset - 1)
+        self._tick()
+        self.editor.backspace()
+        self._sync_anchor()
+        self._broadcast("delete", [key])
+
+    def move_cursor(self, direction):
+        self.editor.move_cursor(direction)
+        self._tick()
+        self._sync_anchor()
+        self._broadcast("cursor", None)
+
+    # remote edits
+
+    def receive(self):
+        # merge everything in the inbox, returns how many ops that was
+        count = 0
+        while True:
+            try:
+                op = self.inbox.get_nowait()
+            except Empty:
+                break
+            self._merge(op)
+            count += 1
+        if count:
+            self._place_cursor()
+        return count
+
+    def _merge(self, op):
+        kind, site, clock, payload, anchor = op
+        self.clock = max(self.clock, clock) + 1
+        self.received[site] = clock
+        self.remote_cursors[site] = anchor
+        if kind == "insert":
+            for key, char in payload:
+                self._remote_insert(key, char)
+        elif kind == "delete":
+            for key in payload:
+                self._remote_delete(key)
+
+    def _remote_insert(self, key, char):
+        if key in self.deleted:
+            self.deleted.discard(key)
+            return
+        keys = self.keys
+        offset = bisect_left(keys, key)
+        if offset < len(keys) and keys[offset] == key:
+            return
+        keys.insert(offset, key)
+        editor = self.editor
+        line, col = editor.text.offset_position(offset)
+        if char == '\n':
+            editor._split(line, col)
+        else:
+            editor._insert(line, col, char)
+
+    def _remote_delete(self, key):
+        keys = self.keys
+        offset = bisect_left(keys, key)
+        if offset == len(keys) or keys[offset] != key:
+            _, site, clock = key[-1]
+            if site != self.site and self.received.get(site, 0) < clock:
+                # the insert has not got here yet
+                self.deleted.add(key)
+            # otherwise it came and went already
+            return
+        del keys[offset]
+        editor = self.editor
+        line, col = editor.text.offset_position(offset)
+        if col == editor.text.line_length(line):
+            editor._join(line)
+        else:
+            editor._delete(line, col, 1)
+
+    def _place_cursor(self):
+        # our own cursor stays right of the character it was anchored to,
+        # even if someone else deleted that character
+        self.editor.cursor = list(self.editor.text.offset_position(bisect_right(self.keys, self.anchor)))
+
+    def cursors(self):
+        # site -> (line, col) for every cursor this peer knows about
+        positions = {self.site: tuple(self.editor.cursor)}
+        for site, anchor in self.remote_cursors.items():
+            positions[site] = self.editor.text.offset_position(bisect_right(self.keys, anchor))
+        return positions
+
+    def document(self):
+        return self.editor._document()
+
+    def __str__(self):
+        return str(self.editor)
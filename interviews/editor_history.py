@@ -0,0 +1,183 @@
+"""
+Undo / redo history for the TextEditor in round1datology.py
+
+Nothing here copies the document per edit. Every storage call the editor
+makes is logged as a small delta tuple
+
+    (INSERT, line, col, text)     undone by deleting len(text) chars
+    (DELETE, line, col, text)     undone by inserting text back
+    (SPLIT, line, col, None)      undone by joining line and line+1
+    (JOIN, line, col, None)       undone by splitting line at col
+
+and the deltas of one public editor call (type_in, backspace, apply_batch,
+...) make up one step. Consecutive typing on the same line folds into the
+previous step, so a word costs one step and not one per key.
+
+Every `checkpoint_every` steps the whole document is kept as one str. Going
+back or forward a long way bisects for the nearest checkpoint and replays at
+most `checkpoint_every` steps from there instead of walking every step in
+between. checkpoint_every=None takes no checkpoints, undo and redo always
+walk the steps; the editor does that for files opened through mmap, where a
+checkpoint would be a full copy of the file. When the log and checkpoints
+pass `max_bytes`, checkpoints go first, oldest first, since they only make
+long jumps faster, and only then the oldest steps. A checkpoint that can't
+fit under `max_bytes` next to the steps is not taken at all, so a document
+bigger than the cap just walks steps instead of wiping the undo history
+every `checkpoint_every` edits.
+"""
+from bisect import bisect_left, bisect_right
+from functools import wraps
+
+INSERT = 'i'
+DELETE = 'd'
+SPLIT = 's'
+JOIN = 'j'
+
+# rough cost of a delta tuple and its ints, on top of any text it carries
+DELTA_BYTES = 72
+# a folded typing step stops growing at this many characters
+TYPING_RUN = 80
+
+
+def _step_bytes(deltas) -> int:
+    return sum(DELTA_BYTES + (len(delta[3]) if delta[3] else 0) for delta in deltas)
+
+
+class History:
+    def __init__(self, checkpoint_every: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.checkpoint_every = checkpoint_every
+        self.max_bytes = max_bytes
+        # steps[i] is (cursor before, cursor after, deltas) and takes the
+        # document from version base+i to base+i+1
+        self.steps = []
+        self.base = 0
+        self.version = 0
+        # sorted by version, kept as two lists so versions can be bisected
+        self.checkpoint_versions = []
+        self.checkpoints = []
+        self.pending = []
+        # steps and checkpoints together, and the checkpoints' part of it
+        self.bytes = 0
+        self.checkpoint_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def record(self, delta) -> None:
+        self.pending.append(delta)
+
+    def commit(self, before, after, document) -> None:
+        # close the step for one editor call. document() builds the full text
+        # and is only called when a checkpoint is due
+        if not self.pending:
+            return
+        deltas = self.pending
+        self.pending = []
+        self._drop_redo()
+        if self._fold_typing(before, after, deltas):
+            return
+        self.steps.append((before, after, tuple(deltas)))
+        self.bytes += _step_bytes(deltas)
+        self.version += 1
+        if self.checkpoint_every and self.version % self.checkpoint_every == 0:
+            self.checkpoint(document(), after)
+        self._evict()
+
+    def _fold_typing(self, before, after, deltas) -> bool:
+        if len(deltas) != 1 or deltas[0][0] != INSERT or not self.steps:
+            return False
+        if self.checkpoint_versions and self.checkpoint_versions[-1] == self.version:
+            # the checkpoint describes the document after the last step
+            return False
+        last_before, last_after, last_deltas = self.steps[-1]
+        kind, line, col, text = last_deltas[-1]
+        _, new_line, new_col, new_text = deltas[0]
+        if (kind != INSERT or last_after != before or new_line != line
+                or new_col != col + len(text) or len(text) >= TYPING_RUN):
+            return False
+        self.steps[-1] = (last_before, after, last_deltas[:-1] + ((INSERT, line, col, text + new_text),))
+        self.bytes += len(new_text)
+        return True
+
+    def _drop_redo(self) -> None:
+        # a new edit after some undos forgets the undone steps
+        keep = self.version - self.base
+        if keep == len(self.steps):
+            return
+        self.bytes -= sum(_step_bytes(step[2]) for step in self.steps[keep:])
+        del self.steps[keep:]
+        self._drop_checkpoints(bisect_right(self.checkpoint_versions, self.version), len(self.checkpoints))
+
+    def checkpoint(self, text: str, cursor) -> None:
+        if self.checkpoint_versions and self.checkpoint_versions[-1] == self.version:
+            return
+        if self.bytes - self.checkpoint_bytes + len(text) > self.max_bytes:
+            # would cost undo steps to keep, not worth it
+            return
+        self.checkpoint_versions.append(self.version)
+        self.checkpoints.append((text, tuple(cursor)))
+        self.bytes += len(text)
+        self.checkpoint_bytes += len(text)
+
+    def _drop_checkpoints(self, start: int, stop: int) -> None:
+        freed = sum(len(text) for text, _ in self.checkpoints[start:stop])
+        self.bytes -= freed
+        self.checkpoint_bytes -= freed
+        del self.checkpoint_versions[start:stop]
+        del self.checkpoints[start:stop]
+
+    def _evict(self) -> None:
+        if self.bytes <= self.max_bytes:
+            return
+        # free a tenth more than needed so this does not run on every commit
+        target = self.max_bytes * 0.9
+        # checkpoints first, oldest first, they only make long jumps faster
+        drop = 0
+        freed = 0
+        while drop < len(self.checkpoints) and self.bytes - freed > target:
+            freed += len(self.checkpoints[drop][0])
+            drop += 1
+        self._drop_checkpoints(0, drop)
+        drop = 0
+        freed = 0
+        limit = self.version - self.base
+        while drop < limit and self.bytes - freed > target:
+            freed += _step_bytes(self.steps[drop][2])
+            drop += 1
+        del self.steps[:drop]
+        self.base += drop
+        self.bytes -= freed
+        # checkpoints older than the oldest step can never be reached again
+        self._drop_checkpoints(0, bisect_left(self.checkpoint_versions, self.base))
+
+    def step(self, version: int):
+        # the step that goes from version to version+1
+        return self.steps[version - self.base]
+
+    def nearest_checkpoint(self, version: int):
+        # closest checkpoint at or before version that steps can still
+        # replay forward from, or None
+        idx = bisect_right(self.checkpoint_versions, version) - 1
+        if idx < 0 or self.checkpoint_versions[idx] < self.base:
+            return None
+        text, cursor = self.checkpoints[idx]
+        return self.checkpoint_versions[idx], text, cursor
+
+
+def undoable(method):
+    # wraps a public TextEditor edit so everything it does to the storage is
+    # one undo step, calls nested inside it (apply_batch -> type_in) do not
+    # open steps of their own
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.history is None:
+            return method(self, *args, **kwargs)
+        self._depth += 1
+        before = tuple(self.cursor)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.history.commit(before, tuple(self.cursor), self._document)
+    return wrapper
@@ -0,0 +1,195 @@
+"""
+Memory-mapped file storage for the TextEditor in round1datology.py
+
+MappedStorage speaks the same line/col interface as the backends in
+editor_storage.py but never reads the whole file. The file is mmap'd and
+the document is a short list of segments:
+
+    [first, stop]   original lines first..stop-1, still only bytes in the
+                    mmap (stop is None for "to the end of the file")
+    GapBuffer       a line that has been edited
+
+Line start offsets are found lazily, only as far into the file as something
+has asked for. A line becomes a GapBuffer the first time it is edited.
+save() streams the untouched spans straight out of the mmap and only
+encodes the edited lines.
+"""
+import mmap
+import os
+import sys
+from array import array
+
+from editor_storage import GapBuffer, _walk_offset
+
+CHUNK = 16 * 1024 * 1024
+
+
+class MappedStorage:
+    def __init__(self, path, encoding: str = 'utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self._map()
+
+    def _map(self) -> None:
+        self.file = open(self.path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        # an empty file cannot be mmap'd, plain bytes behave the same here
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.size = size
+        # starts[k] is the byte offset of original line k, filled in lazily
+        self.starts = array('q', [0])
+        self.indexed = size == 0
+        self.original_lines = None
+        self.segments = [[0, None]]
+        self.added_lines = 0
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    # original file lines
+
+    def _start(self, k: int) -> int:
+        # byte offset of original line k, indexing forward as far as needed
+        starts = self.starts
+        while len(starts) <= k and not self.indexed:
+            idx = self.data.find(b'\n', starts[-1])
+            if idx == -1:
+                self.indexed = True
+            else:
+                starts.append(idx + 1)
+        if k < len(starts):
+            return starts[k]
+        raise IndexError(k)
+
+    def _end(self, k: int) -> int:
+        # byte offset just past original line k, not counting its '\n'
+        try:
+            return self._start(k + 1) - 1
+        except IndexError:
+            return self.size
+
+    def _total_original(self) -> int:
+        if self.original_lines is None:
+            # count line breaks a chunk at a time instead of indexing them all
+            count = 1
+            for pos in range(0, self.size, CHUNK):
+                count += self.data[pos:pos + CHUNK].count(b'\n')
+            self.original_lines = count
+        return self.original_lines
+
+    def _original_text(self, k: int) -> str:
+        return self.data[self._start(k):self._end(k)].decode(self.encoding)
+
+    # segments
+
+    def _locate(self, line: int):
+        # (segment index, original line number or None for an edited line)
+        seen = 0
+        for i, segment in enumerate(self.segments):
+            if isinstance(segment, GapBuffer):
+                if seen == line:
+                    return i, None
+                seen += 1
+                continue
+            first, stop = segment
+            if stop is None or line < seen + stop - first:
+                return i, first + line - seen
+            seen += stop - first
+        raise IndexError(line)
+
+    def _buffer(self, line: int) -> GapBuffer:
+        # the editable buffer for a line, carving it out of its span if needed
+        i, k = self._locate(line)
+        if k is None:
+            return self.segments[i]
+        first, stop = self.segments[i]
+        if stop is None:
+            stop = self._total_original()
+        buffer = GapBuffer(self._original_text(k))
+        pieces = []
+        if k > first:
+            pieces.append([first, k])
+        pieces.append(buffer)
+        if k + 1 < stop:
+            pieces.append([k + 1, stop])
+        self.segments[i:i + 1] = pieces
+        return buffer
+
+    # storage interface
+
+    def line_count(self) -> int:
+        return self._total_original() + self.added_lines
+
+    def line_length(self, line: int) -> int:
+        return len(self.line_text(line))
+
+    def line_text(self, line: int) -> str:
+        i, k = self._locate(line)
+        if k is None:
+            return str(self.segments[i])
+        return self._original_text(k)
+
+    def line_slice(self, line: int, col: int, count: int) -> str:
+        return self.line_text(line)[col:col + count]
+
+    def insert(self, line: int, col: int, text: str) -> None:
+        self._buffer(line).insert(col, text)
+
+    def delete(self, line: int, col: int, count: int) -> None:
+        self._buffer(line).delete(col, count)
+
+    def split(self, line: int, col: int) -> None:
+        buffer = self._buffer(line)
+        i = self.segments.index(buffer)
+        self.segments.insert(i + 1, buffer.split(col))
+        self.added_lines += 1
+
+    def join(self, line: int) -> None:
+        buffer = self._buffer(line)
+        following = self._buffer(line + 1)
+        buffer.extend(following)
+        self.segments.remove(following)
+        self.added_lines -= 1
+
+    def line_offset(self, line: int) -> int:
+        return sum(self.line_length(i) for i in range(line)) + line
+
+    def offset_position(self, offset: int):
+        return _walk_offset((self.line_text(i) for i in range(self.line_count())), offset)
+
+    def memory_usage(self) -> int:
+        # the mmap'd pages belong to the page cache, not to us
+        size = sys.getsizeof(self.segments) + sys.getsizeof(self.starts)
+        for segment in self.segments:
+            size += segment.memory_usage() if isinstance(segment, GapBuffer) else sys.getsizeof(segment)
+        return size
+
+    def save(self, path=None) -> None:
+        # write next to the target and swap it in, the mmap may be reading
+        # from the very file being replaced
+        path = path or self.path
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as out:
+            first = True
+            for segment in self.segments:
+                if isinstance(segment, GapBuffer):
+                    if not first:
+                        out.write(b'\n')
+                    out.write(str(segment).encode(self.encoding))
+                    first = False
+                    continue
+                start, stop = segment
+                if not first:
+                    out.write(b'\n')
+                begin = self._start(start)
+                end = self.size if stop is None else self._end(stop - 1)
+                for pos in range(begin, end, CHUNK):
+                    out.write(self.data[pos:min(pos + CHUNK, end)])
+                first = False
+        os.replace(tmp, path)
+        if os.path.abspath(path) == os.path.abspath(self.path):
+            # everything is on disk now, start over from the new file
+            self.close()
+            self._map()
@@ -0,0 +1,144 @@
+"""
+Multi-cursor editing for the TextEditor in round1datology.py
+
+TextEditor.cursor stays the primary cursor, add_cursor() puts extra ones in
+`extraCursors`. While there are extra cursors, type_in, backspace, newline
+and move_cursor act on all of them at once.
+
+Each edit sorts the cursors once, works out where every cursor lands from
+its rank in that order (how many cursors before it on the same line, how
+many lines were joined or split before it), and touches each line once: a
+single insert/delete when only one cursor is on it, otherwise one rewrite of
+the whole line.
+"""
+from bisect import bisect_left
+from itertools import groupby
+
+
+class MultiCursorMixin:
+    def add_cursor(self, line, col):
+        line = max(0, min(line, self.text.line_count() - 1))
+        col = max(0, min(col, self.text.line_length(line)))
+        # duplicates are fine here, every edit folds cursors that coincide
+        self.extraCursors.append([line, col])
+
+    def clear_cursors(self):
+        self.extraCursors = []
+
+    @property
+    def cursors(self):
+        return sorted({tuple(self.cursor), *map(tuple, self.extraCursors)})
+
+    def _set_cursors(self, positions, primary):
+        # positions is the sorted cursor list after an edit, primary is the
+        # index of the primary cursor in it. cursors that ran into each other
+        # collapse into one, being sorted they can only be next to each other
+        self.cursor = list(positions[primary])
+        extra = []
+        prev = None
+        for i, position in enumerate(positions):
+            if position != prev and position != positions[primary]:
+                extra.append(list(position))
+            prev = position
+        self.extraCursors = extra
+
+    def _rewrite(self, line, old, new):
+        if old:
+            self._delete(line, 0, len(old))
+        if new:
+            self._insert(line, 0, new)
+
+    def _multi_type_in(self, text):
+        positions = self.cursors
+        primary = positions.index(tuple(self.cursor))
+        width = len(text)
+        moved = []
+        i = 0
+        while i < len(positions):
+            line, col = positions[i]
+            j = i + 1
+            while j < len(positions) and positions[j][0] == line:
+                j += 1
+            if j == i + 1:
+                self._insert(line, col, text)
+                moved.append((line, col + width))
+            else:
+                cols = [col for _, col in positions[i:j]]
+                old = self.text.line_text(line)
+                pieces = []
+                prev = 0
+                for col in cols:
+                    pieces.append(old[prev:col])
+                    pieces.append(text)
+                    prev = col
+                pieces.append(old[prev:])
+                self._rewrite(line, old, ''.join(pieces))
+                # every cursor is pushed along by its own text and the text
+                # typed at each cursor before it on the line
+                moved.extend((line, col + (rank + 1) * width) for rank, col in enumerate(cols))
+            i = j
+        self._set_cursors(moved, primary)
+
+    def _multi_backspace(self):
+        positions = self.cursors
+        primary = positions.index(tuple(self.cursor))
+
+        # first the characters left of each cursor, one pass per line
+        moved = []
+        joins = []
+        for line, group in groupby(positions, key=lambda position: position[0]):
+            cols = [col for _, col in group]
+            deleting = [col for col in cols if col > 0]
+            if len(deleting) == 1:
+                self._delete(line, deleting[0] - 1, 1)
+            elif deleting:
+                old = self.text.line_text(line)
+                drop = set(col - 1 for col in deleting)
+                self._rewrite(line, old, ''.join(c for i, c in enumerate(old) if i not in drop))
+            for col in cols:
+                if col == 0 and line > 0:
+                    joins.append(line)
+                moved.append((line, col - bisect_left(deleting, col + 1)))
+
+        # then the cursors sitting at the start of a line pull it up onto the
+        # line above. a run of joined lines all lands on the first line before
+        # the run, each one shifted by the lines in front of it
+        joined = set(joins)
+        landing = {}
+        for line in joins:
+            if line - 1 in joined:
+                start, offset = landing[line - 1]
+                landing[line] = (start, offset + self.text.line_length(line - 1))
+            else:
+                landing[line] = (line - 1, self.text.line_length(line - 1))
+        for line in reversed(joins):
+            self._join(line - 1)
+
+        final = []
+        for line, col in moved:
+            if line in landing:
+                start, offset = landing[line]
+                final.append((start - bisect_left(joins, start), offset + col))
+            else:
+                final.append((line - bisect_left(joins, line), col))
+        self._set_cursors(final, primary)
+
+    def _multi_newline(self):
+        positions = self.cursors
+        primary = positions.index(tuple(self.cursor))
+        for line, col in reversed(positions):
+            self._split(line, col)
+        # each cursor ends up at the start of its own new line, pushed down by
+        # one line for every cursor before it
+        self._set_cursors([(line + rank + 1, 0) for rank, (line, _) in enumerate(positions)], primary)
+
+    def _multi_move(self, direction):
+        positions = self.cursors
+        primary = positions.index(tuple(self.cursor))
+        moved = []
+        for position in positions:
+            self.cursor = list(position)
+            self._move_one(direction)
+            moved.append(tuple(self.cursor))
+        final = sorted(set(moved))
+        self._set_cursors(final, final.index(moved[primary]))
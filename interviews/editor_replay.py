@@ -0,0 +1,70 @@
+"""
+Op streams for TextEditor.apply_batch
+
+A recorded session is either a sequence of (opcode, payload) pairs
+
+    ("type_in", "abc")        - payload is the text to type
+    ("backspace", 3)          - payload is a repeat count, None means 1
+    ("newline", None)         - same as backspace
+    ("move_cursor", "left")   - payload is the direction
+
+or a bytes keystroke log, the way a terminal would see it: text is typed as
+is, b"\\n" is a newline, b"\\x08" / b"\\x7f" is a backspace and the arrow keys
+are the escape sequences b"\\x1b[A" (up), b"\\x1b[B" (down), b"\\x1b[C" (right)
+and b"\\x1b[D" (left). Any other escape is a ValueError rather than being
+dropped from the session.
+
+coalesce() folds runs of the same op into one (opcode, payload, count) step so
+TextEditor only touches the storage once per run.
+"""
+import re
+from itertools import groupby
+
+KEYSTROKE = re.compile(r'[^\x08\x7f\n\x1b]+|\x1b\[[ABCD]|\x1b|[\x08\x7f]+|\n+')
+
+ARROWS = {
+    '\x1b[A': "up",
+    '\x1b[B': "down",
+    '\x1b[C': "right",
+    '\x1b[D': "left",
+}
+
+
+def decode_keystrokes(log):
+    if isinstance(log, (bytes, bytearray, memoryview)):
+        log = bytes(log).decode('utf-8')
+    for match in KEYSTROKE.finditer(log):
+        token = match.group()
+        first = token[0]
+        if first == '\n':
+            yield "newline", len(token)
+        elif first in '\x08\x7f':
+            yield "backspace", len(token)
+        elif first == '\x1b':
+            if token not in ARROWS:
+                raise ValueError(f"unknown escape sequence at {match.start()}: {log[match.start():match.start() + 4]!r}")
+            yield "move_cursor", ARROWS[token]
+        else:
+            yield "type_in", token
+
+
+def _run_key(op):
+    opcode, payload = op
+    # moves only fold together when they go the same way
+    if opcode == "move_cursor":
+        return opcode, payload
+    return opcode, None
+
+
+def coalesce(ops):
+    if isinstance(ops, (bytes, bytearray, memoryview, str)):
+        ops = decode_keystrokes(ops)
+    for (opcode, direction), run in groupby(ops, key=_run_key):
+        if opcode == "type_in":
+            yield opcode, ''.join(payload for _, payload in run), 1
+        elif opcode == "move_cursor":
+            yield opcode, direction, sum(1 for _ in run)
+        elif opcode in ("backspace", "newline"):
+            yield opcode, None, sum(1 if payload is None else payload for _, payload in run)
+        else:
+            raise ValueError(f"unknown opcode {opcode!r}")
@@ -0,0 +1,313 @@
+"""
+Find / replace for the TextEditor in round1datology.py
+
+SearchIndex is a trigram index over the lines: postings[gram] is the set of
+lines that contain that three character string. A pattern of three or more
+characters is only checked against the lines holding every one of its
+trigrams, instead of against every line in the document.
+
+Lines are known by an id that stays put while lines come and go above it,
+so a line break does not renumber the postings. _LineIds keeps the ids in
+line order in buckets of up to 2 * LOAD, with a Fenwick tree over the bucket
+sizes: line -> id and id -> line are O(log(lines / LOAD) + LOAD), and so are
+the insert and removal a line break or a join make. Nothing is renumbered
+after a split or join, a search after one costs the same as any other.
+Edits just mark their line dirty and it is reindexed on the next search, so
+typing costs nothing extra and a search after a few edits only reindexes
+those few lines.
+
+The index is built on the first search. Patterns shorter than three
+characters scan every line, patterns cannot span a line break.
+"""
+import sys
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from editor_history import undoable
+
+GRAM = 3
+LOAD = 256
+
+
+def _grams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class _Bucket:
+    __slots__ = ("ids", "position")
+
+    def __init__(self, ids, position):
+        self.ids = ids
+        self.position = position
+
+
+class _LineIds:
+    # line ids in line order, cut into buckets with a Fenwick tree over
+    # their sizes so a line number is a prefix sum away
+    def __init__(self, count):
+        self.buckets = [_Bucket(list(range(start, min(start + LOAD, count))), 0)
+                        for start in range(0, count, LOAD)] or [_Bucket([], 0)]
+        self.owner = {id: bucket for bucket in self.buckets for id in bucket.ids}
+        self._rebuild()
+
+    def __len__(self):
+        return len(self.owner)
+
+    def _rebuild(self):
+        # after buckets came or went, O(buckets)
+        tree = [0] * (len(self.buckets) + 1)
+        for position, bucket in enumerate(self.buckets):
+            bucket.position = position
+            i = position + 1
+            tree[i] += len(bucket.ids)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _add(self, position, change):
+        i = position + 1
+        while i < len(self.tree):
+            self.tree[i] += change
+            i += i & -i
+
+    def _before(self, position):
+        # lines in the buckets before this one
+        total = 0
+        i = position
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, line):
+        # (bucket, index in it) of a line number
+        position = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            if position + step < len(self.tree) and self.tree[position + step] <= line:
+                position += step
+                line -= self.tree[position]
+            step >>= 1
+        return self.buckets[position], line
+
+    def __iter__(self):
+        for bucket in self.buckets:
+            yield from bucket.ids
+
+    def __getitem__(self, line):
+        bucket, index = self._locate(line)
+        return bucket.ids[index]
+
+    def line(self, id):
+        bucket = self.owner[id]
+        return self._before(bucket.position) + bucket.ids.index(id)
+
+    def insert(self, line, id):
+        # id becomes line `line`, what was there moves down one
+        if line == len(self):
+            bucket = self.buckets[-1]
+            index = len(bucket.ids)
+        else:
+            bucket, index = self._locate(line)
+        bucket.ids.insert(index, id)
+        self.owner[id] = bucket
+        self._add(bucket.position, 1)
+        if len(bucket.ids) > 2 * LOAD:
+            half = _Bucket(bucket.ids[LOAD:], 0)
+            del bucket.ids[LOAD:]
+            for moved in half.ids:
+                self.owner[moved] = half
+            self.buckets.insert(bucket.position + 1, half)
+            self._rebuild()
+
+    def pop(self, line):
+        bucket, index = self._locate(line)
+        id = bucket.ids.pop(index)
+        del self.owner[id]
+        self._add(bucket.position, -1)
+        if not bucket.ids and len(self.buckets) > 1:
+            del self.buckets[bucket.position]
+            self._rebuild()
+        return id
+
+    def lines(self, ids):
+        # sorted line numbers of some ids
+        by_bucket = defaultdict(list)
+        for id in ids:
+            by_bucket[self.owner[id]].append(id)
+        lines = []
+        for bucket, members in by_bucket.items():
+            start = self._before(bucket.position)
+            if len(members) > 8:
+                index = {id: i for i, id in enumerate(bucket.ids)}
+                lines.extend(start + index[id] for id in members)
+            else:
+                lines.extend(start + bucket.ids.index(id) for id in members)
+        lines.sort()
+        return lines
+
+    def memory_usage(self):
+        return (sys.getsizeof(self.buckets) + sys.getsizeof(self.owner) + sys.getsizeof(self.tree)
+                + sum(sys.getsizeof(bucket) + sys.getsizeof(bucket.ids) for bucket in self.buckets))
+
+
+class SearchIndex:
+    def __init__(self, storage):
+        self.storage = storage
+        count = storage.line_count()
+        self.ids = _LineIds(count)
+        self.next_id = count
+        self.postings = defaultdict(set)
+        # the text each line id was indexed with, to take it out again later
+        self.indexed = {}
+        self.dirty = set(range(count))
+
+    # kept up to date by TextEditor._insert / _delete / _split / _join
+
+    def touched(self, line):
+        self.dirty.add(self.ids[line])
+
+    def split(self, line):
+        self.dirty.add(self.ids[line])
+        self.ids.insert(line + 1, self.next_id)
+        self.dirty.add(self.next_id)
+        self.next_id += 1
+
+    def join(self, line):
+        dropped = self.ids.pop(line + 1)
+        self._reindex(dropped, '')
+        del self.indexed[dropped]
+        self.dirty.discard(dropped)
+        self.dirty.add(self.ids[line])
+
+    def _reindex(self, id, text):
+        postings = self.postings
+        new = _grams(text)
+        old = self.indexed.get(id)
+        if old:
+            # only the trigrams that appeared or went away touch the postings
+            old = _grams(old)
+            for gram in old - new:
+                lines = postings[gram]
+                lines.discard(id)
+                if not lines:
+                    del postings[gram]
+            new -= old
+        for gram in new:
+            postings[gram].add(id)
+        self.indexed[id] = text
+
+    def _refresh(self):
+        text = self.storage.line_text
+        if len(self.dirty) == len(self.ids):
+            # the first build, every line in order
+            for line, id in enumerate(self.ids):
+                self._reindex(id, text(line))
+        else:
+            for id in self.dirty:
+                self._reindex(id, text(self.ids.line(id)))
+        self.dirty = set()
+
+    def lines(self, pattern):
+        # sorted line numbers that might contain pattern
+        if len(pattern) < GRAM:
+            return range(self.storage.line_count())
+        self._refresh()
+        postings = [self.postings.get(gram) for gram in _grams(pattern)]
+        if not all(postings):
+            return []
+        postings.sort(key=len)
+        return self.ids.lines(postings[0].intersection(*postings[1:]))
+
+    def memory_usage(self):
+        size = self.ids.memory_usage() + sys.getsizeof(self.postings) + sys.getsizeof(self.indexed)
+        size += sum(sys.getsizeof(lines) for lines in self.postings.values())
+        return size
+
+
+def _check(pattern):
+    if '\n' in pattern:
+        raise ValueError("search patterns cannot span a line break")
+    if not pattern:
+        raise ValueError("empty search pattern")
+
+
+class SearchMixin:
+    def _search_index(self):
+        if self._search is None:
+            self._search = SearchIndex(self.text)
+        return self._search
+
+    def find(self, pattern):
+        # move the cursor past the next match at or after it, wrapping round
+        # to the top, and return where the match starts. None if there is none
+        _check(pattern)
+        lines = self._search_index().lines(pattern)
+        if not lines:
+            return None
+        line, col = self.cursor
+        start = bisect_left(lines, line)
+        for k in range(len(lines) + 1):
+            candidate = lines[(start + k) % len(lines)]
+            text = self.text.line_text(candidate)
+            idx = text.find(pattern, col if k == 0 and candidate == line else 0)
+            if idx != -1:
+                self.cursor = [candidate, idx + len(pattern)]
+                return candidate, idx
+        return None
+
+    def find_all(self, pattern):
+        # (line, col) of every match, left to right and not overlapping, the
+        # same ones str.replace would replace
+        _check(pattern)
+        matches = []
+        for line in self._search_index().lines(pattern):
+            text = self.text.line_text(line)
+            idx = text.find(pattern)
+            while idx != -1:
+                matches.append((line, idx))
+                idx = text.find(pattern, idx + len(pattern))
+        return matches
+
+    @undoable
+    def replace_all(self, pattern, replacement):
+        # one undo step however many lines change, returns the match count
+        _check(pattern)
+        if '\n' in replacement:
+            raise ValueError("replacements cannot contain a line break")
+        matches = self.find_all(pattern)
+        if not matches:
+            return 0
+        width = len(pattern)
+        growth = len(replacement) - width
+        starts = {}
+        for line, col in matches:
+            starts.setdefault(line, []).append(col)
+        for line, cols in starts.items():
+            if len(cols) == 1:
+                col = cols[0]
+                self._delete(line, col, width)
+                if replacement:
+                    self._insert(line, col, replacement)
+            else:
+                old = self.text.line_text(line)
+                self._rewrite(line, old, old.replace(pattern, replacement))
+
+        # cursors behind a match move along with the text, one inside a match
+        # goes to the start of its replacement
+        positions = self.cursors
+        primary = positions.index(tuple(self.cursor))
+        moved = []
+        for line, col in positions:
+            cols = starts.get(line)
+            if cols:
+                before = bisect_right(cols, col - width)
+                inside = bisect_left(cols, col) - before
+                if inside:
+                    col = cols[before] + before * growth
+                else:
+                    col += before * growth
+            moved.append((line, col))
+        self._set_cursors(moved, primary)
+        return len(matches)
@@ -0,0 +1,698 @@
+"""
+Storage backends for the TextEditor in round1datology.py
+
+Every backend speaks in (line, col) positions and never sees a '\\n' inside
+`text` - line breaks only happen through split() / join(). That keeps the
+cursor logic in TextEditor the same no matter how the characters are stored.
+
+    line_count()                 - number of lines (always >= 1)
+    line_length(line)            - number of characters on a line
+    line_text(line)              - the line as a str
+    line_slice(line, col, count) - count characters of a line starting at col
+    insert(line, col, text)      - insert text before col
+    delete(line, col, count)     - delete count characters starting at col
+    split(line, col)             - break a line in two at col
+    join(line)                   - merge line+1 onto the end of line
+    line_offset(line)            - absolute offset of the start of a line
+    offset_position(offset)      - (line, col) of an absolute offset
+    memory_usage()               - rough bytes held by the storage
+
+Absolute offsets count every line break as one character, so they match the
+position in the document string without the cursor marker.
+
+line_text() is what rendering hits over and over, so every backend keeps the
+str of each line around until an edit touches that line.
+
+ListStorage   - the original list of lists of characters
+GapBufferStorage - one gap buffer per line, typing at the gap is O(1)
+PieceTableStorage - one piece table for the whole document
+RopeStorage   - gap buffer lines in a balanced tree, line insert/delete/join
+                and both kinds of lookup are O(log lines)
+CompactStorage - one bytearray per line, 1 byte per character for latin-1
+                text and 4 for anything wider, instead of an 8 byte list slot
+                per character
+"""
+import random
+import sys
+from bisect import bisect_left
+
+
+class ListStorage:
+    def __init__(self, text: str = ''):
+        self.lines = [list(line) for line in text.split('\n')]
+        # rendered[i] is the cached str of lines[i], None once it is edited
+        self.rendered = [None] * len(self.lines)
+
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    def line_length(self, line: int) -> int:
+        return len(self.lines[line])
+
+    def line_text(self, line: int) -> str:
+        text = self.rendered[line]
+        if text is None:
+            text = self.rendered[line] = ''.join(self.lines[line])
+        return text
+
+    def line_slice(self, line: int, col: int, count: int) -> str:
+        return ''.join(self.lines[line][col:col + count])
+
+    def insert(self, line: int, col: int, text: str) -> None:
+        self.lines[line][col:col] = text
+        self.rendered[line] = None
+
+    def delete(self, line: int, col: int, count: int) -> None:
+        del self.lines[line][col:col + count]
+        self.rendered[line] = None
+
+    def split(self, line: int, col: int) -> None:
+        new_line = self.lines[line][col:]
+        del self.lines[line][col:]
+        self.lines.insert(line + 1, new_line)
+        self.rendered[line] = None
+        self.rendered.insert(line + 1, None)
+
+    def join(self, line: int) -> None:
+        self.lines[line].extend(self.lines.pop(line + 1))
+        self.rendered[line] = None
+        del self.rendered[line + 1]
+
+    def line_offset(self, line: int) -> int:
+        return sum(len(chars) for chars in self.lines[:line]) + line
+
+    def offset_position(self, offset: int):
+        return _walk_offset(self.lines, offset)
+
+    def memory_usage(self) -> int:
+        return (sys.getsizeof(self.lines) + sum(map(sys.getsizeof, self.lines))
+                + sys.getsizeof(self.rendered) + _cached_bytes(self.rendered))
+
+
+def _cached_bytes(rendered) -> int:
+    return sum(sys.getsizeof(text) for text in rendered if text is not None)
+
+
+def _walk_offset(lines, offset: int):
+    # linear fallback for the backends that keep a plain python list of lines
+    for line, chars in enumerate(lines):
+        if offset <= len(chars):
+            return line, offset
+        offset -= len(chars) + 1
+    raise IndexError(offset)
+
+
+class GapBuffer:
+    # the gap sits between `left` and `right`, right is stored reversed so
+    # moving the gap or typing at it is just append/pop on the ends of lists
+    def __init__(self, text: str = ''):
+        self.left = list(text)
+        self.right = []
+        self.rendered = text or None
+
+    def __len__(self) -> int:
+        return len(self.left) + len(self.right)
+
+    def __str__(self) -> str:
+        if self.rendered is None:
+            self.rendered = ''.join(self.left) + ''.join(reversed(self.right))
+        return self.rendered
+
+    def slice(self, col: int, count: int) -> str:
+        # read without moving the gap, the right side is stored reversed
+        end = col + count
+        gap = len(self.left)
+        text = ''.join(self.left[col:end])
+        if end > gap:
+            size = len(self.right)
+            tail = self.right[size - (end - gap):size - max(col - gap, 0)]
+            tail.reverse()
+            text += ''.join(tail)
+        return text
+
+    def move_gap(self, col: int) -> None:
+        distance = col - len(self.left)
+        if distance > 0:
+            moved = self.right[-distance:]
+            moved.reverse()
+            self.left.extend(moved)
+            del self.right[-distance:]
+        elif distance < 0:
+            moved = self.left[distance:]
+            moved.reverse()
+            self.right.extend(moved)
+            del self.left[distance:]
+
+    def insert(self, col: int, text: str) -> None:
+        self.move_gap(col)
+        self.left.extend(text)
+        self.rendered = None
+
+    def delete(self, col: int, count: int) -> None:
+        # park the gap after the deleted range and drop from the left side
+        self.move_gap(col + count)
+        del self.left[col:]
+        self.rendered = None
+
+    def split(self, col: int) -> 'GapBuffer':
+        self.move_gap(col)
+        tail = GapBuffer()
+        tail.right = self.right
+        self.right = []
+        self.rendered = None
+        return tail
+
+    def extend(self, other: 'GapBuffer') -> None:
+        # leave the gap at the seam, which is where the cursor ends up after
+        # a backspace that merges two lines
+        self.move_gap(len(self))
+        self.right = other.right
+        other.left.reverse()
+        self.right.extend(other.left)
+        self.rendered = None
+
+
+    def memory_usage(self) -> int:
+        size = sys.getsizeof(self) + sys.getsizeof(self.left) + sys.getsizeof(self.right)
+        return size + (sys.getsizeof(self.rendered) if self.rendered is not None else 0)
+
+
+class GapBufferStorage:
+    def __init__(self, text: str = ''):
+        self.lines = [GapBuffer(line) for line in text.split('\n')]
+
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    def line_length(self, line: int) -> int:
+        return len(self.lines[line])
+
+    def line_text(self, line: int) -> str:
+        return str(self.lines[line])
+
+    def line_slice(self, line: int, col: int, count: int) -> str:
+        return self.lines[line].slice(col, count)
+
+    def insert(self, line: int, col: int, text: str) -> None:
+        self.lines[line].insert(col, text)
+
+    def delete(self, line: int, col: int, count: int) -> None:
+        self.lines[line].delete(col, count)
+
+    def split(self, line: int, col: int) -> None:
+        self.lines.insert(line + 1, self.lines[line].split(col))
+
+    def join(self, line: int) -> None:
+        self.lines[line].extend(self.lines.pop(line + 1))
+
+    def line_offset(self, line: int) -> int:
+        return sum(len(buffer) for buffer in self.lines[:line]) + line
+
+    def offset_position(self, offset: int):
+        return _walk_offset(self.lines, offset)
+
+    def memory_usage(self) -> int:
+        return sys.getsizeof(self.lines) + sum(line.memory_usage() for line in self.lines)
+
+
+LATIN_1 = 1
+UTF_32 = 4
+
+
+def _encode(text: str):
+    # (encoded bytes, bytes per character)
+    try:
+        return text.encode('latin-1'), LATIN_1
+    except UnicodeEncodeError:
+        return text.encode('utf-32-le'), UTF_32
+
+
+class CompactStorage:
+    # lines[i] is a bytearray and widths[i] says how it is encoded: latin-1
+    # (1 byte a character) until something wider lands on the line, then
+    # utf-32 (4 bytes, still fixed width so col * width is the byte offset).
+    # decoding latin-1 is a straight copy, so unlike the other backends this
+    # one does not keep rendered strs around and pays ~66 bytes per line on
+    # top of the characters themselves
+    def __init__(self, text: str = ''):
+        self.lines = []
+        widths = []
+        for line in text.split('\n'):
+            data, width = _encode(line)
+            self.lines.append(bytearray(data))
+            widths.append(width)
+        self.widths = bytearray(widths)
+
+    def _widen(self, line: int) -> None:
+        self.lines[line] = bytearray(self.lines[line].decode('latin-1').encode('utf-32-le'))
+        self.widths[line] = UTF_32
+
+    def _decode(self, line: int, data) -> str:
+        return data.decode('latin-1' if self.widths[line] == LATIN_1 else 'utf-32-le')
+
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    def line_length(self, line: int) -> int:
+        return len(self.lines[line]) // self.widths[line]
+
+    def line_text(self, line: int) -> str:
+        return self._decode(line, self.lines[line])
+
+    def line_slice(self, line: int, col: int, count: int) -> str:
+        width = self.widths[line]
+        return self._decode(line, self.lines[line][col * width:(col + count) * width])
+
+    def insert(self, line: int, col: int, text: str) -> None:
+        data, width = _encode(text)
+        if width > self.widths[line]:
+            self._widen(line)
+        elif width < self.widths[line]:
+            data = text.encode('utf-32-le')
+        width = self.widths[line]
+        self.lines[line][col * width:col * width] = data
+
+    def delete(self, line: int, col: int, count: int) -> None:
+        width = self.widths[line]
+        del self.lines[line][col * width:(col + count) * width]
+
+    def split(self, line: int, col: int) -> None:
+        width = self.widths[line]
+        data = self.lines[line]
+        self.lines.insert(line + 1, data[col * width:])
+        del data[col * width:]
+        self.widths.insert(line + 1, width)
+
+    def join(self, line: int) -> None:
+        if self.widths[line] != self.widths[line + 1]:
+            self._widen(line if self.widths[line] == LATIN_1 else line + 1)
+        self.lines[line] += self.lines.pop(line + 1)
+        del self.widths[line + 1]
+
+    def line_offset(self, line: int) -> int:
+        return sum(self.line_length(i) for i in range(line)) + line
+
+    def offset_position(self, offset: int):
+        for line in range(len(self.lines)):
+            length = self.line_length(line)
+            if offset <= length:
+                return line, offset
+            offset -= length + 1
+        raise IndexError(offset)
+
+    def memory_usage(self) -> int:
+        return (sys.getsizeof(self.lines) + sum(map(sys.getsizeof, self.lines))
+                + sys.getsizeof(self.widths))
+
+
+ORIGINAL = 0
+ADDED = 1
+
+
+def _find_all(text: str, char: str):
+    positions = []
+    idx = text.find(char)
+    while idx != -1:
+        positions.append(idx)
+        idx = text.find(char, idx + 1)
+    return positions
+
+
+class PieceTableStorage:
+    # pieces are [buffer, start, length, newlines] and point into either the
+    # original text or the append-only `added` buffer. both buffers only ever
+    # grow, so the positions of their line breaks can be kept sorted once and
+    # bisected instead of scanning piece text
+    def __init__(self, text: str = ''):
+        self.original = text
+        self.added = []
+        self.breaks = (_find_all(text, '\n'), [])
+        self.pieces = []
+        self.newlines = text.count('\n')
+        if text:
+            self.pieces.append([ORIGINAL, 0, len(text), self.newlines])
+        # line number -> str, only holds lines nothing has touched since
+        self.rendered = {}
+
+    def _forget_from(self, line: int) -> None:
+        # line breaks shift every line after them, drop those cached strs
+        for cached in [cached for cached in self.rendered if cached >= line]:
+            del self.rendered[cached]
+
+    def _slice(self, buffer: int, start: int, end: int) -> str:
+        if buffer == ORIGINAL:
+            return self.original[start:end]
+        return ''.join(self.added[start:end])
+
+    def _append(self, text: str) -> None:
+        base = len(self.added)
+        self.breaks[ADDED].extend(base + idx for idx in _find_all(text, '\n'))
+        self.added.extend(text)
+
+    def _count_newlines(self, buffer: int, start: int, length: int) -> int:
+        breaks = self.breaks[buffer]
+        return bisect_left(breaks, start + length) - bisect_left(breaks, start)
+
+    def _line_start(self, line: int) -> int:
+        # offset of the first character of `line` in the whole document
+        if line == 0:
+            return 0
+        offset = 0
+        seen = 0
+        for buffer, start, length, newlines in self.pieces:
+            if seen + newlines >= line:
+                breaks = self.breaks[buffer]
+                idx = breaks[bisect_left(breaks, start) + line - seen - 1]
+                return offset + idx - start + 1
+            seen += newlines
+            offset += length
+        raise IndexError(line)
+
+    def _line_end(self, line: int, start: int) -> int:
+        # offset of the '\n' that ends `line` (or the document length)
+        offset = 0
+        for buffer, piece_start, length, newlines in self.pieces:
+            end = offset + length
+            if end > start and newlines:
+                breaks = self.breaks[buffer]
+                i = bisect_left(breaks, piece_start + max(start - offset, 0))
+                if i < len(breaks) and breaks[i] < piece_start + length:
+                    return offset + breaks[i] - piece_start
+            offset = end
+        return offset
+
+    def _split_piece(self, offset: int) -> int:
+        # make sure a piece boundary sits at offset, return the index of the
+        # piece that starts there
+        pos = 0
+        for i, piece in enumerate(self.pieces):
+            if pos == offset:
+                return i
+            length = piece[2]
+            if offset < pos + length:
+                buffer, start = piece[0], piece[1]
+                head = offset - pos
+                head_nl = self._count_newlines(buffer, start, head)
+                self.pieces[i] = [buffer, start, head, head_nl]
+                self.pieces.insert(i + 1, [buffer, start + head, length - head, piece[3] - head_nl])
+                return i + 1
+            pos += length
+        return len(self.pieces)
+
+    def _insert_at(self, offset: int, text: str) -> None:
+        newlines = text.count('\n')
+        self.newlines += newlines
+        i = self._split_piece(offset)
+        # keep typing a run: grow the previous piece if it ends at the tail of `added`
+        if i > 0:
+            prev = self.pieces[i - 1]
+            if prev[0] == ADDED and prev[1] + prev[2] == len(self.added):
+                self._append(text)
+                prev[2] += len(text)
+                prev[3] += newlines
+                return
+        self.pieces.insert(i, [ADDED, len(self.added), len(text), newlines])
+        self._append(text)
+
+    def _delete_at(self, offset: int, count: int) -> None:
+        first = self._split_piece(offset)
+        last = self._split_piece(offset + count)
+        self.newlines -= sum(piece[3] for piece in self.pieces[first:last])
+        del self.pieces[first:last]
+
+    def line_count(self) -> int:
+        return self.newlines + 1
+
+    def line_length(self, line: int) -> int:
+        start = self._line_start(line)
+        return self._line_end(line, start) - start
+
+    def line_text(self, line: int) -> str:
+        if line in self.rendered:
+            return self.rendered[line]
+        start = self._line_start(line)
+        end = self._line_end(line, start)
+        parts = []
+        offset = 0
+        for buffer, piece_start, length, _ in self.pieces:
+            piece_end = offset + length
+            if piece_end > start and offset < end:
+                parts.append(self._slice(buffer, piece_start + max(start - offset, 0),
+                                         piece_start + min(end, piece_end) - offset))
+            if piece_end >= end:
+                break
+            offset = piece_end
+        text = self.rendered[line] = ''.join(parts)
+        return text
+
+    def line_slice(self, line: int, col: int, count: int) -> str:
+        start = self._line_start(line) + col
+        parts = []
+        offset = 0
+        for buffer, piece_start, length, _ in self.pieces:
+            piece_end = offset + length
+            if piece_end > start:
+                parts.append(self._slice(buffer, piece_start + max(start - offset, 0),
+                                         piece_start + min(start + count, piece_end) - offset))
+            if piece_end >= start + count:
+                break
+            offset = piece_end
+        return ''.join(parts)
+
+    def insert(self, line: int, col: int, text: str) -> None:
+        self._insert_at(self._line_start(line) + col, text)
+        self.rendered.pop(line, None)
+
+    def delete(self, line: int, col: int, count: int) -> None:
+        self._delete_at(self._line_start(line) + col, count)
+        self.rendered.pop(line, None)
+
+    def split(self, line: int, col: int) -> None:
+        self._insert_at(self._line_start(line) + col, '\n')
+        self._forget_from(line)
+
+    def join(self, line: int) -> None:
+        start = self._line_start(line)
+        self._delete_at(self._line_end(line, start), 1)
+        self._forget_from(line)
+
+    def line_offset(self, line: int) -> int:
+        return self._line_start(line)
+
+    def offset_position(self, offset: int):
+        line = 0
+        pos = 0
+        for piece in self.pieces:
+            if offset < pos + piece[2]:
+                line += self._count_newlines(piece[0], piece[1], offset - pos)
+                break
+            line += piece[3]
+            pos += piece[2]
+        else:
+            if offset > pos:
+                raise IndexError(offset)
+        return line, offset - self._line_start(line)
+
+    def memory_usage(self) -> int:
+        added, breaks = self.added, self.breaks
+        return (sys.getsizeof(self.original) + sys.getsizeof(added)
+                + sys.getsizeof(breaks[ORIGINAL]) + sys.getsizeof(breaks[ADDED])
+                # ints below 257 are shared, line break offsets mostly are not
+                + 28 * (len(breaks[ORIGINAL]) + len(breaks[ADDED]))
+                + sys.getsizeof(self.pieces) + sum(map(sys.getsizeof, self.pieces))
+                + sys.getsizeof(self.rendered) + _cached_bytes(self.rendered.values()))
+
+
+class _RopeNode:
+    __slots__ = ('line', 'priority', 'left', 'right', 'count', 'chars')
+
+    def __init__(self, line: GapBuffer):
+        self.line = line
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.count = 1
+        self.chars = len(line)
+
+
+def _count(node) -> int:
+    return node.count if node else 0
+
+
+def _chars(node) -> int:
+    return node.chars if node else 0
+
+
+def _pull(node: _RopeNode) -> _RopeNode:
+    node.count = 1 + _count(node.left) + _count(node.right)
+    node.chars = len(node.line) + _chars(node.left) + _chars(node.right)
+    return node
+
+
+def _split(node, k: int):
+    # first k lines go left, the rest go right
+    if node is None:
+        return None, None
+    if _count(node.left) >= k:
+        left, node.left = _split(node.left, k)
+        return left, _pull(node)
+    node.right, right = _split(node.right, k - _count(node.left) - 1)
+    return _pull(node), right
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _pull(left)
+    right.left = _merge(left, right.left)
+    return _pull(right)
+
+
+class RopeStorage:
+    # an implicit treap keyed by line number; every node knows how many lines
+    # and characters live under it, which is all the line/offset lookups need
+    def __init__(self, text: str = ''):
+        self.root = self._build([GapBuffer(line) for line in text.split('\n')])
+
+    @staticmethod
+    def _build(lines):
+        # linear time cartesian tree build, the right spine lives on a stack
+        spine = []
+        for line in lines:
+            node = _RopeNode(line)
+            last = None
+            while spine and spine[-1].priority < node.priority:
+                last = _pull(spine.pop())
+            node.left = last
+            if spine:
+                spine[-1].right = node
+            spine.append(node)
+        while len(spine) > 1:
+            _pull(spine.pop())
+        return _pull(spine[0])
+
+    def _node(self, line: int) -> _RopeNode:
+        node = self.root
+        while node:
+            left = _count(node.left)
+            if line < left:
+                node = node.left
+            elif line == left:
+                return node
+            else:
+                line -= left + 1
+                node = node.right
+        raise IndexError(line)
+
+    def _resize(self, line: int, delta: int) -> _RopeNode:
+        # a line changed length by delta, fix the character totals on its path
+        node = self.root
+        while node:
+            node.chars += delta
+            left = _count(node.left)
+            if line < left:
+                node = node.left
+            elif line == left:
+                return node
+            else:
+                line -= left + 1
+                node = node.right
+        raise IndexError(line)
+
+    def line_count(self) -> int:
+        return self.root.count
+
+    def line_length(self, line: int) -> int:
+        return len(self._node(line).line)
+
+    def line_text(self, line: int) -> str:
+        return str(self._node(line).line)
+
+    def line_slice(self, line: int, col: int, count: int) -> str:
+        return self._node(line).line.slice(col, count)
+
+    def insert(self, line: int, col: int, text: str) -> None:
+        self._resize(line, len(text)).line.insert(col, text)
+
+    def delete(self, line: int, col: int, count: int) -> None:
+        self._resize(line, -count).line.delete(col, count)
+
+    def split(self, line: int, col: int) -> None:
+        node = self._node(line)
+        tail = node.line.split(col)
+        self._resize(line, -len(tail))
+        left, right = _split(self.root, line + 1)
+        self.root = _merge(_merge(left, _RopeNode(tail)), right)
+
+    def join(self, line: int) -> None:
+        left, rest = _split(self.root, line + 1)
+        removed, right = _split(rest, 1)
+        self.root = _merge(left, right)
+        self._resize(line, len(removed.line)).line.extend(removed.line)
+
+    def line_offset(self, line: int) -> int:
+        offset = 0
+        node = self.root
+        while node:
+            left = _count(node.left)
+            if line < left:
+                node = node.left
+                continue
+            offset += _chars(node.left) + left
+            if line == left:
+                return offset
+            offset += len(node.line) + 1
+            line -= left + 1
+            node = node.right
+        raise IndexError(line)
+
+    def offset_position(self, offset: int):
+        line = 0
+        node = self.root
+        while node:
+            # every line in the left subtree also owns one line break
+            left_size = _chars(node.left) + _count(node.left)
+            if offset < left_size:
+                node = node.left
+                continue
+            offset -= left_size
+            line += _count(node.left)
+            if offset <= len(node.line):
+                return line, offset
+            offset -= len(node.line) + 1
+            line += 1
+            node = node.right
+        raise IndexError(offset)
+
+    def memory_usage(self) -> int:
+        size = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            size += sys.getsizeof(node) + node.line.memory_usage()
+            stack.append(node.left)
+            stack.append(node.right)
+        return size
+
+
+STORAGES = {
+    "list": ListStorage,
+    "gap": GapBufferStorage,
+    "piece": PieceTableStorage,
+    "rope": RopeStorage,
+    "compact": CompactStorage,
+}
+
+
+def make_storage(storage):
+    if isinstance(storage, str):
+        if storage not in STORAGES:
+            raise ValueError(f"unknown storage {storage!r}, pick one of {sorted(STORAGES)}")
+        return STORAGES[storage]()
+    return storage
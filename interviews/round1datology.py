@@ -1,34 +1,222 @@
 
-class TextEditor:
-    def __init__(self):
-        self.text = [[]]
+from editor_history import DELETE, INSERT, JOIN, SPLIT, History, undoable
+from editor_mmap import MappedStorage
+from editor_multicursor import MultiCursorMixin
+from editor_replay import coalesce
+from editor_search import SearchMixin
+from editor_storage import make_storage
+
+
+class TextEditor(MultiCursorMixin, SearchMixin):
+    def __init__(self, storage="list", history=None):
+        # storage is "list" (the original list of lists), "gap", "piece",
+        # "rope" or "compact", see editor_storage.py
+        self.text = make_storage(storage)
         self.cursor = [0,0]
-
+        # more cursors for multi-cursor editing, see editor_multicursor.py
+        self.extraCursors = []
+        # (cursor line, text above it, text below it) for __str__, typing on
+        # the cursor line leaves both blocks as they are
+        self._blocks = None
+        # trigram index for find / replace_all, built on the first search,
+        # see editor_search.py
+        self._search = None
+        # pass history=True (or a History to pick the checkpoint interval
+        # and memory cap) to get undo/redo, see editor_history.py
+        if history is True:
+            history = History()
+        elif history is False:
+            history = None
+        self.history = history
+        self._depth = 0
+        self._replaying = False
+        if history is not None:
+            if isinstance(self.text, MappedStorage):
+                # a checkpoint is the whole document as one str, the copy of
+                # the file open() is there to avoid. undo walks the steps
+                history.checkpoint_every = None
+            else:
+                history.checkpoint(self._document(), self.cursor)
+
+    @classmethod
+    def open(cls, path, history=None):
+        # mmap the file, lines are only read when shown and only copied into
+        # an editable buffer when edited, see editor_mmap.py. with history
+        # there are no checkpoints, undo and redo replay one step at a time
+        return cls(MappedStorage(path), history=history)
+
+    def save(self, path=None):
+        if isinstance(self.text, MappedStorage):
+            self.text.save(path)
+            return
+        if path is None:
+            raise ValueError("this editor was not opened from a file, pass a path")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self._document())
+
+    def close(self):
+        if isinstance(self.text, MappedStorage):
+            self.text.close()
+
+    # every edit goes through these four so caches and history can follow along
+
+    def _insert(self, line, col, text):
+        self.text.insert(line, col, text)
+        self._touched(line)
+        if self.history is not None and not self._replaying:
+            self.history.record((INSERT, line, col, text))
+
+    def _delete(self, line, col, count):
+        if self.history is not None and not self._replaying:
+            self.history.record((DELETE, line, col, self.text.line_slice(line, col, count)))
+        self.text.delete(line, col, count)
+        self._touched(line)
+
+    def _split(self, line, col):
+        self.text.split(line, col)
+        self._blocks = None
+        if self._search is not None:
+            self._search.split(line)
+        if self.history is not None and not self._replaying:
+            self.history.record((SPLIT, line, col, None))
+
+    def _join(self, line):
+        if self.history is not None and not self._replaying:
+            self.history.record((JOIN, line, self.text.line_length(line), None))
+        self.text.join(line)
+        self._blocks = None
+        if self._search is not None:
+            self._search.join(line)
+
+    def _touched(self, line):
+        if self._blocks is not None and self._blocks[0] != line:
+            self._blocks = None
+        if self._search is not None:
+            self._search.touched(line)
+
+    def _document(self):
+        return "\n".join(self.text.line_text(i) for i in range(self.text.line_count()))
+
+    def _apply(self, deltas, undo):
+        self._replaying = True
+        try:
+            if undo:
+                for kind, line, col, text in reversed(deltas):
+                    if kind == INSERT:
+                        self._delete(line, col, len(text))
+                    elif kind == DELETE:
+                        self._insert(line, col, text)
+                    elif kind == SPLIT:
+                        self._join(line)
+                    else:
+                        self._split(line, col)
+            else:
+                for kind, line, col, text in deltas:
+                    if kind == INSERT:
+                        self._insert(line, col, text)
+                    elif kind == DELETE:
+                        self._delete(line, col, len(text))
+                    elif kind == SPLIT:
+                        self._split(line, col)
+                    else:
+                        self._join(line)
+        finally:
+            self._replaying = False
+
+    @property
+    def version(self):
+        return self.history.version if self.history is not None else 0
+
+    def undo(self, count=1):
+        # returns how many steps were actually undone
+        history = self.history
+        if history is None:
+            return 0
+        count = min(count, history.version - history.base)
+        self.revert_to(history.version - count)
+        return count
+
+    def redo(self, count=1):
+        history = self.history
+        if history is None:
+            return 0
+        count = min(count, history.base + len(history.steps) - history.version)
+        self.revert_to(history.version + count)
+        return count
+
+    def revert_to(self, version):
+        # move to any version still in the history, either by walking the
+        # steps in between or by restoring the nearest checkpoint and
+        # replaying forward from it, whichever touches fewer steps
+        history = self.history
+        if history is None or not history.base <= version <= history.base + len(history.steps):
+            raise IndexError(f"version {version} is not in the history")
+        checkpoint = history.nearest_checkpoint(version)
+        if checkpoint is not None and version - checkpoint[0] < abs(history.version - version):
+            checkpointVersion, text, cursor = checkpoint
+            self.text = type(self.text)(text)
+            self._blocks = None
+            # the search index is rebuilt on the next find
+            self._search = None
+            self.cursor = list(cursor)
+            history.version = checkpointVersion
+        # only the primary cursor is part of the history
+        self.extraCursors = []
+        while history.version > version:
+            before, _, deltas = history.step(history.version - 1)
+            self._apply(deltas, undo=True)
+            self.cursor = list(before)
+            history.version -= 1
+        while history.version < version:
+            _, after, deltas = history.step(history.version)
+            self._apply(deltas, undo=False)
+            self.cursor = list(after)
+            history.version += 1
+
+    @undoable
     def type_in(self, char):
+        if '\n' in char:
+            # the storage never sees a line break, each one is a newline()
+            for i, piece in enumerate(char.split('\n')):
+                if i:
+                    self.newline()
+                if piece:
+                    self.type_in(piece)
+            return
+        if self.extraCursors:
+            return self._multi_type_in(char)
         line, col = self.cursor
-        self.text[line].insert(col, char)
-        self.cursor[1] += 1
+        self._insert(line, col, char)
+        self.cursor[1] += len(char)
     
+    @undoable
     def newline(self):
+        if self.extraCursors:
+            return self._multi_newline()
         line, col = self.cursor
-        new_line = self.text[line][col:]
-        self.text[line] = self.text[line][:col]
-        self.text.insert(line+1, new_line)
+        self._split(line, col)
         self.cursor = [line+1, 0]
 
+    @undoable
     def backspace(self):
+        if self.extraCursors:
+            return self._multi_backspace()
         line, col = self.cursor
         if col > 0:
             # decrement normally
-            self.text[line].pop(col - 1)
+            self._delete(line, col - 1, 1)
             self.cursor[1] -= 1
         elif line > 0:
-            lengthOfFirstLine = len(self.text[line-1])
-            self.text[line-1].extend(self.text[line])
-            self.text.pop(line)
+            lengthOfFirstLine = self.text.line_length(line-1)
+            self._join(line-1)
             self.cursor = [line -1, lengthOfFirstLine]
 
     def move_cursor(self, direction):
+        if self.extraCursors:
+            return self._multi_move(direction)
+        self._move_one(direction)
+
+    def _move_one(self, direction):
         line, col = self.cursor
         if direction == "left":
             if col > 0:
@@ -36,21 +224,158 @@ class TextEditor:
             elif line > 0:
                 self.cursor[0] -= 1
                 currLineIndex = self.cursor[0]
-                self.cursor[1] = len(self.text[currLineIndex])
+                self.cursor[1] = self.text.line_length(currLineIndex)
         elif direction == "right":
-            if col < len(self.text[line]):
+            if col < self.text.line_length(line):
                 self.cursor[1] += 1
-            elif line < len(self.text) - 1:
+            elif line < self.text.line_count() - 1:
                 self.cursor[0] += 1
                 self.cursor[1] = 0
         elif direction == "up" and line > 0:
             self.cursor[0] -= 1
             newlineindex = self.cursor[0]
-            self.cursor[1] = min(self.cursor[1], len(self.text[newlineindex]))
-        elif direction == "down" and line < len(self.text) - 1:
+            self.cursor[1] = min(self.cursor[1], self.text.line_length(newlineindex))
+        elif direction == "down" and line < self.text.line_count() - 1:
             self.cursor[0] += 1
             newlineindex = self.cursor[0]
-            self.cursor[1] = min(self.cursor[1], len(self.text[newlineindex]))
+            self.cursor[1] = min(self.cursor[1], self.text.line_length(newlineindex))
+
+    @undoable
+    def apply_batch(self, ops):
+        # replay a recorded session, see editor_replay.py for the formats.
+        # runs of the same op are folded so each run costs one storage call
+        for opcode, payload, count in coalesce(ops):
+            if self.extraCursors and opcode != "type_in":
+                # the run shortcuts below only know about one cursor
+                for _ in range(count):
+                    if opcode == "move_cursor":
+                        self.move_cursor(payload)
+                    else:
+                        getattr(self, opcode)()
+            elif opcode == "type_in":
+                self.type_in(payload)
+            elif opcode == "backspace":
+                self._backspace_run(count)
+            elif opcode == "newline":
+                for _ in range(count):
+                    self.newline()
+            elif payload in ("left", "right"):
+                self._move_run(payload, count)
+            elif payload in ("up", "down"):
+                self._move_vertical_run(payload, count)
+            # any other direction does nothing, like move_cursor
+
+    def _backspace_run(self, count):
+        line, col = self.cursor
+        while count > 0:
+            if col > 0:
+                # everything left of the cursor on this line goes in one splice
+                deleted = min(count, col)
+                col -= deleted
+                count -= deleted
+                self._delete(line, col, deleted)
+            elif line > 0:
+                col = self.text.line_length(line-1)
+                self._join(line-1)
+                line -= 1
+                count -= 1
+            else:
+                break
+        self.cursor = [line, col]
+
+    def _move_run(self, direction, count):
+        line, col = self.cursor
+        lastLine = self.text.line_count() - 1
+        while count > 0:
+            if direction == "left":
+                if col >= count:
+                    col -= count
+                    break
+                if line == 0:
+                    col = 0
+                    break
+                count -= col + 1
+                line -= 1
+                col = self.text.line_length(line)
+            else:
+                length = self.text.line_length(line)
+                if length - col >= count:
+                    col += count
+                    break
+                if line == lastLine:
+                    col = length
+                    break
+                count -= length - col + 1
+                line += 1
+                col = 0
+        self.cursor = [line, col]
+
+    def _move_vertical_run(self, direction, count):
+        line, col = self.cursor
+        step = -1 if direction == "up" else 1
+        lastLine = self.text.line_count() - 1
+        # the column never grows back, so it ends up clamped by the shortest
+        # line we pass through
+        for _ in range(count):
+            if not 0 <= line + step <= lastLine:
+                break
+            line += step
+            col = min(col, self.text.line_length(line))
+        self.cursor = [line, col]
+
+    def goto_line(self, line):
+        line = max(0, min(line, self.text.line_count() - 1))
+        self.cursor = [line, 0]
+
+    def goto_offset(self, offset):
+        # offsets count each line break as one character, like str(editor)
+        # without the cursor marker
+        self.cursor = list(self.text.offset_position(offset))
+
+    def offset(self):
+        line, col = self.cursor
+        return self.text.line_offset(line) + col
+
+    def render_range(self, start_line, end_line):
+        # lines [start_line, end_line) with a cursor marker for every cursor
+        # on them. the storage hands back cached strs for every line that has
+        # not been edited, so a viewport only pays for what it shows
+        start_line = max(start_line, 0)
+        end_line = min(end_line, self.text.line_count())
+        lines = [self.text.line_text(i) for i in range(start_line, end_line)]
+        cursors = self.cursors if self.extraCursors else [tuple(self.cursor)]
+        # right to left so earlier markers do not shift later ones
+        for line, col in reversed(cursors):
+            if start_line <= line < end_line:
+                text = lines[line - start_line]
+                lines[line - start_line] = text[:col] + "|" + text[col:]
+        return "\n".join(lines)
+
+    def memory_usage(self):
+        lastLine = self.text.line_count() - 1
+        chars = self.text.line_offset(lastLine) + self.text.line_length(lastLine)
+        storageBytes = self.text.memory_usage()
+        return {
+            "storage": type(self.text).__name__,
+            "chars": chars,
+            "bytes": storageBytes,
+            "bytes_per_char": storageBytes / chars if chars else 0.0,
+            "history_bytes": self.history.bytes if self.history is not None else 0,
+        }
+
+    def __str__(self):
+        if self.extraCursors:
+            return self.render_range(0, self.text.line_count())
+        line, col = self.cursor
+        if self._blocks is None or self._blocks[0] != line:
+            above = self.render_range(0, line) + "\n" if line > 0 else ""
+            below = ""
+            if line < self.text.line_count() - 1:
+                below = "\n" + self.render_range(line + 1, self.text.line_count())
+            self._blocks = (line, above, below)
+        _, above, below = self._blocks
+        text = self.text.line_text(line)
+        return above + text[:col] + "|" + text[col:] + below
 
 
     
@@ -86,34 +411,223 @@ class TextEditor:
 
 
 
-editor = TextEditor()
-print(str(editor))
-assert str(editor) == "|"
-editor.type_in("a")
-print('curr editor', str(editor))
-assert str(editor) == "a|"
-
-editor.type_in("b")
-assert str(editor) == "ab|"
-
-editor.move_cursor("left")
-assert str(editor) == "a|b"
-
-
-
-editor.backspace()
-
-assert str(editor) == "|b"
-
-
-editor.backspace()
-assert str(editor) == "|b"
-
-editor.move_cursor("right")
-assert str(editor) == "b|"
-
-editor.backspace()
-assert str(editor) == "|"
+if __name__ == "__main__":
+    for storage in ("list", "gap", "piece", "rope", "compact"):
+        editor = TextEditor(storage)
+        print(str(editor))
+        assert str(editor) == "|"
+        editor.type_in("a")
+        print('curr editor', str(editor))
+        assert str(editor) == "a|"
+
+        editor.type_in("b")
+        assert str(editor) == "ab|"
+
+        editor.move_cursor("left")
+        assert str(editor) == "a|b"
+
+
+
+        editor.backspace()
+
+        assert str(editor) == "|b"
+
+
+        editor.backspace()
+        assert str(editor) == "|b"
+
+        editor.move_cursor("right")
+        assert str(editor) == "b|"
+
+        editor.backspace()
+        assert str(editor) == "|"
+
+        # part 3 - multiple lines
+        editor.type_in("abc")
+        editor.move_cursor("left")
+        editor.newline()
+        assert str(editor) == "ab\n|c"
+
+        editor.move_cursor("up")
+        assert str(editor) == "|ab\nc"
+
+        editor.move_cursor("down")
+        editor.move_cursor("right")
+        assert str(editor) == "ab\nc|"
+
+        editor.move_cursor("left")
+        editor.backspace()
+        assert str(editor) == "ab|c"
+
+        editor.newline()
+        editor.goto_offset(1)
+        assert str(editor) == "a|b\nc"
+        editor.goto_line(1)
+        assert str(editor) == "ab\n|c"
+        assert editor.offset() == 3
+
+        # replaying a keystroke log in one batch matches typing it out
+        log = b"hello\nworld\x1b[D\x1b[D\x08\x08\x1b[A\x1b[Cxy\n\x7f"
+        batched = TextEditor(storage)
+        batched.apply_batch(log)
+        editor = TextEditor(storage)
+        for opcode, payload in [("type_in", c) for c in "hello"] + [
+            ("newline", None), *[("type_in", c) for c in "world"],
+            ("move_cursor", "left"), ("move_cursor", "left"),
+            ("backspace", None), ("backspace", None),
+            ("move_cursor", "up"), ("move_cursor", "right"),
+            ("type_in", "x"), ("type_in", "y"), ("newline", None), ("backspace", None),
+        ]:
+            if payload is None:
+                getattr(editor, opcode)()
+            else:
+                getattr(editor, opcode)(payload)
+        assert str(batched) == str(editor) == "hexy|llo\nwld"
+        assert editor.render_range(1, 2) == "wld"
+        assert editor.render_range(0, 1) == "hexy|llo"
+        # a direction move_cursor doesn't know does nothing in a batch too,
+        # and an escape that isn't an arrow key isn't dropped from a log
+        editor.move_cursor("sideways")
+        batched.apply_batch([("move_cursor", "sideways")] * 2)
+        assert str(batched) == str(editor) == "hexy|llo\nwld"
+        try:
+            batched.apply_batch(b"ab\x1bc")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a stray escape should not be skipped")
+
+        # a line break typed in splits the line on every backend
+        editor = TextEditor(storage)
+        editor.type_in("a\nb\n")
+        assert editor.text.line_count() == 3 and str(editor) == "a\nb\n|"
+
+        # undo / redo, typing on one line folds into a single step
+        editor = TextEditor(storage, history=History(checkpoint_every=2))
+        for c in "ab":
+            editor.type_in(c)
+        editor.newline()
+        editor.type_in("c")
+        editor.move_cursor("left")
+        editor.backspace()
+        assert str(editor) == "ab|c"
+        editor.undo()
+        assert str(editor) == "ab\n|c"
+        editor.undo(2)
+        assert str(editor) == "ab|"
+        editor.redo()
+        assert str(editor) == "ab\n|"
+        editor.revert_to(0)
+        assert str(editor) == "|"
+        editor.revert_to(editor.version + 4)
+        assert str(editor) == "ab|c"
+
+        # a document over max_bytes skips its checkpoints rather than wiping
+        # the undo steps to make room for them
+        editor = TextEditor(storage, history=History(checkpoint_every=10, max_bytes=10_000))
+        editor.apply_batch("x" * 20_000)
+        for _ in range(50):
+            editor.type_in("a")
+            editor.move_cursor("left")
+        assert len(editor.history) == 50 and not editor.history.checkpoints
+        assert editor.undo(50) == 50 and str(editor) == "x" * 20_000 + "|"
+
+        # multi-cursor, every cursor types and deletes at once
+        editor = TextEditor(storage)
+        editor.type_in("one")
+        editor.newline()
+        editor.type_in("two")
+        editor.add_cursor(0, 0)
+        editor.add_cursor(1, 0)
+        editor.type_in("- ")
+        assert str(editor) == "- |one\n- |two- |"
+        editor.backspace()
+        assert str(editor) == "-|one\n-|two-|"
+        editor.move_cursor("left")
+        editor.backspace()
+        assert str(editor) == "|-one|-tw|-"
+        editor.clear_cursors()
+        assert str(editor) == "-one-tw|-"
+
+        # find / replace
+        editor = TextEditor(storage, history=True)
+        editor.apply_batch("let x = 1\nlet y = x\nprint(x)")
+        editor.goto_line(0)
+        assert editor.find_all("x") == [(0, 4), (1, 8), (2, 6)]
+        assert editor.find("let") == (0, 0)
+        assert editor.find("let") == (1, 0)
+        assert editor.find("let") == (0, 0)
+        assert editor.replace_all("x", "total") == 3
+        assert str(editor) == "let| total = 1\nlet y = total\nprint(total)"
+        editor.undo()
+        assert editor.find_all("total") == []
+
+    # open a file through mmap, patch one line and save
+    import os
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), "log.txt")
+    with open(path, "w") as f:
+        f.write("first line\nsecond line\nthird line\n")
+    editor = TextEditor.open(path)
+    editor.goto_line(1)
+    editor.type_in(">> ")
+    assert editor.render_range(0, 2) == "first line\n>> |second line"
+    editor.save()
+    editor.close()
+    with open(path) as f:
+        assert f.read() == "first line\n>> second line\nthird line\n"
+
+    # with history, a mapped file is never copied whole, undo walks the steps
+    editor = TextEditor.open(path, history=History(checkpoint_every=1))
+    editor.goto_line(2)
+    editor.type_in("3rd: ")
+    editor.newline()
+    assert not editor.history.checkpoints
+    assert editor.undo(2) == 2 and editor.render_range(2, 3) == "|third line"
+    assert editor.redo() == 1 and editor.render_range(2, 3) == "3rd: |third line"
+    editor.close()
+
+    # two peers editing the same document at once end up in the same place
+    from editor_collab import Peer
+    alice, bob = Peer(1), Peer(2)
+    alice.connect(bob)
+    alice.type_in("hello")
+    bob.type_in("world")
+    alice.receive()
+    bob.receive()
+    assert alice.document() == bob.document()
+    alice.newline()
+    bob.backspace()
+    alice.receive()
+    bob.receive()
+    assert alice.document() == bob.document()
+    assert alice.cursors() == bob.cursors()
+
+    # two deletes of the same character leave no tombstone behind, one that
+    # overtakes its insert does until the insert turns up
+    alice, bob, carol = Peer(1), Peer(2), Peer(3)
+    alice.connect(bob, carol)
+    bob.connect(carol)
+    alice.type_in("!")
+    bob.receive()
+    bob.move_cursor("right")
+    alice.backspace()
+    bob.backspace()
+    for peer in (alice, bob, carol):
+        peer.receive()
+        assert peer.document() == "" and not peer.deleted
+    alice.type_in("?")
+    bob.receive()
+    bob.move_cursor("right")
+    bob.backspace()
+    ops = [carol.inbox.get_nowait() for _ in range(carol.inbox.qsize())]
+    carol.inbox.put(ops.pop())
+    carol.receive()
+    assert len(carol.deleted) == 1
+    for op in ops:
+        carol.inbox.put(op)
+    carol.receive()
+    assert carol.document() == "" and not carol.deleted
 
 
 